@@ -0,0 +1,68 @@
+"""Microbenchmark of `get_bibtex_str` against the `bibtexparser.dumps` path.
+
+The serializer must produce exactly the output of `dumps`, this script first
+checks it on the entries of `resources/sample.bib` (with and without long
+abstracts, and with unexpanded @string macros) before timing both paths.
+
+Usage (with notion-scholar installed, e.g. `pip install -e .`):
+    python benchmarks/bench_bibtex_str.py [--repeat 2000]
+"""
+import argparse
+import timeit
+from pathlib import Path
+
+from bibtexparser import dumps
+from bibtexparser.bibdatabase import BibDatabase
+
+from notion_scholar.bibtex import get_bib_database_from_file
+from notion_scholar.bibtex import get_bib_database_from_string
+from notion_scholar.bibtex import get_bibtex_str
+
+SAMPLE_PATH = Path(__file__).resolve().parent.parent / 'resources' / 'sample.bib'
+
+
+def get_bibtex_str_with_dumps(entry: dict) -> str:
+    """Reference implementation, serializing the entry with `dumps`."""
+    database = BibDatabase()
+    database.entries = [dict(entry)]
+    bibtex_str = dumps(database)
+
+    if len(bibtex_str) > 2000:
+        copied_entry = dict(entry)
+        copied_entry.pop('abstract', None)
+        database.entries = [copied_entry]
+        bibtex_str = dumps(database)
+    return bibtex_str if len(bibtex_str) <= 2000 else ''
+
+
+def get_entries() -> list:
+    entries = list(get_bib_database_from_file(str(SAMPLE_PATH)).entries)
+    entries += [dict(e, abstract=e.get('abstract', '') + ' lorem ipsum' * 150) for e in entries]
+    entries += [dict(e, note='x' * 2500) for e in entries[:2]]
+    string = '@string{nat = {Nature}}\n' + SAMPLE_PATH.read_text(encoding='utf-8').replace('{Nature}', 'nat')
+    entries += get_bib_database_from_string(string).entries
+    return entries
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--repeat', default=2000, type=int, help='Number of passes over the entries.')
+    arguments = parser.parse_args()
+
+    entries = get_entries()
+    for entry in entries:
+        expected, actual = get_bibtex_str_with_dumps(entry), get_bibtex_str(entry)
+        if expected != actual:
+            print(f'Mismatch for {entry["ID"]}:\n{expected!r}\n{actual!r}')
+            return 1
+    print(f'Output identical to dumps on {len(entries)} entries.')
+
+    number = arguments.repeat
+    for name, function in (('dumps', get_bibtex_str_with_dumps), ('get_bibtex_str', get_bibtex_str)):
+        duration = timeit.timeit(lambda: [function(e) for e in entries], number=number)
+        print(f'{name:>16}: {duration / (number * len(entries)) * 1e6:8.2f} us/entry')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
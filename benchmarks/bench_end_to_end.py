@@ -0,0 +1,107 @@
+"""End-to-end throughput of `ns run` and `ns download` against a local
+stand-in of the Notion API (see `fake_notion.py`).
+
+A synthetic library (see `synthetic.py`) is imported into an empty fake
+database, then imported again (steady state: every key is already present),
+and finally downloaded, with and without partitions (the creation times of
+the pages are spread over a year beforehand). The fake answers after
+`--latency` seconds and rejects a fraction `--rate-limit-probability` of the
+requests with a 429 error, the requests are throttled by the scheduler at
+`--rate` requests per second (Notion allows 3 on average, which makes a
+10k import last about an hour: a higher rate measures the client side).
+
+The parsing of the bib file is included in the timings of the imports, see
+`bench_hot_path.py` for its own measures.
+
+Usage (with notion-scholar installed, e.g. `pip install -e .`):
+    python benchmarks/bench_end_to_end.py [--size 10000] [--rate 1000] [--latency 0.05] [--workers 8]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+from fake_notion import FakeNotion
+from synthetic import generate_bib_file
+
+from notion_scholar.download import download
+from notion_scholar.run import run
+from notion_scholar.scheduler import RequestScheduler
+from notion_scholar.scheduler import set_scheduler
+
+TOKEN = 'secret_benchmark'
+DATABASE_ID = '00000000000000000000000000000000'
+
+
+def measure(name: str, size: int, fake: FakeNotion, function, **kwargs) -> float:
+    request_count = sum(fake.request_count.values())
+    rate_limited_count = fake.rate_limited_count
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        function(token=TOKEN, database_id=DATABASE_ID, **kwargs)
+    seconds = time.perf_counter() - start
+    print(
+        f'{name:>22}: {seconds:8.2f} s {size / seconds:9.1f} pages/s '
+        f'{sum(fake.request_count.values()) - request_count:7} requests '
+        f'({fake.rate_limited_count - rate_limited_count} rate limited)',
+        flush=True,
+    )
+    return seconds
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--size', default=10000, type=int, help='Number of entries.')
+    parser.add_argument('--rate', default=1000.0, type=float, help='Rate of the scheduler, in requests per second.')
+    parser.add_argument('--latency', default=0.05, type=float, help='Latency of the fake API, in seconds.')
+    parser.add_argument('--rate-limit-probability', default=0.01, type=float, help='Fraction of 429 responses.')
+    parser.add_argument('--workers', default=8, type=int, help='Number of concurrent uploads.')
+    parser.add_argument('--partitions', default=8, type=int, help='Number of partitions of the parallel download.')
+    parser.add_argument('--processes', default=1, type=int, help='Number of processes parsing the bib file.')
+    arguments = parser.parse_args()
+
+    fake = FakeNotion(
+        latency=arguments.latency,
+        rate_limit_probability=arguments.rate_limit_probability,
+        retry_after=0.05,
+    )
+    set_scheduler(RequestScheduler(rate=arguments.rate, burst=max(3, arguments.workers)))
+
+    with tempfile.TemporaryDirectory() as directory_path, fake.install():
+        directory = Path(directory_path)
+        bib_file_path = generate_bib_file(arguments.size, str(directory / 'library.bib'))
+        run_kwargs = dict(
+            bib_file_path=bib_file_path,
+            bib_string=None,
+            workers=arguments.workers,
+            index_path=str(directory / 'index.sqlite'),
+            processes=arguments.processes,
+        )
+
+        measure('import', arguments.size, fake, run, **run_kwargs)
+        measure('import (steady state)', arguments.size, fake, run, **run_kwargs)
+        fake.spread(days=365)
+        measure('download', arguments.size, fake, download, file_path=str(directory / 'download.bib'))
+        measure(
+            f'download ({arguments.partitions} partitions)', arguments.size, fake, download,
+            file_path=str(directory / 'download_partitions.bib'), partitions=arguments.partitions,
+        )
+
+        download_size = (directory / 'download.bib').stat().st_size
+        if download_size != (directory / 'download_partitions.bib').stat().st_size:
+            print('The downloads with and without partitions differ.')
+            return 1
+        if len(fake.pages) != arguments.size:
+            print(f'{len(fake.pages)} pages in the database instead of {arguments.size}.')
+            return 1
+
+    print(f'Requests: {dict(sorted(fake.request_count.items()))}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,147 @@
+"""Benchmark of the parse/convert path on synthetic libraries.
+
+For each size, a synthetic library is generated (see `synthetic.py`) and
+the following stages are timed:
+
+- parse: `get_bib_database_from_file`
+- convert: `get_publication_list` on the parsed database
+- bibtex_str: `get_bibtex_str` on every entry
+- key_list: `get_key_list`
+- stream: `iter_publications(iter_entries_from_file(...))`
+- cache_cold / cache_warm: `ParseCache.get_publication_list` on an empty
+  then on a filled cache
+
+The throughput (entries per second) and, in a second pass traced with
+`tracemalloc`, the peak memory of every stage are reported. The timings
+are compared to the baseline stored in `baseline_hot_path.json`, the script
+fails if a stage is slower than `--tolerance` times its baseline. The
+baseline is machine dependent, it must be recorded again (`--save`) on the
+machine used for the comparisons. The parsing being the bottleneck (a
+few hundred entries per second), the 10k and 100k sizes take minutes.
+
+Usage (with notion-scholar installed, e.g. `pip install -e .`):
+    python benchmarks/bench_hot_path.py [--sizes 1000 10000 100000] [--no-memory] [--save]
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+
+from synthetic import generate_bib_file
+
+from notion_scholar.bibtex import get_bib_database_from_file
+from notion_scholar.bibtex import get_bibtex_str
+from notion_scholar.bibtex import get_key_list
+from notion_scholar.bibtex import get_publication_list
+from notion_scholar.bibtex import iter_entries_from_file
+from notion_scholar.bibtex import iter_publications
+from notion_scholar.parse_cache import ParseCache
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline_hot_path.json'
+
+
+def get_stages(file_path: str, directory_path: str) -> Dict[str, Callable[[], object]]:
+    """Return the stages to measure, by name. The stages using a parsed
+    database parse the file once beforehand, outside of the measure."""
+    bib_database = get_bib_database_from_file(file_path)
+    cache_path = str(Path(directory_path) / 'cache.sqlite')
+
+    def cache_cold():
+        Path(cache_path).unlink(missing_ok=True)
+        cache = ParseCache(cache_path)
+        try:
+            return cache.get_publication_list(file_path)
+        finally:
+            cache.close()
+
+    def cache_warm():
+        cache = ParseCache(cache_path)
+        try:
+            return cache.get_publication_list(file_path)
+        finally:
+            cache.close()
+
+    return {
+        'parse': lambda: get_bib_database_from_file(file_path),
+        'convert': lambda: get_publication_list(bib_database),
+        'bibtex_str': lambda: [get_bibtex_str(entry) for entry in bib_database.entries],
+        'key_list': lambda: get_key_list(file_path),
+        'stream': lambda: list(iter_publications(iter_entries_from_file(file_path))),
+        'cache_cold': cache_cold,
+        'cache_warm': cache_warm,
+    }
+
+
+def measure(size: int, with_memory: bool = True) -> Dict[str, dict]:
+    with tempfile.TemporaryDirectory() as directory_path:
+        file_path = generate_bib_file(size, str(Path(directory_path) / 'library.bib'))
+        stages = get_stages(file_path, directory_path)
+
+        results = {}
+        for name, stage in stages.items():
+            start = time.perf_counter()
+            stage()
+            seconds = time.perf_counter() - start
+            results[name] = {'seconds': round(seconds, 4), 'entries_per_second': round(size / seconds, 1)}
+            print(f'{size:>8} {name:>12}: {seconds:9.3f} s {size / seconds:12.0f} entries/s', flush=True)
+
+        if with_memory:
+            for name, stage in stages.items():
+                tracemalloc.start()
+                stage()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results[name]['peak_mib'] = round(peak / 2 ** 20, 2)
+                print(f'{size:>8} {name:>12}: {peak / 2 ** 20:9.1f} MiB peak', flush=True)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--sizes', default=[1000], type=int, nargs='+', help='Numbers of entries.')
+    parser.add_argument('--no-memory', action='store_true', help='Do not measure the peak memory.')
+    parser.add_argument('--save', action='store_true', help='Save the results as the new baseline.')
+    parser.add_argument('--tolerance', default=1.3, type=float, help='Maximum slowdown against the baseline.')
+    arguments = parser.parse_args()
+
+    results = {str(size): measure(size, with_memory=not arguments.no_memory) for size in arguments.sizes}
+
+    if arguments.save:
+        baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {'results': {}}
+        baseline['python'] = sys.version.split()[0]
+        baseline['platform'] = platform.platform()
+        baseline['results'].update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2) + '\n')
+        print(f'Baseline saved in {BASELINE_PATH}.')
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print('No baseline to compare to, run with --save to record one.')
+        return 0
+
+    baseline_results = json.loads(BASELINE_PATH.read_text())['results']
+    regressions = []
+    for size, stage_results in results.items():
+        for name, result in stage_results.items():
+            reference = baseline_results.get(size, {}).get(name)
+            if reference is None:
+                continue
+            ratio = result['seconds'] / reference['seconds']
+            if ratio > arguments.tolerance:
+                regressions.append(f'{size} {name}: {ratio:.2f}x slower than the baseline')
+
+    for regression in regressions:
+        print(regression)
+    if not regressions:
+        print('No regression against the baseline.')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
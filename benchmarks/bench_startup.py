@@ -0,0 +1,75 @@
+"""Startup time of the `ns` command line for the subcommands that do not
+contact Notion.
+
+Every command is run `--repeat` times in a new interpreter, the median
+wall time is compared to the one of a bare interpreter (`python -c pass`).
+The script fails if the overhead of a command exceeds `--max-overhead`
+milliseconds, which makes it usable as a regression check: the heavy
+dependencies (notion-client, bibtexparser, httpx) must only be imported
+by the subcommands that need them. The commands displaying the saved token
+(`ns run --help`, `ns inspect-config`) also pay the import of keyring and
+of its backends, around 70 ms.
+
+Usage (with notion-scholar installed, e.g. `pip install -e .`):
+    python benchmarks/bench_startup.py [--repeat 10] [--max-overhead 150]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    ['--help'],
+    ['run', '--help'],
+    ['download', '--help'],
+    ['inspect-config'],
+]
+
+
+def get_median_duration(arguments: list, repeat: int) -> float:
+    """Median wall time in milliseconds of `python <arguments>`."""
+    duration_list = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        duration_list.append((time.perf_counter() - start) * 1000)
+    return statistics.median(duration_list)
+
+
+def get_imported_modules(arguments: list) -> set:
+    """Top-level packages imported by `python -m notion_scholar <arguments>`."""
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'notion_scholar', *arguments],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    return {
+        line.rsplit('|', 1)[-1].strip().split('.')[0]
+        for line in process.stderr.splitlines() if line.startswith('import time:')
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--repeat', default=10, type=int, help='Number of runs per command.')
+    parser.add_argument('--max-overhead', default=150.0, type=float, help='Maximum overhead in milliseconds.')
+    arguments = parser.parse_args()
+
+    baseline = get_median_duration(['-c', 'pass'], arguments.repeat)
+    print(f'{"python -c pass":>28}: {baseline:7.1f} ms')
+
+    failed = False
+    for command in COMMANDS:
+        duration = get_median_duration(['-m', 'notion_scholar', *command], arguments.repeat)
+        heavy_modules = get_imported_modules(command) & {'notion_client', 'bibtexparser', 'httpx'}
+        overhead = duration - baseline
+        status = 'ok'
+        if overhead > arguments.max_overhead or heavy_modules:
+            status = f'FAILED {sorted(heavy_modules) if heavy_modules else ""}'.strip()
+            failed = True
+        print(f'{"ns " + " ".join(command):>28}: {duration:7.1f} ms (+{overhead:.1f} ms) {status}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,311 @@
+"""Local stand-in of the Notion API used by the benchmarks, see `FakeNotion`."""
+import json
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+import httpx
+from notion_client import Client
+
+from notion_scholar.notion_api import DatabaseSchema
+from notion_scholar.notion_api import get_page_properties
+from notion_scholar.notion_api import set_client_factory
+from notion_scholar.publication import Publication
+
+DEFAULT_SCHEMA = {
+    'Title': 'title',
+    'Abstract': 'rich_text',
+    'Bibtex': 'rich_text',
+    'Filename': 'rich_text',
+    'Journal': 'rich_text',
+    'Authors': 'rich_text',
+    'Year': 'number',
+    'URL': 'url',
+    'Inbox': 'checkbox',
+    'Type': 'select',
+    'DOI': 'rich_text',
+}
+
+
+def _format_timestamp(timestamp: datetime) -> str:
+    # Notion rounds the timestamps of the pages to the minute
+    return timestamp.replace(second=0, microsecond=0).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def _parse_timestamp(timestamp: str) -> datetime:
+    if len(timestamp) == 10:
+        timestamp += 'T00:00:00'
+    parsed_timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    return parsed_timestamp if parsed_timestamp.tzinfo else parsed_timestamp.replace(tzinfo=timezone.utc)
+
+
+def _get_response_value(value: dict) -> dict:
+    """Convert a property value of a request to its form in the responses."""
+    value = dict(value)
+    for key in ('title', 'rich_text'):
+        if key in value:
+            value[key] = [
+                {'type': 'text', 'text': item['text'], 'plain_text': item['text']['content']}
+                for item in value[key]
+            ]
+    return value
+
+
+def _get_empty_response_value(property_type: str) -> dict:
+    """Return the value of an empty property in the responses, Notion
+    returns every property of the database in the pages."""
+    if property_type in ('title', 'rich_text', 'multi_select'):
+        return {'type': property_type, property_type: []}
+    if property_type == 'checkbox':
+        return {'type': property_type, property_type: False}
+    return {'type': property_type, property_type: None}
+
+
+class FakeNotion:
+    """Local stand-in of the Notion API, for offline and load testing.
+
+    The requests of the `notion_client.Client` are handled in process by an
+    `httpx.MockTransport`, for the endpoints used by notion-scholar:
+    `databases.retrieve`, `databases.query` (cursors, `page_size`,
+    `filter_properties`, timestamp sorts, and the `and`/`or`, `rich_text`,
+    `number`, `select` and timestamp filters), `pages.create` and
+    `pages.update`. A single database is simulated, whatever its id. The
+    values of properties absent from its schema, or of another type, are
+    rejected with a 400 error, as by Notion.
+
+    Args:
+        latency: Time in seconds spent handling each request.
+        rate_limit_probability: Probability of a request to be rejected with
+            a 429 error, as when the rate limit of Notion is exceeded.
+        retry_after: Value of the `Retry-After` header of the 429 errors.
+        seed: Seed of the 429 injection.
+        schema: Type of the properties of the database by name, defaults to
+            `DEFAULT_SCHEMA`.
+    """
+    def __init__(
+            self,
+            latency: float = 0.0,
+            rate_limit_probability: float = 0.0,
+            retry_after: float = 0.1,
+            seed: int = 0,
+            schema: Optional[Dict[str, str]] = None,
+    ):
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.schema = dict(schema if schema is not None else DEFAULT_SCHEMA)
+
+        self.pages: Dict[str, dict] = {}
+        self.request_count: Dict[str, int] = {}
+        self.rate_limited_count = 0
+        self._lock = threading.Lock()
+
+    def populate(self, publications: List[Publication], days: int = 365) -> None:
+        """Add one page per publication, created over the last `days` days."""
+        for publication in publications:
+            self._add_page(
+                get_page_properties(publication, schema=DatabaseSchema(self.schema, {}, 0.0)),
+                _format_timestamp(datetime.now(timezone.utc)),
+            )
+        self.spread(days)
+
+    def spread(self, days: int = 365) -> None:
+        """Spread the creation (and last edition) times of the pages evenly
+        over the last `days` days, in their order of creation. The pages
+        created through the API all share the same minute otherwise, which
+        defeats the partitioning of the scans by creation time."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for i, page in enumerate(self.pages.values()):
+                created_time = now - timedelta(days=days) * (1 - i / len(self.pages))
+                page['created_time'] = page['last_edited_time'] = _format_timestamp(created_time)
+
+    def get_client(self, token: str) -> Client:
+        return Client(auth=token, client=httpx.Client(transport=httpx.MockTransport(self.handle)))
+
+    @contextmanager
+    def install(self) -> Iterator['FakeNotion']:
+        """Send the requests of `notion_scholar.notion_api` to this stand-in
+        while in the context."""
+        set_client_factory(self.get_client)
+        try:
+            yield self
+        finally:
+            set_client_factory(None)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            time.sleep(self.latency)
+
+        parts = request.url.path.strip('/').split('/')
+        endpoint = f'{request.method} /{parts[1]}' + ('/query' if parts[-1] == 'query' else '')
+        with self._lock:
+            self.request_count[endpoint] = self.request_count.get(endpoint, 0) + 1
+            rate_limited = self.random.random() < self.rate_limit_probability
+            if rate_limited:
+                self.rate_limited_count += 1
+        if rate_limited:
+            return self._error(429, 'rate_limited', headers={'Retry-After': str(self.retry_after)})
+
+        body = json.loads(request.content) if request.content else {}
+        if request.method == 'GET' and parts[1:2] == ['databases'] and len(parts) == 3:
+            return httpx.Response(200, json=self._get_database(parts[2]))
+        if request.method == 'POST' and parts[1:2] == ['databases'] and parts[3:] == ['query']:
+            return httpx.Response(200, json=self._query(body, request.url.params.get_list('filter_properties')))
+        if request.method == 'POST' and parts[1:] == ['pages']:
+            error = self._validate(body.get('properties', {}))
+            if error is not None:
+                return error
+            created_time = _format_timestamp(datetime.now(timezone.utc))
+            return httpx.Response(200, json=self._add_page(body.get('properties', {}), created_time))
+        if request.method == 'PATCH' and parts[1:2] == ['pages'] and len(parts) == 3:
+            error = self._validate(body.get('properties', {}))
+            if error is not None:
+                return error
+            return self._update_page(parts[2], body.get('properties', {}))
+        return self._error(404, 'object_not_found')
+
+    def _error(
+            self,
+            status: int,
+            code: str,
+            headers: Optional[dict] = None,
+            message: Optional[str] = None,
+    ) -> httpx.Response:
+        return httpx.Response(
+            status,
+            json={'object': 'error', 'status': status, 'code': code, 'message': message or code},
+            headers=headers,
+        )
+
+    def _validate(self, properties: dict) -> Optional[httpx.Response]:
+        for name, value in properties.items():
+            if name not in self.schema:
+                return self._error(400, 'validation_error', message=f'{name} is not a property that exists.')
+            if self.schema[name] not in value:
+                return self._error(
+                    400,
+                    'validation_error',
+                    message=f'{name} is expected to be {self.schema[name]}.',
+                )
+        return None
+
+    def _get_database(self, database_id: str) -> dict:
+        return {
+            'object': 'database',
+            'id': database_id,
+            'properties': {
+                name: {'id': f'id{i}', 'name': name, 'type': property_type}
+                for i, (name, property_type) in enumerate(self.schema.items())
+            },
+        }
+
+    def _add_page(self, properties: dict, created_time: str) -> dict:
+        page = {
+            'object': 'page',
+            'id': str(uuid.uuid4()),
+            'created_time': created_time,
+            'last_edited_time': created_time,
+            'properties': {
+                **{name: _get_empty_response_value(property_type) for name, property_type in self.schema.items()},
+                **{name: _get_response_value(value) for name, value in properties.items()},
+            },
+        }
+        with self._lock:
+            self.pages[page['id']] = page
+        return page
+
+    def _update_page(self, page_id: str, properties: dict) -> httpx.Response:
+        with self._lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return self._error(404, 'object_not_found')
+            page['properties'].update({name: _get_response_value(value) for name, value in properties.items()})
+            page['last_edited_time'] = _format_timestamp(datetime.now(timezone.utc))
+        return httpx.Response(200, json=page)
+
+    def _query(self, body: dict, filter_properties: List[str]) -> dict:
+        with self._lock:
+            pages = list(self.pages.values())
+        if body.get('filter'):
+            pages = [page for page in pages if self._match(page, body['filter'])]
+        for sort in reversed(body.get('sorts') or []):
+            pages.sort(key=lambda page: page[sort['timestamp']], reverse=sort['direction'] == 'descending')
+
+        start = int(body.get('start_cursor') or 0)
+        end = start + min(100, body.get('page_size', 100))
+        results = pages[start:end]
+        if filter_properties:
+            id_to_name = {v['id']: name for name, v in self._get_database('')['properties'].items()}
+            names = {id_to_name.get(property_id) for property_id in filter_properties}
+            results = [
+                dict(page, properties={k: v for k, v in page['properties'].items() if k in names})
+                for page in results
+            ]
+        return {
+            'object': 'list',
+            'results': results,
+            'next_cursor': str(end) if end < len(pages) else None,
+            'has_more': end < len(pages),
+        }
+
+    def _match(self, page: dict, condition: Dict[str, Any]) -> bool:
+        if 'and' in condition:
+            return all(self._match(page, c) for c in condition['and'])
+        if 'or' in condition:
+            return any(self._match(page, c) for c in condition['or'])
+
+        if 'timestamp' in condition:
+            value = _parse_timestamp(page[condition['timestamp']])
+            (operator, operand), = condition[condition['timestamp']].items()
+            if operator == 'is_not_empty':
+                return True
+            operand = _parse_timestamp(operand)
+            return {
+                'equals': value == operand,
+                'before': value < operand,
+                'after': value > operand,
+                'on_or_before': value <= operand,
+                'on_or_after': value >= operand,
+            }[operator]
+
+        value = page['properties'].get(condition['property'], {})
+        if 'rich_text' in condition or 'title' in condition:
+            key = 'rich_text' if 'rich_text' in condition else 'title'
+            text = ''.join(item['plain_text'] for item in value.get(key, []))
+            (operator, operand), = condition[key].items()
+            return {
+                'equals': text == operand,
+                'contains': operand in text,
+                'is_empty': not text,
+                'is_not_empty': bool(text),
+            }[operator]
+        if 'number' in condition:
+            number = value.get('number')
+            (operator, operand), = condition['number'].items()
+            if number is None:
+                return operator == 'is_empty'
+            return {
+                'equals': number == operand,
+                'greater_than': number > operand,
+                'less_than': number < operand,
+                'greater_than_or_equal_to': number >= operand,
+                'less_than_or_equal_to': number <= operand,
+                'is_not_empty': True,
+            }[operator]
+        if 'select' in condition:
+            name = (value.get('select') or {}).get('name')
+            (operator, operand), = condition['select'].items()
+            return {'equals': name == operand, 'is_empty': name is None, 'is_not_empty': name is not None}[operator]
+        raise ValueError(f'Unsupported filter: {condition}')
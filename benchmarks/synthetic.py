@@ -0,0 +1,94 @@
+"""Generator of synthetic BibTeX libraries for the benchmarks.
+
+The entries are variations of the entries of `resources/sample.bib`: the
+same types and fields, with unique keys, author lists of 1 to 40 authors,
+abstracts of 40 to 240 words (about one entry in eight exceeds the 2000
+characters limit of the Notion properties), DOIs, and a few `@string`
+macros. The output only depends on the number of entries and on the seed.
+
+Usage:
+    python benchmarks/synthetic.py <n_entries> <output.bib> [--seed 0]
+"""
+import argparse
+import random
+import re
+from pathlib import Path
+from typing import Iterator
+from typing import List
+
+SAMPLE_PATH = Path(__file__).resolve().parent.parent / 'resources' / 'sample.bib'
+
+WORDS = (
+    'learning model network deep reinforcement policy gradient optimization '
+    'stochastic convergence representation attention transformer protein '
+    'structure prediction game search tree value function image classification '
+    'convolutional layer training dataset benchmark performance accuracy robust '
+    'efficient scalable distributed inference bayesian variational latent '
+    'generative adversarial sequence language translation embedding graph'
+).split()
+FIRST_NAMES = 'Alex Maria David Jimmy Karen Julian Ioannis Aja Arthur Lucas Geoffrey Ilya Yann Fei'.split()
+LAST_NAMES = 'Silver Kingma Ba Hinton Sutskever Krizhevsky Vaswani Mnih Jumper Bengio LeCun Huang Baker Lai'.split()
+MACROS = {'nat': 'Nature', 'neurips': 'Advances in Neural Information Processing Systems', 'jmlr': 'JMLR'}
+
+
+def get_sample_entries() -> List[str]:
+    text = SAMPLE_PATH.read_text(encoding='utf-8')
+    return [block.strip() for block in re.split(r'\n(?=@)', text) if block.strip()]
+
+
+def _get_sentence(rng: random.Random, n_words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def iter_entries(n_entries: int, seed: int = 0) -> Iterator[str]:
+    """Yield `n_entries` BibTeX entries (and a few `@string` macros)."""
+    rng = random.Random(seed)
+    sample_entries = get_sample_entries()
+
+    for name, value in MACROS.items():
+        yield f'@string{{{name} = {{{value}}}}}'
+
+    for i in range(n_entries):
+        entry = sample_entries[i % len(sample_entries)]
+        entry = re.sub(r'^@(\w+)\{([^,]+),', lambda m: f'@{m.group(1)}{{{m.group(2)}_{i},', entry)
+        authors = ' and '.join(
+            f'{rng.choice(LAST_NAMES)}, {rng.choice(FIRST_NAMES)}'
+            for _ in range(rng.choice((1, 2, 3, 4, 6, 10, 40)))
+        )
+        entry = re.sub(r'\n\s*(author|abstract|doi) = \{.*?\},?(?=\n)', '', entry)
+        fields = [
+            f'    author = {{{authors}}},',
+            f'    abstract = {{{_get_sentence(rng, rng.randint(40, 240)).capitalize()}.}},',
+            f'    doi = {{10.{rng.randint(1000, 9999)}/{rng.randint(10 ** 6, 10 ** 7)}}},',
+        ]
+        if i % 10 == 0:
+            fields.append(f'    series = {rng.choice(list(MACROS))},')
+        head, tail = entry.rsplit('}', 1)
+        yield head.rstrip().rstrip(',') + ',\n' + '\n'.join(fields) + '\n}' + tail
+
+
+def generate_bib_string(n_entries: int, seed: int = 0) -> str:
+    return '\n\n'.join(iter_entries(n_entries, seed)) + '\n'
+
+
+def generate_bib_file(n_entries: int, file_path: str, seed: int = 0) -> str:
+    """Write a synthetic library of `n_entries` entries at `file_path`."""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for entry in iter_entries(n_entries, seed):
+            f.write(entry)
+            f.write('\n\n')
+    return file_path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('n_entries', type=int, help='Number of entries.')
+    parser.add_argument('file_path', type=str, help='Output bib file.')
+    parser.add_argument('--seed', default=0, type=int, help='Seed of the generator.')
+    arguments = parser.parse_args()
+    generate_bib_file(arguments.n_entries, arguments.file_path, arguments.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,14 +1,36 @@
+import re
+import sys
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Callable
+from typing import Deque
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Match
+from typing import Optional
+from typing import Tuple
 
-from bibtexparser import dumps
 from bibtexparser import load
 from bibtexparser.bibdatabase import BibDatabase
+from bibtexparser.bibdatabase import BibDataString
+from bibtexparser.bibdatabase import BibDataStringExpression
 from bibtexparser.bparser import BibTexParser
 
+from notion_scholar.metrics import get_metrics
+from notion_scholar.publication import LazyPublication
 from notion_scholar.publication import Publication
 
+BLOCK_HEADER_PATTERN = re.compile(r'@\s*([A-Za-z][\w-]*)\s*([{(])')
+BLOCK_KEY_PATTERN = re.compile(r'\s*([^,\s]+)\s*,')
+BRACE_PATTERN = re.compile(r'[{}]')
+BRACE_PARENTHESIS_OR_QUOTE_PATTERN = re.compile(r'[{}()"]')
+MACRO_BLOCK_TYPES = ('string', 'preamble')
 
-def get_bib_database_from_file(file_path: str) -> BibDatabase:
+
+def get_bib_database_from_file(file_path: str, processes: int = 1) -> BibDatabase:
     """
     Parses a BibTeX file to create a BibDatabase object.
 
@@ -16,8 +38,14 @@ def get_bib_database_from_file(file_path: str) -> BibDatabase:
     BibTeX entries within it, and returns a BibDatabase object containing all
     the parsed entries.
 
+    With several processes, the file is split at its top-level `@` blocks and
+    the entries are parsed in chunks by a process pool, the `@string` macros
+    and preambles that precede a chunk being sent along with it. The text outside of the
+    blocks (implicit comments) is then not kept.
+
     Args:
         file_path (str): The path to the BibTeX file to be parsed.
+        processes (int): Number of processes used to parse the entries.
 
     Returns:
         BibDatabase: An object containing the parsed BibTeX entries from the file.
@@ -27,7 +55,18 @@ def get_bib_database_from_file(file_path: str) -> BibDatabase:
             common_strings=True,
             ignore_nonstandard_types=False,
         )
-        return load(bibtex_file, parser=parser)
+        if processes <= 1:
+            return load(bibtex_file, parser=parser)
+        text = bibtex_file.read()
+
+    blocks = [text[start:end] for start, end in iter_block_spans(text)]
+    bib_database = parser.parse('\n'.join(
+        block for block in blocks
+        if get_block_type(block) in (*MACRO_BLOCK_TYPES, 'comment')
+    ))
+    chunk_size = min(1000, max(50, len(blocks) // (4 * processes) + 1))
+    bib_database.entries = list(chain.from_iterable(iter_entry_lists_in_parallel(blocks, processes, chunk_size)))
+    return bib_database
 
 
 def get_bib_database_from_string(string: str) -> BibDatabase:
@@ -52,31 +91,259 @@ def get_bib_database_from_string(string: str) -> BibDatabase:
     return bibtex_parser.parse(string)
 
 
-def get_bibtex_str(entry: dict) -> str:
+def _find_block_end(text: str, header: Match) -> Optional[int]:
+    """Return the position after the block starting with the `header` match
+    of `BLOCK_HEADER_PATTERN`, or `None` if the block is not complete in
+    `text`."""
+    if header.group(2) == '{':
+        depth = 0
+        for match in BRACE_PATTERN.finditer(text, header.end(2) - 1):
+            depth += 1 if match.group() == '{' else -1
+            if depth == 0:
+                return match.end()
+    else:
+        # A parenthesis closes the block outside of the braces and of the
+        # quoted values, a quote only delimits a value outside of the braces
+        depth = 0
+        quoted = False
+        for match in BRACE_PARENTHESIS_OR_QUOTE_PATTERN.finditer(text, header.end(2)):
+            character = match.group()
+            if character == '{':
+                depth += 1
+            elif character == '}':
+                depth -= 1
+            elif depth == 0 and character == '"':
+                quoted = not quoted
+            elif character == ')' and depth == 0 and not quoted:
+                return match.end()
+    return None
+
+
+def iter_block_spans(text: str, final: bool = True) -> Iterator[Tuple[int, int]]:
+    """Iterate over the (start, end) positions of the top-level `@` blocks
+    (entries, strings, preambles and explicit comments) of a BibTeX text.
+
+    The text outside of the blocks is ignored, as BibTeX does. When `final`
+    is False, the text is considered truncated: the iteration stops before
+    a block that may not be complete.
+    """
+    position = 0
+    while True:
+        start = text.find('@', position)
+        if start == -1:
+            return
+        header = BLOCK_HEADER_PATTERN.match(text, start)
+        if header is None:
+            if not final and len(text) - start < 256:
+                return
+            position = start + 1
+            continue
+        end = _find_block_end(text, header)
+        if end is None:
+            if final:
+                position = header.end()
+                continue
+            return
+        yield start, end
+        position = end
+
+
+def iter_blocks_from_file(file_path: str, chunk_size: int = 1 << 20) -> Iterator[str]:
+    """Read a BibTeX file chunk by chunk and yield its top-level `@` blocks."""
+    with open(file_path, encoding='utf-8') as bibtex_file:
+        buffer = ''
+        while True:
+            chunk = bibtex_file.read(chunk_size)
+            final = not chunk
+            buffer += chunk
+            end = 0
+            for start, end in iter_block_spans(buffer, final=final):
+                yield buffer[start:end]
+            if final:
+                return
+            buffer = buffer[end:]
+
+
+def iter_entries(
+        blocks: Iterable[str],
+        interpolate_strings: bool = True,
+        batch_size: int = 100,
+) -> Iterator[dict]:
+    """Parse the BibTeX blocks `batch_size` at a time and yield the entries.
+
+    A single parser is used, the `@string` macros defined by the previous
+    blocks are therefore available to the following ones.
+    """
+    parser = BibTexParser(
+        interpolate_strings=interpolate_strings,
+        common_strings=True,
+        ignore_nonstandard_types=False,
+    )
+    parser.expect_multiple_parse = True
+    metrics = get_metrics()
+
+    def parse(batch: List[str]) -> List[dict]:
+        with metrics.phase('parse'):
+            bib_database = parser.parse('\n'.join(batch))
+        entries = bib_database.entries
+        bib_database.entries = []
+        bib_database.comments = []
+        metrics.count('entries_parsed', len(entries))
+        return entries
+
+    batch = []
+    for block in blocks:
+        batch.append(block)
+        if len(batch) >= batch_size:
+            yield from parse(batch)
+            batch = []
+    if batch:
+        yield from parse(batch)
+
+
+def get_block_type(block: str) -> str:
+    """Return the lowercase type of a top-level `@` block (`article`,
+    `string`, `comment`...), or an empty string if the block has no valid
+    header: it is then parsed as is, and rejected by the parser."""
+    header = BLOCK_HEADER_PATTERN.match(block)
+    return header.group(1).lower() if header is not None else ''
+
+
+def iter_entry_lists(blocks: Iterable[str]) -> Iterator[List[dict]]:
+    """Parse the BibTeX blocks one by one and yield, for each block, the list
+    of its entries (empty for the macros, comments and invalid blocks).
+
+    As in `iter_entries`, a macro is available to the blocks that follow it.
+    """
+    parser = BibTexParser(
+        common_strings=True,
+        ignore_nonstandard_types=False,
+    )
+    parser.expect_multiple_parse = True
+    metrics = get_metrics()
+    for block in blocks:
+        with metrics.phase('parse'):
+            bib_database = parser.parse(block)
+        metrics.count('entries_parsed', len(bib_database.entries))
+        yield bib_database.entries
+        bib_database.entries = []
+        bib_database.comments = []
+
+
+def get_block_key(block: str) -> Optional[str]:
+    """Return the key of an entry block, or `None` for the other blocks."""
+    header = BLOCK_HEADER_PATTERN.match(block)
+    if header is None or header.group(1).lower() in (*MACRO_BLOCK_TYPES, 'comment'):
+        return None
+    key = BLOCK_KEY_PATTERN.match(block, header.end())
+    return key.group(1) if key is not None else None
+
+
+def _get_result(future: Future, count: Callable[[list], int] = len) -> list:
+    """Wait for the result of a parsing process, the wait being recorded as
+    parsing time and `count(result)` as the number of entries parsed."""
+    metrics = get_metrics()
+    with metrics.phase('parse'):
+        result = future.result()
+    metrics.count('entries_parsed', count(result))
+    return result
+
+
+def _count_entries(entry_lists: List[List[dict]]) -> int:
+    return sum(map(len, entry_lists))
+
+
+def _parse_block_lists(macro_blocks: List[str], blocks: List[str]) -> List[List[dict]]:
+    return list(iter_entry_lists([*macro_blocks, *blocks]))[len(macro_blocks):]
+
+
+def iter_entry_lists_in_parallel(
+        blocks: Iterable[str],
+        processes: int,
+        chunk_size: int = 250,
+) -> Iterator[List[dict]]:
+    """Same as `iter_entry_lists`, the blocks being parsed in chunks by a
+    pool of `processes` processes. Every chunk is parsed along with the
+    `@string` and `@preamble` blocks that precede it."""
+    macro_blocks: List[str] = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending: Deque[Future] = deque()
+        chunk: List[str] = []
+        for block in blocks:
+            chunk.append(block)
+            if len(chunk) >= chunk_size:
+                pending.append(executor.submit(_parse_block_lists, list(macro_blocks), chunk))
+                macro_blocks.extend(b for b in chunk if get_block_type(b) in MACRO_BLOCK_TYPES)
+                chunk = []
+                if len(pending) >= 2 * processes:
+                    yield from _get_result(pending.popleft(), _count_entries)
+        if chunk:
+            pending.append(executor.submit(_parse_block_lists, macro_blocks, chunk))
+        while pending:
+            yield from _get_result(pending.popleft(), _count_entries)
+
+
+def iter_entries_from_file(file_path: str, batch_size: int = 100, processes: int = 1) -> Iterator[dict]:
+    """Yield the entries of a BibTeX file while it is being read and parsed,
+    without loading the whole file in memory. With several processes, the
+    entries are parsed by a process pool (see `iter_entry_lists_in_parallel`)."""
+    if processes > 1:
+        return chain.from_iterable(iter_entry_lists_in_parallel(iter_blocks_from_file(file_path), processes))
+    return iter_entries(iter_blocks_from_file(file_path), batch_size=batch_size)
+
+
+def iter_entries_from_string(string: str, batch_size: int = 100) -> Iterator[dict]:
+    blocks = (string[start:end] for start, end in iter_block_spans(string))
+    return iter_entries(blocks, interpolate_strings=False, batch_size=batch_size)
+
+
+def _value_to_bibtex(value) -> str:
+    if isinstance(value, BibDataStringExpression):
+        return ' # '.join([_value_to_bibtex(v) for v in value.expr])
+    elif isinstance(value, BibDataString):
+        return value.name
+    else:
+        return '{' + value + '}'
+
+
+def get_bibtex_str(
+        entry: dict,
+        max_length: int = 2000,
+        droppable_fields: Tuple[str, ...] = ('abstract',),
+) -> str:
     """
     Generates a BibTeX string from a single entry dictionary, excluding the 'abstract' field if the resulting string is too long.
 
-    This function takes a dictionary representing a single BibTeX entry, converts
-    it to a BibTeX-formatted string, and returns it. If the generated string exceeds
-    2000 characters, the 'abstract' field is omitted to reduce size.
+    This function renders each field of the entry once, in the format of
+    `bibtexparser.dumps`, while measuring the length of the result. If the
+    string exceeds `max_length` characters, the `droppable_fields` (by default
+    'abstract') are omitted, in order, until it fits.
 
     Args:
         entry (dict): A dictionary representing a single BibTeX entry.
+        max_length (int): Maximum length of the BibTeX string.
+        droppable_fields (tuple): Fields that can be omitted to reduce the size.
 
     Returns:
-        str: A BibTeX-formatted string. Returns an empty string if the resulting string without the 'abstract' is still over 2000 characters.
+        str: A BibTeX-formatted string. Returns an empty string if the resulting string without the droppable fields is still over `max_length` characters.
     """
-    database = BibDatabase()
-    database.entries = [dict(entry)]
-    bibtex_str = dumps(database)
+    header = '@' + entry['ENTRYTYPE'] + '{' + entry['ID']
+    field_to_line = {
+        field: ',\n ' + field + ' = ' + _value_to_bibtex(entry[field])
+        for field in sorted(entry) if field not in ('ENTRYTYPE', 'ID')
+    }
+    footer = '\n}\n'
 
-    copied_entry = dict(entry)
-    if len(bibtex_str) > 2000:
-        copied_entry.pop('abstract', None)
+    length = len(header) + sum(map(len, field_to_line.values())) + len(footer)
+    for field in droppable_fields:
+        if length <= max_length:
+            break
+        if field in field_to_line:
+            length -= len(field_to_line.pop(field))
 
-    database.entries = [copied_entry]
-    bibtex_str = dumps(database)
-    return bibtex_str if len(bibtex_str) > 2000 else ''
+    if length > max_length:
+        return ''
+    return header + ''.join(field_to_line.values()) + footer
 
 
 def get_publication_list(bib_database: BibDatabase) -> List[Publication]:
@@ -94,23 +361,40 @@ def get_publication_list(bib_database: BibDatabase) -> List[Publication]:
     Returns:
         List[Publication]: A list of Publication objects created from the BibDatabase entries.
     """
-    publications = []
-    for entry in bib_database.entries:
-        publications.append(
-            Publication(
-                key=entry.get('ID', ''),
-                title=entry.get('title', ''),
-                authors=entry.get('author', '').replace('\n', ' '),
-                year=int(entry['year']) if 'year' in entry.keys() else None,
-                journal=entry.get('journal', ''),
-                url=entry.get('url', ''),
-                abstract=entry.get('abstract', ''),
-                doi=entry.get('doi', ''),
-                type=entry.get('ENTRYTYPE', '').lower(),
-                bibtex=get_bibtex_str(entry),
-            ),
+    return list(iter_publications(bib_database.entries))
+
+
+def get_publication(entry: dict) -> Publication:
+    """Converts a single BibTeX entry dictionary into a Publication object."""
+    metrics = get_metrics()
+    with metrics.phase('convert'):
+        with metrics.phase('bibtex_str'):
+            bibtex = get_bibtex_str(entry)
+        return Publication(
+            key=sys.intern(entry.get('ID', '')),
+            title=entry.get('title', ''),
+            authors=entry.get('author', '').replace('\n', ' '),
+            year=int(entry['year']) if 'year' in entry.keys() else None,
+            journal=entry.get('journal', ''),
+            url=entry.get('url', ''),
+            abstract=entry.get('abstract', ''),
+            doi=entry.get('doi', ''),
+            type=sys.intern(entry.get('ENTRYTYPE', '').lower()),
+            bibtex=bibtex,
         )
-    return publications
+
+
+def iter_publications(entries: Iterable[dict]) -> Iterator[Publication]:
+    """Lazily converts BibTeX entry dictionaries into Publication objects."""
+    for entry in entries:
+        yield get_publication(entry)
+
+
+def iter_lazy_publications(entries: Iterable[dict]) -> Iterator[LazyPublication]:
+    """Yield the entries as LazyPublication objects, an entry is only
+    converted (see `get_publication`) if its publication is accessed."""
+    for entry in entries:
+        yield LazyPublication(entry.get('ID', ''), entry, get_publication)
 
 
 def get_key_list(bib_file_path: str) -> list:
@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from urllib.parse import quote
+
+from notion_scholar.bibtex import get_block_key
+from notion_scholar.bibtex import get_block_type
+from notion_scholar.bibtex import iter_blocks_from_file
+from notion_scholar.bibtex import iter_entries
+from notion_scholar.bibtex import MACRO_BLOCK_TYPES
+from notion_scholar.metrics import get_metrics
+from notion_scholar.metrics import report_metrics
+
+
+class DirectoryListing(NamedTuple):
+    """NamedTuple object used to store the PDF files and the subdirectories
+    of a directory, as of its modification time `mtime_ns`."""
+    mtime_ns: int
+    pdf_names: List[str]
+    subdirectory_names: List[str]
+
+
+class PdfManifest:
+    """Local SQLite manifest of the PDF files of the scanned folders.
+
+    For each directory, the manifest stores its modification time along with
+    its PDF files and subdirectories. Adding, removing or renaming a file
+    changes the modification time of its directory only: a directory whose
+    modification time is unchanged is not listed again, a single `stat` is
+    needed.
+
+    Args:
+        path: Path of the SQLite file, it is created if it does not exist.
+    """
+    def __init__(self, path: str):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS directories ('
+                'root TEXT NOT NULL, '
+                'path TEXT NOT NULL, '
+                'mtime_ns INTEGER, '
+                'pdf_names TEXT, '
+                'subdirectory_names TEXT, '
+                'PRIMARY KEY (root, path))',
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def scan(self, folder_path: str) -> Dict[str, str]:
+        """Return the PDF files of the folder and its subfolders, by key (the
+        name of the file without extension). The paths are relative to the
+        folder, a key found several times is mapped to its first path.
+
+        Only the directories modified since the previous scan of the folder
+        are listed, with `os.scandir`. The manifest is then updated.
+        """
+        root = os.path.abspath(folder_path)
+        metrics = get_metrics()
+        listing_dict = {
+            path: DirectoryListing(mtime_ns, json.loads(pdf_names), json.loads(subdirectory_names))
+            for path, mtime_ns, pdf_names, subdirectory_names in self.connection.execute(
+                'SELECT path, mtime_ns, pdf_names, subdirectory_names FROM directories WHERE root = ?',
+                (root,),
+            )
+        }
+
+        pdf_path_dict: Dict[str, str] = {}
+        changed_rows: List[Tuple[str, str, int, str, str]] = []
+        visited_paths: Set[str] = set()
+        stack = ['']
+        while stack:
+            relative_path = stack.pop()
+            try:
+                mtime_ns = os.stat(os.path.join(root, relative_path)).st_mtime_ns
+            except OSError:
+                continue
+            visited_paths.add(relative_path)
+
+            listing = listing_dict.get(relative_path)
+            if listing is None or listing.mtime_ns != mtime_ns:
+                listing = self._list(root, relative_path, mtime_ns)
+                changed_rows.append((
+                    root,
+                    relative_path,
+                    listing.mtime_ns,
+                    json.dumps(listing.pdf_names),
+                    json.dumps(listing.subdirectory_names),
+                ))
+                metrics.count('directories_listed')
+            else:
+                metrics.count('directories_cached')
+
+            for name in listing.pdf_names:
+                pdf_path_dict.setdefault(name[:-4], os.path.join(relative_path, name))
+            stack.extend(
+                os.path.join(relative_path, name) for name in reversed(listing.subdirectory_names)
+            )
+
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?, ?)', changed_rows)
+            self.connection.executemany(
+                'DELETE FROM directories WHERE root = ? AND path = ?',
+                [(root, path) for path in listing_dict if path not in visited_paths],
+            )
+        return pdf_path_dict
+
+    @staticmethod
+    def _list(root: str, relative_path: str, mtime_ns: int) -> DirectoryListing:
+        pdf_names, subdirectory_names = [], []
+        with os.scandir(os.path.join(root, relative_path)) as iterator:
+            for entry in iterator:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectory_names.append(entry.name)
+                elif entry.name.lower().endswith('.pdf') and entry.is_file():
+                    pdf_names.append(entry.name)
+        return DirectoryListing(mtime_ns, sorted(pdf_names), sorted(subdirectory_names))
+
+
+class PdfReport(NamedTuple):
+    """NamedTuple object used to store the result of a check of the PDF
+    files against a bib file: the titles of the entries without PDF by key,
+    and the PDF files without entry by key."""
+    missing: Dict[str, str]
+    extra: Dict[str, str]
+
+
+def get_pdf_report(bib_file_path: str, pdf_path_dict: Dict[str, str]) -> PdfReport:
+    """Compare the keys of the bib file with the PDF files (by key).
+
+    Only the keys of the entries are read, without parsing the file: the
+    entries without PDF are then parsed to retrieve their title.
+    """
+    macro_blocks, missing_blocks = [], []
+    key_set = set()
+    for block in iter_blocks_from_file(bib_file_path):
+        key = get_block_key(block)
+        if key is None:
+            if get_block_type(block) in MACRO_BLOCK_TYPES:
+                macro_blocks.append(block)
+            continue
+        key_set.add(key)
+        if key not in pdf_path_dict:
+            missing_blocks.append(block)
+
+    missing = {}
+    if missing_blocks:
+        for entry in iter_entries([*macro_blocks, *missing_blocks]):
+            missing[entry['ID']] = entry.get('title', 'No title available')
+    extra = {key: path for key, path in pdf_path_dict.items() if key not in key_set}
+    return PdfReport(missing=missing, extra=extra)
+
+
+def check_pdfs(
+        bib_file_path: str,
+        folder_path: str,
+        manifest_path: Optional[str] = None,
+        profile: bool = False,
+        metrics_file: Optional[str] = None,
+) -> int:
+    """Print the entries of the bib file without PDF file in the folder (or
+    its subfolders), with a Google Scholar link, and the PDF files without
+    entry. A PDF file is named after the key of its entry: `<key>.pdf`.
+
+    Args:
+        bib_file_path: Bib file.
+        folder_path: Folder of the PDF files.
+        manifest_path: Path of the manifest of the folders, see
+            `PdfManifest`. The manifest is kept in memory if not provided.
+        profile: Whether to print a profile of the check.
+        metrics_file: File in which the metrics are written (see
+            `Metrics.write`).
+
+    Returns:
+        Error code, 1 if some entries have no PDF file.
+    """
+    metrics = get_metrics()
+    manifest = PdfManifest(path=manifest_path if manifest_path is not None else ':memory:')
+    with metrics.phase('scan'):
+        pdf_path_dict = manifest.scan(folder_path)
+    manifest.close()
+    with metrics.phase('read'):
+        report = get_pdf_report(bib_file_path, pdf_path_dict)
+
+    if report.missing:
+        print('Missing PDFs (these entries are in the .bib file but no corresponding PDF is found):')
+        for key, title in report.missing.items():
+            print(f'- {key}.pdf : {title}')
+            print(f'  https://scholar.google.com/scholar?q={quote(title)}')
+    else:
+        print('All BibTeX entries have corresponding PDFs.')
+
+    if report.extra:
+        print('\nExtra PDFs (these PDFs are in the folder but not in the .bib file):')
+        for path in report.extra.values():
+            print(f'- {path}')
+    else:
+        print('No extra PDFs in the folder.')
+
+    report_metrics(profile=profile, metrics_file=metrics_file)
+    return 1 if report.missing else 0
@@ -2,10 +2,11 @@ import shutil
 import warnings
 from configparser import ConfigParser
 from pathlib import Path
-from typing import Optional
 from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
 
-import keyring
 from platformdirs import user_config_dir
 
 from notion_scholar.utilities import NotionScholarException, coerce_to_absolute_path, get_token
@@ -15,6 +16,20 @@ class ConfigException(NotionScholarException):
     """A config exception class for notion-scholar."""
 
 
+TARGET_SECTION_PREFIX = 'target:'
+DEFAULT_POOL_SIZE = 10
+
+_settings_cache: Dict[Path, Dict[str, str]] = {}
+
+
+class Target(NamedTuple):
+    """NamedTuple object used to store a bib file synchronized with a
+    database by `ns run --all`."""
+    name: str
+    file_path: str
+    database_id: str
+
+
 class ConfigManager:
     """Class that manages all the notion-scholar configuration."""
     def __init__(
@@ -23,18 +38,75 @@ class ConfigManager:
             string: Optional[str] = None,
             file_path: Optional[str] = None,
             database_id: Optional[str] = None,
+            workers: int = 3,
+            rebuild_index: bool = False,
+            update: bool = False,
+            processes: int = 1,
+            interval: float = 1.0,
+            debounce: float = 2.0,
+            partitions: int = 1,
+            incremental: bool = False,
+            profile: bool = False,
+            metrics_file: Optional[str] = None,
+            all_targets: bool = False,
+            target: Optional[str] = None,
+            remove_target: Optional[str] = None,
+            pool_size: Optional[int] = None,
+            timeout: float = 60.0,
+            connect_timeout: float = 10.0,
+            discard_plan: bool = False,
+            dedupe: bool = False,
+            threshold: float = 0.8,
+            skip_database: bool = False,
+            folder_path: Optional[str] = None,
+            query: Optional[List[str]] = None,
+            limit: int = 20,
     ):
         self.token = token
         self.string = string
         self.file_path = file_path
         self.database_id = database_id
+        self.workers = workers
+        self.rebuild_index = rebuild_index
+        self.update = update
+        self.processes = processes
+        self.interval = interval
+        self.debounce = debounce
+        self.partitions = partitions
+        self.incremental = incremental
+        self.profile = profile
+        self.metrics_file = metrics_file
+        self.all_targets = all_targets
+        self.target = target
+        self.remove_target = remove_target
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.discard_plan = discard_plan
+        self.dedupe = dedupe
+        self.threshold = threshold
+        self.skip_database = skip_database
+        self.folder_path = folder_path
+        self.query = query
+        self.limit = limit
 
         directory_path = Path(user_config_dir(appname='notion-scholar'))
         self.config_path = directory_path.joinpath('config').with_suffix('.ini')
+        self.index_path = directory_path.joinpath('index').with_suffix('.sqlite')
+        self.cache_path = directory_path.joinpath('cache').with_suffix('.sqlite')
+        self.journal_path = directory_path.joinpath('journal').with_suffix('.sqlite')
+        self.manifest_path = directory_path.joinpath('pdf_manifest').with_suffix('.sqlite')
+        self.search_index_path = directory_path.joinpath('search_index').with_suffix('.sqlite')
 
     def get_download_kwargs(self) -> dict:
+        if self.file_path is None:
+            raise ConfigException("No file_path provided to save the bibtex entries.")
         return {
             'file_path': coerce_to_absolute_path(path=self.file_path),
+            'partitions': self.partitions,
+            'incremental': self.incremental,
+            'index_path': str(self.index_path),
+            **self._get_metrics_kwargs(),
             **self._get_sanitized_kwargs()
         }
 
@@ -57,18 +129,163 @@ class ConfigManager:
         return {
             'bib_string': self.string,
             'bib_file_path': file_path,
+            'workers': self.workers,
+            'index_path': str(self.index_path),
+            'rebuild_index': self.rebuild_index,
+            'update': self.update,
+            'processes': self.processes,
+            'cache_path': str(self.cache_path),
+            'partitions': self.partitions,
+            'journal_path': str(self.journal_path),
+            'discard_plan': self.discard_plan,
+            'dedupe': self.dedupe,
+            **self._get_metrics_kwargs(),
             **self._get_sanitized_kwargs()
         }
 
-    def _get_sanitized_kwargs(self):
-        config = self.get()
+    def get_run_all_kwargs(self) -> dict:
+        target_list = self.get_targets()
+        if not target_list:
+            raise ConfigException('No target saved in the config, they are added with "ns set-config --target <name>".')
+        for target in target_list:
+            if not Path(target.file_path).exists():
+                raise ConfigException(f'The file_path of the target "{target.name}" does not exist.')
+
+        return {
+            'token': self._get_token(),
+            'targets': target_list,
+            'workers': self.workers,
+            'index_path': str(self.index_path),
+            'rebuild_index': self.rebuild_index,
+            'update': self.update,
+            'cache_path': str(self.cache_path),
+            'partitions': self.partitions,
+            'journal_path': str(self.journal_path),
+            'discard_plan': self.discard_plan,
+            'dedupe': self.dedupe,
+            **self._get_metrics_kwargs(),
+        }
+
+    def get_watch_kwargs(self) -> dict:
+        run_kwargs = self.get_run_kwargs()
+        if run_kwargs.pop('bib_string') is not None:
+            raise ConfigException('A bib string cannot be watched, a file_path is needed.')
+        # The increments of a watch are small, their plans are kept in memory
+        run_kwargs.pop('journal_path')
+        run_kwargs.pop('discard_plan')
+        run_kwargs.pop('dedupe')
+        return {
+            'interval': self.interval,
+            'debounce': self.debounce,
+            **run_kwargs,
+        }
+
+    def get_dedupe_kwargs(self) -> dict:
+        file_path = self.file_path
+        if file_path is not None:
+            file_path = coerce_to_absolute_path(path=file_path)
+            if not Path(file_path).exists():
+                raise ConfigException("The file_path provided to the argparse does not exist.")
+        else:
+            file_path = self.get().get('file_path', None)
+            if file_path is not None and not Path(file_path).exists():
+                raise ConfigException("The file_path set in the config does not exist.")
+        if file_path is None and self.skip_database:
+            raise ConfigException("No file_path provided nor set in the config, and the database is skipped.")
+
+        # Checking the bib file alone does not need Notion
+        return {
+            'bib_file_path': file_path,
+            'threshold': self.threshold,
+            'skip_database': self.skip_database,
+            'cache_path': str(self.cache_path),
+            'partitions': self.partitions,
+            **self._get_metrics_kwargs(),
+            **({} if self.skip_database else self._get_sanitized_kwargs()),
+        }
+
+    def get_check_pdfs_kwargs(self) -> dict:
+        file_path = self.file_path
+        if file_path is not None:
+            file_path = coerce_to_absolute_path(path=file_path)
+        else:
+            file_path = self.get().get('file_path', None)
+            if file_path is None:
+                raise ConfigException("No file_path provided and no file path set in the config.")
+        if not Path(file_path).exists():
+            raise ConfigException(f'The bib file "{file_path}" does not exist.')
+
+        if self.folder_path is None:
+            raise ConfigException("No folder_path provided, the folder of the PDF files is needed.")
+        folder_path = coerce_to_absolute_path(path=self.folder_path)
+        if not Path(folder_path).is_dir():
+            raise ConfigException(f'The folder "{folder_path}" does not exist.')
+
+        return {
+            'bib_file_path': file_path,
+            'folder_path': folder_path,
+            'manifest_path': str(self.manifest_path),
+            **self._get_metrics_kwargs(),
+        }
+
+    def get_search_kwargs(self) -> dict:
+        file_path = self.file_path
+        if file_path is not None:
+            file_path = coerce_to_absolute_path(path=file_path)
+        else:
+            file_path = self.get().get('file_path', None)
+            if file_path is None:
+                raise ConfigException("No file_path provided and no file path set in the config.")
+        if not Path(file_path).exists():
+            raise ConfigException(f'The bib file "{file_path}" does not exist.')
+        if self.limit < 1:
+            raise ConfigException('The limit must be at least 1.')
+
+        return {
+            'query': ' '.join(self.query or []),
+            'bib_file_path': file_path,
+            'index_path': str(self.search_index_path),
+            'cache_path': str(self.cache_path),
+            'limit': self.limit,
+            'processes': self.processes,
+            'rebuild_index': self.rebuild_index,
+            **self._get_metrics_kwargs(),
+        }
 
+    def get_connection_kwargs(self) -> dict:
+        pool_size = self.pool_size
+        if pool_size is None:
+            # Enough connections for the workers, or for the partitions of a scan
+            pool_size = max(DEFAULT_POOL_SIZE, self.workers, self.partitions)
+        if pool_size < 1:
+            raise ConfigException('The pool size must be at least 1.')
+        return {
+            'pool_size': pool_size,
+            'timeout': self.timeout,
+            'connect_timeout': self.connect_timeout,
+        }
+
+    def _get_metrics_kwargs(self) -> dict:
+        metrics_file = self.metrics_file
+        if metrics_file is not None:
+            metrics_file = coerce_to_absolute_path(path=metrics_file)
+        return {
+            'profile': self.profile,
+            'metrics_file': metrics_file,
+        }
+
+    def _get_token(self) -> str:
         token = self.token
         if token is None:
             token = get_token()
 
             if token is None:
                 raise ConfigException('The Notion token is not set nor saved.')
+        return token
+
+    def _get_sanitized_kwargs(self):
+        config = self.get()
+        token = self._get_token()
 
         database_id = self.database_id
         if database_id is None:
@@ -85,7 +302,9 @@ class ConfigManager:
     def setup(self) -> None:
         # Save the token if provided
         if self.token is not None:
+            import keyring
             keyring.set_password('notion-scholar', 'token', self.token)
+            get_token.cache_clear()
 
         # Void the file_path argument if the file doesn't exist
         if self.file_path is not None:
@@ -109,9 +328,12 @@ class ConfigManager:
         config = ConfigParser()
         config.read(self.config_path)
 
-        # Setup the section
+        # Setup the sections, the file and database of a target are saved in its own section
         if not config.has_section('Settings'):
             config.add_section('Settings')
+        section = 'Settings' if self.target is None else TARGET_SECTION_PREFIX + self.target
+        if not config.has_section(section):
+            config.add_section(section)
 
         # Write the values
         key_to_value = {
@@ -121,11 +343,16 @@ class ConfigManager:
 
         for key, value in key_to_value.items():
             if value is not None:
-                config.set(section='Settings', option=key, value=value)
+                config.set(section=section, option=key, value=value)
+
+        if self.remove_target is not None:
+            if not config.remove_section(TARGET_SECTION_PREFIX + self.remove_target):
+                warnings.warn(f'The target "{self.remove_target}" does not exist.')
 
         # Save the changes
         with open(self.config_path, 'w') as configfile:
             config.write(configfile)
+        _settings_cache.pop(self.config_path, None)
 
     def inspect(self) -> None:
         print(f'\nconfig_file_path: {str(self.config_path)}')
@@ -136,7 +363,41 @@ class ConfigManager:
         for key, value in config.items():
             print(f'{key}: {value}')
 
+        for target in self.get_targets():
+            print(f'\ntarget: {target.name}')
+            print(f'  file_path: {target.file_path}')
+            print(f'  database_id: {target.database_id}')
+
     def get(self) -> Dict[str, str]:
+        """Return the saved settings, the config file is read once per
+        process."""
+        if self.config_path not in _settings_cache:
+            _settings_cache[self.config_path] = self._read()
+        return dict(_settings_cache[self.config_path])
+
+    def get_targets(self) -> List[Target]:
+        """Return the targets saved in the config, in their order in the
+        config file. The targets missing a file path or a database id are
+        ignored with a warning."""
+        if not self.config_path.is_file():
+            return []
+        config = ConfigParser()
+        config.read(self.config_path)
+
+        target_list = []
+        for section in config.sections():
+            if not section.startswith(TARGET_SECTION_PREFIX):
+                continue
+            name = section[len(TARGET_SECTION_PREFIX):]
+            file_path = config[section].get('file_path', None)
+            database_id = config[section].get('database_id', None)
+            if file_path is None or database_id is None:
+                warnings.warn(f'The target "{name}" is ignored, it needs both a file_path and a database_id.')
+                continue
+            target_list.append(Target(name=name, file_path=file_path, database_id=database_id))
+        return target_list
+
+    def _read(self) -> Dict[str, str]:
         if not self.config_path.is_file(): # todo check if is a file and exist + right section
             return {}
         else:
@@ -153,8 +414,11 @@ class ConfigManager:
                 return self._update_config()
 
     def clear(self) -> None:
+        import keyring
         shutil.rmtree(self.config_path.parent, ignore_errors=True)
+        _settings_cache.pop(self.config_path, None)
         keyring.delete_password('notion-scholar', 'token')
+        get_token.cache_clear()
 
     def _update_config(self):
         """To seamlessly upgrade from notion-scholar 0.2.0 to 0.3.0"""
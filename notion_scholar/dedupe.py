@@ -0,0 +1,444 @@
+import re
+import unicodedata
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from notion_scholar.bibtex import iter_entries_from_file
+from notion_scholar.bibtex import iter_lazy_publications
+from notion_scholar.diff import IndexedPage
+from notion_scholar.metrics import get_metrics
+from notion_scholar.metrics import report_metrics
+from notion_scholar.notion_api import get_page_list_from_database
+from notion_scholar.notion_api import get_property_value_dict_from_page
+from notion_scholar.parse_cache import ParseCache
+from notion_scholar.publication import LazyPublication
+from notion_scholar.publication import Publication
+
+DOI_PREFIX_PATTERN = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+ARXIV_DOI_PATTERN = re.compile(r'^10\.48550/arxiv\.(.+)$', re.IGNORECASE)
+ARXIV_URL_PATTERN = re.compile(r'arxiv\.org/(?:abs|pdf)/(.+?)(?:v\d+)?(?:\.pdf)?/?$', re.IGNORECASE)
+URL_PREFIX_PATTERN = re.compile(r'^(?:https?://)?(?:www\.)?', re.IGNORECASE)
+LATEX_COMMAND_PATTERN = re.compile(r'\\[a-zA-Z]+\s*')
+NON_ALPHANUMERIC_PATTERN = re.compile(r'[^a-z0-9]+')
+
+# Titles shorter than this ("Introduction", "Editorial"...) are only matched exactly
+MIN_SIMILAR_TITLE_LENGTH = 16
+# Identifiers enough for the pipelines to skip a publication, a URL may be
+# shared by the papers of a proceedings
+CERTAIN_REASONS = {'doi', 'arxiv'}
+# Beyond this number of candidates sharing a bucket, the titles are near identical
+MAX_BUCKET_CANDIDATES = 32
+
+
+class Reference(NamedTuple):
+    """NamedTuple object used to store the fields of a publication compared
+    by the duplicate detection, `page_id` is set for the pages of the
+    database."""
+    key: str
+    title: str
+    doi: str
+    url: str
+    page_id: Optional[str] = None
+    authors: str = ''
+
+    def __str__(self):  # noqa TYP004
+        source = f'page {self.page_id}' if self.page_id is not None else 'bib file'
+        return f'{self.key} ({source}): "{self.title}"'
+
+
+class Match(NamedTuple):
+    """NamedTuple object used to store a reference found to be a duplicate,
+    and the reason: same `doi`, `url`, `arxiv` id, `title`, or a `similar
+    title` (Jaccard similarity of their trigrams)."""
+    reference: Reference
+    reason: str
+    similarity: float = 1.0
+
+
+class DuplicateGroup(NamedTuple):
+    """NamedTuple object used to store references that are duplicates of one
+    another."""
+    references: List[Reference]
+    reasons: List[str]
+
+
+def normalize_doi(doi: str) -> str:
+    return DOI_PREFIX_PATTERN.sub('', doi.strip()).lower()
+
+
+def normalize_url(url: str) -> str:
+    url = URL_PREFIX_PATTERN.sub('', url.strip()).split('#')[0].rstrip('/')
+    return url.lower()
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase the title, without accents, LaTeX commands and punctuation."""
+    title = LATEX_COMMAND_PATTERN.sub('', title).replace('{', '').replace('}', '')
+    if not title.isascii():
+        title = ''.join(c for c in unicodedata.normalize('NFKD', title) if not unicodedata.combining(c))
+    return NON_ALPHANUMERIC_PATTERN.sub(' ', title.lower()).strip()
+
+
+def get_first_author(authors: str) -> str:
+    """Return the normalized last name of the first author of a BibTeX
+    author list ("Last, First and ..." or "First Last and ...")."""
+    first_author = authors.split(' and ')[0]
+    if ',' in first_author:
+        last_name = first_author.split(',')[0]
+    else:
+        last_name = first_author.strip().split(' ')[-1]
+    return normalize_title(last_name)
+
+
+def get_arxiv_id(reference: Reference) -> Optional[str]:
+    """Return the arXiv identifier of the reference (without version), from
+    its DOI or its URL, if any."""
+    match = ARXIV_DOI_PATTERN.match(normalize_doi(reference.doi)) or ARXIV_URL_PATTERN.search(reference.url.strip())
+    return match.group(1).lower() if match is not None else None
+
+
+def get_identifiers(reference: Reference) -> List[Tuple[str, str]]:
+    """Return the normalized (reason, value) identifiers of the reference,
+    two references sharing one of them are duplicates."""
+    identifiers = []
+    if reference.doi.strip():
+        identifiers.append(('doi', normalize_doi(reference.doi)))
+    if reference.url.strip():
+        identifiers.append(('url', normalize_url(reference.url)))
+    arxiv_id = get_arxiv_id(reference)
+    if arxiv_id is not None:
+        identifiers.append(('arxiv', arxiv_id))
+    return identifiers
+
+
+def get_trigram_set(title: str) -> Set[str]:
+    padded_title = f' {title} '
+    return {padded_title[i:i + 3] for i in range(len(padded_title) - 2)}
+
+
+def get_jaccard_similarity(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def get_signature(trigram_set: Set[str], size: int) -> List[int]:
+    """Return the MinHash signature of the trigrams, computed with a single
+    hash function whose values are split in `size` bins (one permutation
+    hashing), the cost is linear in the number of trigrams. The empty bins
+    take the value of the next non-empty bin."""
+    empty = 1 << 64
+    bins = [empty] * size
+    for trigram in trigram_set:
+        value, i = divmod(hash(trigram) & 0xFFFFFFFFFFFFFFFF, size)
+        if value < bins[i]:
+            bins[i] = value
+    if not trigram_set:
+        return bins
+
+    # Densification, the distance to the non-empty bin is part of the value
+    signature = [0] * size
+    j = 0  # Set before it is read, at least one bin is not empty
+    for i in range(2 * size - 1, -1, -1):
+        if bins[i % size] != empty:
+            j = i
+        if i < size:
+            signature[i] = bins[j % size] * size + (j - i)
+    return signature
+
+
+class DuplicateIndex:
+    """In-memory index of references used to find duplicates in roughly
+    linear time.
+
+    The normalized DOI, URL and arXiv id of the references are indexed in
+    hash tables. The titles are indexed by MinHash signatures of their
+    trigrams, split in `bands` bands of `rows` values: two titles sharing a
+    band are candidates, kept if the Jaccard similarity of their trigrams is
+    at least `threshold`. Only the candidates sharing a band are compared,
+    never all the pairs.
+
+    Args:
+        threshold: Minimum Jaccard similarity of the trigrams of two titles
+            for them to be considered as duplicates.
+        bands: Number of bands of the signatures.
+        rows: Number of values per band, two titles of similarity `s`
+            share a band with a probability of `1 - (1 - s^rows)^bands`.
+    """
+    def __init__(self, threshold: float = 0.8, bands: int = 8, rows: int = 4):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.references: List[Reference] = []
+        self._title_list: List[str] = []
+        self._identifier_dict: Dict[Tuple[str, str], int] = {}
+        self._bucket_dict: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.references)
+
+    def find(self, reference: Reference) -> List[Match]:
+        """Return the indexed references that are duplicates of `reference`."""
+        return self._find(reference, *self._prepare(reference))[1]
+
+    def add(self, reference: Reference) -> List[Match]:
+        """Index the reference and return the references indexed before it
+        that are duplicates of it."""
+        return [match for _, match in self._add(reference)]
+
+    def _add(self, reference: Reference) -> List[Tuple[int, Match]]:
+        identifiers, title, trigram_set, bucket_keys = self._prepare(reference)
+        positions, matches = self._find(reference, identifiers, title, trigram_set, bucket_keys)
+
+        position = len(self.references)
+        self.references.append(reference)
+        self._title_list.append(title)
+        for identifier in identifiers:
+            self._identifier_dict.setdefault(identifier, position)
+        for bucket_key in bucket_keys:
+            self._bucket_dict.setdefault(bucket_key, []).append(position)
+        return list(zip(positions, matches))
+
+    def _prepare(self, reference: Reference) -> Tuple[List[Tuple[str, str]], str, Set[str], List[int]]:
+        title = normalize_title(reference.title)
+        trigram_set = get_trigram_set(title)
+        bucket_keys = []
+        if len(title) >= MIN_SIMILAR_TITLE_LENGTH:
+            signature = get_signature(trigram_set, self.bands * self.rows)
+            bucket_keys = [
+                hash((band, *signature[band * self.rows:(band + 1) * self.rows]))
+                for band in range(self.bands)
+            ]
+        elif title:
+            bucket_keys = [hash(title)]
+        return get_identifiers(reference), title, trigram_set, bucket_keys
+
+    def _find(
+            self,
+            reference: Reference,
+            identifiers: List[Tuple[str, str]],
+            title: str,
+            trigram_set: Set[str],
+            bucket_keys: List[int],
+    ) -> Tuple[List[int], List[Match]]:
+        positions: List[int] = []
+        matches: List[Match] = []
+        for reason, value in identifiers:
+            position = self._identifier_dict.get((reason, value))
+            if position is not None and position not in positions:
+                positions.append(position)
+                matches.append(Match(self.references[position], reason))
+
+        candidate_set: Set[int] = set()
+        for bucket_key in bucket_keys:
+            candidate_set.update(self._bucket_dict.get(bucket_key, [])[:MAX_BUCKET_CANDIDATES])
+        for position in sorted(candidate_set.difference(positions)):
+            if self._title_list[position] == title:
+                positions.append(position)
+                matches.append(Match(self.references[position], 'title'))
+                continue
+            similarity = get_jaccard_similarity(trigram_set, get_trigram_set(self._title_list[position]))
+            if similarity >= self.threshold:
+                positions.append(position)
+                matches.append(Match(self.references[position], 'similar title', similarity))
+        return positions, matches
+
+
+def is_certain_duplicate(reference: Reference, match: Match, threshold: float = 0.8) -> bool:
+    """Whether the match is certain enough to skip the publication: the same
+    DOI or arXiv id, or the same (or a similar) title and the same URL or
+    first author. A URL or a title alone ("Introduction") is not enough."""
+    if match.reason in CERTAIN_REASONS:
+        return True
+    other = match.reference
+    title, other_title = normalize_title(reference.title), normalize_title(other.title)
+    if not title or not other_title:
+        return False
+    if title != other_title:
+        if len(title) < MIN_SIMILAR_TITLE_LENGTH:
+            return False
+        similarity = get_jaccard_similarity(get_trigram_set(title), get_trigram_set(other_title))
+        if similarity < threshold:
+            return False
+
+    url = normalize_url(reference.url)
+    first_author = get_first_author(reference.authors)
+    return bool(
+        (url and url == normalize_url(other.url))
+        or (first_author and first_author == get_first_author(other.authors))
+    )
+
+
+def get_reference(publication: Publication) -> Reference:
+    return Reference(
+        key=publication.key,
+        title=publication.title,
+        doi=publication.doi,
+        url=publication.url,
+        authors=publication.authors,
+    )
+
+
+def get_reference_from_page(page: dict) -> Reference:
+    value_dict = get_property_value_dict_from_page(page)
+    return Reference(
+        key=value_dict.get('Filename', ''),
+        title=value_dict.get('Title', ''),
+        doi=value_dict.get('DOI', ''),
+        url=value_dict.get('URL', ''),
+        page_id=page['id'],
+        authors=value_dict.get('Authors', ''),
+    )
+
+
+def get_reference_list_from_database(token: str, database_id: str, partitions: int = 1) -> List[Reference]:
+    """Return the references of the pages of the database, only the compared
+    properties are retrieved."""
+    pages = get_page_list_from_database(
+        token=token,
+        database_id=database_id,
+        property_names=['Filename', 'Title', 'DOI', 'URL', 'Authors'],
+        partitions=partitions,
+    )
+    return [get_reference_from_page(page) for page in pages]
+
+
+def get_duplicate_groups(references: Iterable[Reference], threshold: float = 0.8) -> List[DuplicateGroup]:
+    """Return the groups of duplicates among the references, a reference
+    belonging to a group if it is the duplicate of one of its references."""
+    index = DuplicateIndex(threshold=threshold)
+    parent_list: List[int] = []
+    reason_dict: Dict[int, List[str]] = {}
+
+    def get_root(position: int) -> int:
+        while parent_list[position] != position:
+            parent_list[position] = parent_list[parent_list[position]]
+            position = parent_list[position]
+        return position
+
+    for reference in references:
+        position = len(parent_list)
+        parent_list.append(position)
+        for other_position, match in index._add(reference):
+            root, other_root = get_root(position), get_root(other_position)
+            if root != other_root:
+                parent_list[max(root, other_root)] = min(root, other_root)
+            reason_dict.setdefault(min(root, other_root), []).append(match.reason)
+
+    group_dict: Dict[int, List[int]] = {}
+    for position in range(len(parent_list)):
+        group_dict.setdefault(get_root(position), []).append(position)
+    return [
+        DuplicateGroup(
+            references=[index.references[position] for position in positions],
+            reasons=sorted(set(
+                reason for position in positions for reason in reason_dict.get(position, [])
+            )),
+        )
+        for root, positions in group_dict.items() if len(positions) > 1
+    ]
+
+
+def iter_unique_publications(
+        publications: Iterable[LazyPublication],
+        page_dict: Dict[str, IndexedPage],
+        index: DuplicateIndex,
+        duplicate_list: List[Tuple[Publication, Match]],
+) -> Iterator[LazyPublication]:
+    """Filter out the new publications (absent from `page_dict`) that are
+    certain duplicates (see `is_certain_duplicate`) of a reference of the
+    index, the database pages for instance, or of a new publication yielded
+    before them.
+
+    Args:
+        publications: Publications from the bibliography.
+        page_dict: Pages of the database, by publication key.
+        index: Index of the references the publications are compared to,
+            the publications yielded are added to it.
+        duplicate_list: List to which the publications filtered out are
+            appended, along with the reference they duplicate.
+    """
+    for lazy_publication in publications:
+        if lazy_publication.key in page_dict:
+            yield lazy_publication
+            continue
+        reference = get_reference(lazy_publication.publication)
+        matches = [match for match in index.find(reference) if is_certain_duplicate(reference, match, index.threshold)]
+        if matches:
+            duplicate_list.append((lazy_publication.publication, matches[0]))
+            continue
+        index.add(reference)
+        yield lazy_publication
+
+
+def dedupe(
+        token: Optional[str] = None,
+        database_id: Optional[str] = None,
+        bib_file_path: Optional[str] = None,
+        threshold: float = 0.8,
+        skip_database: bool = False,
+        cache_path: Optional[str] = None,
+        partitions: int = 1,
+        profile: bool = False,
+        metrics_file: Optional[str] = None,
+) -> int:
+    """Print the groups of duplicates found among the publications of the
+    bib file and the pages of the database: references with the same DOI,
+    URL, arXiv id or title, or a similar title (see `DuplicateIndex`).
+
+    Args:
+        token: Notion API token, not needed if the database is skipped.
+        database_id: Database id, not needed if the database is skipped.
+        bib_file_path: Bib file, only the database is checked if `None`.
+        threshold: Minimum Jaccard similarity of the trigrams of two titles
+            for them to be considered as duplicates.
+        skip_database: Whether to only check the bib file.
+        cache_path: Path of the parse cache.
+        partitions: Number of partitions of the database scanned in parallel.
+        profile: Whether to print a profile of the detection.
+        metrics_file: File in which the metrics are written (see
+            `Metrics.write`).
+
+    Returns:
+        Error code.
+    """
+    metrics = get_metrics()
+    references: List[Reference] = []
+
+    if not skip_database and token is not None and database_id is not None:
+        with metrics.phase('key_scan'):
+            references.extend(get_reference_list_from_database(token, database_id, partitions))
+
+    if bib_file_path is not None:
+        parse_cache = ParseCache(path=cache_path) if cache_path is not None else None
+        if parse_cache is not None:
+            publications = metrics.iter_phase('parse_cache', parse_cache.iter_lazy_publications(bib_file_path))
+        else:
+            publications = metrics.iter_phase('read', iter_lazy_publications(iter_entries_from_file(bib_file_path)))
+        # The publications already in the database are compared through their page
+        key_set = {reference.key for reference in references}
+        references.extend(
+            get_reference(lazy_publication.publication)
+            for lazy_publication in publications if lazy_publication.key not in key_set
+        )
+        if parse_cache is not None:
+            parse_cache.close()
+
+    with metrics.phase('dedupe'):
+        group_list = get_duplicate_groups(references, threshold=threshold)
+
+    if not group_list:
+        print(f'No duplicates found among {len(references)} publications.')
+    else:
+        print(f'{len(group_list)} groups of duplicates found among {len(references)} publications:')
+        for i, group in enumerate(group_list, 1):
+            print(f'\n{i}. Same {", ".join(group.reasons)}:')
+            for reference in group.references:
+                print(f'   - {reference}')
+
+    report_metrics(profile=profile, metrics_file=metrics_file)
+    return 0
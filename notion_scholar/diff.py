@@ -0,0 +1,65 @@
+import hashlib
+import json
+from typing import Any
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+
+from notion_scholar.notion_api import get_property_value_dict
+from notion_scholar.notion_api import get_property_value_dict_from_page
+from notion_scholar.notion_api import PageUpdate
+from notion_scholar.publication import Publication
+
+
+class IndexedPage(NamedTuple):
+    """NamedTuple object used to store what is known about an existing page."""
+    page_id: str
+    fingerprint: Optional[str] = None
+    digest_dict: Optional[Dict[str, str]] = None
+
+
+def get_digest_dict(value_dict: Dict[str, Any]) -> Dict[str, str]:
+    """Hash each property value independently, the changed properties of a
+    page can then be found without storing the values themselves."""
+    return {
+        name: hashlib.sha1(json.dumps(value).encode('utf-8')).hexdigest()[:16]
+        for name, value in value_dict.items()
+    }
+
+
+def get_fingerprint(digest_dict: Dict[str, str]) -> str:
+    """Hash the property digests of a page into a single content hash."""
+    return hashlib.sha1(json.dumps(digest_dict, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_publication_digest_dict(publication: Publication) -> Dict[str, str]:
+    return get_digest_dict(get_property_value_dict(publication, warn=False))
+
+
+def get_page_digest_dict(page: dict) -> Dict[str, str]:
+    return get_digest_dict(get_property_value_dict_from_page(page))
+
+
+def get_page_update(
+        publication: Publication,
+        page: IndexedPage,
+        stored_property_names: Optional[Set[str]] = None,
+) -> Optional[PageUpdate]:
+    """Return the update needed to bring `page` up to date with
+    `publication`, or `None` if the page is unchanged. A page without
+    fingerprint is considered entirely changed. Only the properties of
+    `stored_property_names`, if provided, are updated."""
+    digest_dict = get_publication_digest_dict(publication)
+    if page.fingerprint == get_fingerprint(digest_dict):
+        return None
+
+    page_digest_dict = page.digest_dict or {}
+    property_names = [
+        name for name, digest in digest_dict.items()
+        if page_digest_dict.get(name) != digest
+        and (stored_property_names is None or name in stored_property_names)
+    ]
+    if not property_names:
+        return None
+    return PageUpdate(page.page_id, publication, property_names)
@@ -1,30 +1,153 @@
-from notion_scholar.notion_api import get_bibtex_string_list_from_database
-from notion_scholar.utilities import write_to_file
+import logging
+import os
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import TextIO
+
+from notion_scholar.bibtex import get_block_key
+from notion_scholar.bibtex import iter_block_spans
+from notion_scholar.key_index import KeyIndex
+from notion_scholar.metrics import get_metrics
+from notion_scholar.metrics import report_metrics
+from notion_scholar.notion_api import iter_pages_from_database
+from notion_scholar.notion_api import iter_pages_from_database_in_parallel
+from notion_scholar.notion_api import retrieve_bibtex_string
+from notion_scholar.utilities import open_atomic
+
+logger = logging.getLogger(__name__)
 
 
 def download(
         file_path: str,
         token: str,
         database_id: str,
+        partitions: int = 1,
+        incremental: bool = False,
+        index_path: Optional[str] = None,
+        profile: bool = False,
+        metrics_file: Optional[str] = None,
 ) -> int:
     """Write the bibliography from the database `database_id` in the file
     located at `file_path`.
 
+    The entries are written as the pages are retrieved, in a temporary file
+    that replaces the file at `file_path` once the download is complete.
+
+    With `incremental`, only the pages edited since the previous download to
+    the same file are retrieved, and merged into the file by key: the
+    entries of the edited pages are replaced and the new ones appended. The
+    entries of the pages deleted from the database are kept, a complete
+    download is needed to remove them.
+
     Args:
         file_path: File path in which the bibliography will be saved.
         token: Notion API token.
         database_id: Targeted database id.
+        partitions: Number of partitions of the database scanned in parallel.
+        incremental: Whether to only retrieve the pages edited since the
+            previous download.
+        index_path: Path of the local index, in which the time of the most
+            recent edit downloaded is recorded.
+        profile: Whether to print a profile of the download.
+        metrics_file: File in which the metrics of the download are written,
+            as JSON or in the text format of Prometheus (see `Metrics.write`).
 
     Returns:
         Error code.
     """
-    bibtex_str_list = get_bibtex_string_list_from_database(
-        token=token,
-        database_id=database_id,
-    )
-    write_to_file(
-        content='\n\n'.join(bibtex_str_list),
-        file_path=file_path,
-
-    )
+    key_index = KeyIndex(path=index_path) if index_path is not None else None
+    file_path = os.path.abspath(file_path)
+
+    high_water_mark = None
+    if incremental and key_index is not None and os.path.isfile(file_path):
+        high_water_mark = key_index.get_export_mark(database_id, file_path)
+
+    if high_water_mark is not None:
+        # `last_edited_time` is rounded to the minute, the pages edited
+        # during the minute of the mark are therefore fetched again.
+        pages = iter_pages_from_database(
+            token=token,
+            database_id=database_id,
+            filter={'timestamp': 'last_edited_time', 'last_edited_time': {'on_or_after': high_water_mark}},
+            property_names=['Bibtex'],
+        )
+    else:
+        pages = iter_pages_from_database_in_parallel(
+            token=token,
+            database_id=database_id,
+            partitions=partitions,
+            property_names=['Bibtex'],
+        )
+
+    last_edited_time_list = [high_water_mark or '']
+
+    def iter_bibtex_strings(page_list: Iterable[dict]):
+        for page in page_list:
+            last_edited_time_list.append(page.get('last_edited_time') or '')
+            try:
+                yield retrieve_bibtex_string(page)
+            except IndexError:
+                pass
+
+    if high_water_mark is not None:
+        count = merge_into_file(file_path, iter_bibtex_strings(pages))
+        print(f'{count} entries updated in "{file_path}".')
+    else:
+        with open_atomic(file_path) as f:
+            count = write_entries(f, iter_bibtex_strings(pages))
+        print(f'{count} entries downloaded in "{file_path}".')
+
+    if key_index is not None:
+        key_index.set_export_mark(database_id, file_path, max(last_edited_time_list) or None)
+        key_index.close()
+    report_metrics(profile=profile, metrics_file=metrics_file)
     return 0
+
+
+def write_entries(f: TextIO, bibtex_strings: Iterable[str], count: int = 0) -> int:
+    """Write the BibTeX strings separated by blank lines and report the
+    progress. Returns the total number of entries written, `count` being
+    the number of entries already in the file."""
+    metrics = get_metrics()
+    for bibtex_string in bibtex_strings:
+        with metrics.phase('write'):
+            if count:
+                f.write('\n\n')
+            f.write(bibtex_string)
+        metrics.count('entries_downloaded')
+        count += 1
+        if count % 1000 == 0:
+            logger.info('%d entries downloaded', count)
+    return count
+
+
+def merge_into_file(file_path: str, bibtex_strings: Iterable[str]) -> int:
+    """Replace the entries of the bib file that have the same key as one of
+    the BibTeX strings and append the others. The rest of the file is kept
+    as is.
+
+    Returns:
+        The number of BibTeX strings merged.
+    """
+    key_to_bibtex_string: Dict[str, str] = {}
+    for bibtex_string in bibtex_strings:
+        key = get_block_key(bibtex_string.lstrip())
+        if key is not None:
+            key_to_bibtex_string[key] = bibtex_string
+    count = len(key_to_bibtex_string)
+
+    with open(file_path, encoding='utf-8') as bibtex_file:
+        text = bibtex_file.read()
+
+    with get_metrics().phase('merge'), open_atomic(file_path) as f:
+        position = 0
+        for start, end in iter_block_spans(text):
+            key = get_block_key(text[start:end])
+            if key in key_to_bibtex_string:
+                f.write(text[position:start])
+                f.write(key_to_bibtex_string.pop(key).strip())
+                position = end
+        f.write(text[position:])
+        write_entries(f, key_to_bibtex_string.values(), count=1 if text.strip() else 0)
+    return count
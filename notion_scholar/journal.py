@@ -0,0 +1,144 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from notion_scholar.publication import Publication
+
+PLANNED = 'planned'
+SENT = 'sent'
+DONE = 'done'
+
+
+class PlannedOperation(NamedTuple):
+    """NamedTuple object used to store an operation of a synchronization
+    plan: the creation of the page of a publication or, if `property_names`
+    is set, the update of these properties of the page `page_id`. Once a
+    page is created, `page_id` is the id returned by Notion."""
+    database_id: str
+    publication: Publication
+    page_id: Optional[str] = None
+    property_names: Optional[List[str]] = None
+    status: str = PLANNED
+    position: Optional[int] = None
+
+    @property
+    def is_creation(self) -> bool:
+        return self.property_names is None
+
+
+class Journal:
+    """Local SQLite journal of the synchronizations with the databases.
+
+    A synchronization writes its plan, the pages to create and to update,
+    operation by operation before applying them. Every operation is marked as sent before its
+    request is sent to Notion and as done, with the id of the page, once
+    Notion confirmed it. If the synchronization is interrupted, the next run
+    resumes the plan: the operations done are skipped and only the creations
+    sent without confirmation need to be looked up in the database.
+
+    Args:
+        path: Path of the SQLite file, it is created if it does not exist.
+    """
+    def __init__(self, path: str):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        # An operation is checkpointed per request, the commits need to be cheap
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS operations ('
+                'position INTEGER PRIMARY KEY, '
+                'database_id TEXT NOT NULL, '
+                'publication TEXT NOT NULL, '
+                'page_id TEXT, '
+                'property_names TEXT, '
+                'status TEXT NOT NULL)',
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def append(self, operation: PlannedOperation) -> PlannedOperation:
+        """Append an operation to the plan and return it with its position."""
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO operations (database_id, publication, page_id, property_names, status) '
+                'VALUES (?, ?, ?, ?, ?)',
+                _get_row(operation),
+            )
+        return operation._replace(position=cursor.lastrowid)
+
+    def get_count(self, database_ids: Iterable[str], status: Optional[str] = None) -> int:
+        """Return the number of operations planned for the databases, or
+        the number of them with the given status."""
+        database_ids = list(database_ids)
+        query = f'SELECT COUNT(*) FROM operations WHERE database_id IN ({", ".join("?" * len(database_ids))})'
+        parameters = list(database_ids)
+        if status is not None:
+            query += ' AND status = ?'
+            parameters.append(status)
+        return self.connection.execute(query, parameters).fetchone()[0]
+
+    def has_plan(self, database_ids: Iterable[str]) -> bool:
+        """Whether a plan of the databases has not been entirely applied."""
+        return self.get_count(database_ids) > 0
+
+    def get_operation_list(self, database_ids: Iterable[str]) -> List[PlannedOperation]:
+        """Return the operations planned for the databases, in their order."""
+        database_ids = list(database_ids)
+        rows = self.connection.execute(
+            'SELECT database_id, publication, page_id, property_names, status, position FROM operations '
+            f'WHERE database_id IN ({", ".join("?" * len(database_ids))}) ORDER BY position',
+            database_ids,
+        )
+        return [
+            PlannedOperation(
+                database_id,
+                Publication(*json.loads(publication)),
+                page_id,
+                json.loads(property_names) if property_names is not None else None,
+                status,
+                position,
+            )
+            for database_id, publication, page_id, property_names, status, position in rows
+        ]
+
+    def mark_sent(self, operation: PlannedOperation) -> None:
+        with self.connection:
+            self.connection.execute(
+                'UPDATE operations SET status = ? WHERE position = ?',
+                (SENT, operation.position),
+            )
+
+    def mark_done(self, operation: PlannedOperation, page_id: str) -> None:
+        with self.connection:
+            self.connection.execute(
+                'UPDATE operations SET status = ?, page_id = ? WHERE position = ?',
+                (DONE, page_id, operation.position),
+            )
+
+    def discard(self, database_ids: Iterable[str]) -> None:
+        """Forget the plan of the databases."""
+        database_ids = list(database_ids)
+        with self.connection:
+            self.connection.execute(
+                f'DELETE FROM operations WHERE database_id IN ({", ".join("?" * len(database_ids))})',
+                database_ids,
+            )
+
+
+def _get_row(operation: PlannedOperation) -> Tuple[str, str, Optional[str], Optional[str], str]:
+    return (
+        operation.database_id,
+        json.dumps(list(operation.publication)),
+        operation.page_id,
+        json.dumps(operation.property_names) if operation.property_names is not None else None,
+        operation.status,
+    )
@@ -0,0 +1,249 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+
+from notion_scholar.diff import get_fingerprint
+from notion_scholar.diff import get_page_digest_dict
+from notion_scholar.diff import get_publication_digest_dict
+from notion_scholar.diff import IndexedPage
+from notion_scholar.notion_api import get_page_list_from_database
+from notion_scholar.notion_api import get_page_list_from_database_by_keys
+from notion_scholar.notion_api import get_publication_key
+from notion_scholar.notion_api import PROPERTY_TYPES
+from notion_scholar.notion_api import UploadResult
+
+
+class KeyIndex:
+    """Local SQLite index of the pages present in the Notion databases.
+
+    For each database, the index stores the id, the publication key
+    (`Filename` property) and the `last_edited_time` of every page, as well
+    as a high-water mark: the most recent `last_edited_time` seen during a
+    refresh. A refresh then only queries the pages edited since this mark.
+
+    The index can also store the content hash of the pages (see
+    `notion_scholar.diff`), it is cleared whenever a page is edited without
+    its properties being retrieved.
+
+    Pages moved to the trash are not returned by the database queries, a
+    full refresh (`full=True`) is needed to forget them.
+
+    Args:
+        path: Path of the SQLite file, it is created if it does not exist.
+    """
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                'database_id TEXT NOT NULL, '
+                'page_id TEXT NOT NULL, '
+                'key TEXT, '
+                'last_edited_time TEXT, '
+                'PRIMARY KEY (database_id, page_id))',
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS databases ('
+                'database_id TEXT PRIMARY KEY, '
+                'last_edited_time TEXT)',
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS exports ('
+                'database_id TEXT NOT NULL, '
+                'file_path TEXT NOT NULL, '
+                'last_edited_time TEXT, '
+                'PRIMARY KEY (database_id, file_path))',
+            )
+            column_names = {row[1] for row in self.connection.execute('PRAGMA table_info(pages)')}
+            for column_name in ('fingerprint', 'digests'):
+                if column_name not in column_names:
+                    self.connection.execute(f'ALTER TABLE pages ADD COLUMN {column_name} TEXT')
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get_page_dict(self, database_id: str) -> Dict[str, IndexedPage]:
+        """Return the indexed pages of the database, by publication key."""
+        rows = self.connection.execute(
+            'SELECT key, page_id, fingerprint, digests FROM pages '
+            'WHERE database_id = ? AND key IS NOT NULL',
+            (database_id,),
+        )
+        return {
+            key: IndexedPage(page_id, fingerprint, json.loads(digests) if digests else None)
+            for key, page_id, fingerprint, digests in rows
+        }
+
+    def get_high_water_mark(self, database_id: str) -> Optional[str]:
+        row = self.connection.execute(
+            'SELECT last_edited_time FROM databases WHERE database_id = ?',
+            (database_id,),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def get_export_mark(self, database_id: str, file_path: str) -> Optional[str]:
+        """Return the most recent `last_edited_time` of the pages exported to
+        `file_path` by the last download, if any."""
+        row = self.connection.execute(
+            'SELECT last_edited_time FROM exports WHERE database_id = ? AND file_path = ?',
+            (database_id, str(file_path)),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set_export_mark(self, database_id: str, file_path: str, last_edited_time: Optional[str]) -> None:
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO exports VALUES (?, ?, ?)',
+                (database_id, str(file_path), last_edited_time),
+            )
+
+    def add_pages(self, database_id: str, pages: Iterable[dict], with_digests: bool = False) -> None:
+        """Insert or update the pages returned by the Notion API. With
+        `with_digests`, the pages must contain all the managed properties,
+        otherwise the content hash of the pages edited since they were
+        indexed is cleared."""
+        rows = []
+        for page in pages:
+            try:
+                key = get_publication_key(page)
+            except (IndexError, KeyError):
+                key = None
+            fingerprint, digests = None, None
+            if with_digests:
+                digest_dict = get_page_digest_dict(page)
+                fingerprint, digests = get_fingerprint(digest_dict), json.dumps(digest_dict)
+            rows.append((database_id, page['id'], key, page.get('last_edited_time'), fingerprint, digests))
+
+        if with_digests:
+            on_conflict = 'fingerprint = excluded.fingerprint, digests = excluded.digests'
+        else:
+            on_conflict = (
+                'fingerprint = CASE WHEN pages.last_edited_time IS excluded.last_edited_time '
+                'THEN pages.fingerprint END, '
+                'digests = CASE WHEN pages.last_edited_time IS excluded.last_edited_time '
+                'THEN pages.digests END'
+            )
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO pages '
+                '(database_id, page_id, key, last_edited_time, fingerprint, digests) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (database_id, page_id) DO UPDATE SET '
+                f'{on_conflict}, key = excluded.key, last_edited_time = excluded.last_edited_time',
+                rows,
+            )
+
+    def add_results(self, database_id: str, results: Iterable[UploadResult]) -> None:
+        """Insert the pages created or updated by notion-scholar, without
+        moving the high-water mark, the pages edited concurrently by others
+        are therefore still fetched by the next refresh."""
+        rows = []
+        for result in results:
+            digest_dict = get_publication_digest_dict(result.publication)
+            rows.append((
+                database_id,
+                result.page_id,
+                result.publication.key,
+                result.last_edited_time,
+                get_fingerprint(digest_dict),
+                json.dumps(digest_dict),
+            ))
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO pages '
+                '(database_id, page_id, key, last_edited_time, fingerprint, digests) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+
+    def clear(self, database_id: str) -> None:
+        with self.connection:
+            self.connection.execute('DELETE FROM pages WHERE database_id = ?', (database_id,))
+            self.connection.execute('DELETE FROM databases WHERE database_id = ?', (database_id,))
+
+    def refresh(
+            self,
+            token: str,
+            database_id: str,
+            full: bool = False,
+            with_digests: bool = False,
+            partitions: int = 1,
+    ) -> int:
+        """Synchronize the index with the database `database_id`.
+
+        Args:
+            token: Notion API token.
+            database_id: Targeted database id.
+            full: Whether to rebuild the index from a scan of the whole
+                database instead of querying the recently edited pages.
+            with_digests: Whether to retrieve all the managed properties in
+                order to store the content hash of the pages. The pages
+                indexed without hash are then retrieved by key.
+            partitions: Number of partitions of the database scanned in
+                parallel when the whole database is scanned.
+
+        Returns:
+            The number of pages retrieved from Notion.
+        """
+        high_water_mark = None if full else self.get_high_water_mark(database_id)
+        property_names = list(PROPERTY_TYPES) if with_digests else ['Filename']
+
+        # `last_edited_time` is rounded to the minute, the pages edited during
+        # the minute of the mark are therefore fetched again (`on_or_after`).
+        query_filter = None
+        if high_water_mark is not None:
+            query_filter = {
+                'timestamp': 'last_edited_time',
+                'last_edited_time': {'on_or_after': high_water_mark},
+            }
+
+        if query_filter is None and partitions > 1:
+            pages = get_page_list_from_database(
+                token=token,
+                database_id=database_id,
+                property_names=property_names,
+                partitions=partitions,
+            )
+        else:
+            pages = get_page_list_from_database(
+                token=token,
+                database_id=database_id,
+                filter=query_filter,
+                sorts=[{'timestamp': 'last_edited_time', 'direction': 'ascending'}],
+                property_names=property_names,
+            )
+
+        if full:
+            self.clear(database_id)
+        self.add_pages(database_id, pages, with_digests=with_digests)
+
+        last_edited_time_list = [p['last_edited_time'] for p in pages if p.get('last_edited_time')]
+        if last_edited_time_list:
+            high_water_mark = max([*last_edited_time_list, high_water_mark or ''])
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO databases VALUES (?, ?)',
+                (database_id, high_water_mark),
+            )
+
+        if with_digests:
+            rows = self.connection.execute(
+                'SELECT key FROM pages WHERE database_id = ? AND key IS NOT NULL AND fingerprint IS NULL',
+                (database_id,),
+            )
+            missing_keys = [key for key, in rows]
+            if missing_keys:
+                missing_pages = get_page_list_from_database_by_keys(
+                    token=token,
+                    database_id=database_id,
+                    keys=missing_keys,
+                    property_names=property_names,
+                )
+                self.add_pages(database_id, missing_pages, with_digests=True)
+                pages.extend(missing_pages)
+        return len(pages)
@@ -1,15 +1,30 @@
 import sys
+import logging
 import argparse
 
-from notion_scholar.run import run
-from notion_scholar.download import download
-
 from notion_scholar.utilities import get_token
 from notion_scholar.config import ConfigManager
 
 
+class _SavedValues(dict):
+    """Saved values displayed in the help messages, the token and the config
+    are only retrieved when a help message is formatted."""
+    def __missing__(self, key):
+        value = get_token() if key == 'token' else ConfigManager().get().get(key, None)
+        self[key] = value
+        return value
+
+
+class LazyHelpFormatter(argparse.HelpFormatter):
+    """Help formatter filling the `{token}`, `{database_id}` and `{file_path}`
+    placeholders of the help strings with the saved values."""
+    saved_values = _SavedValues()
+
+    def _expand_help(self, action):
+        return super()._expand_help(action).format_map(self.saved_values)
+
+
 def get_parser():
-    token = get_token()
     config = ConfigManager().get()
 
     parser = argparse.ArgumentParser(
@@ -21,6 +36,43 @@ def get_parser():
     # Parent parser
     parent_parser = argparse.ArgumentParser(add_help=False)
 
+    # Parent parser of the modes reporting metrics
+    metrics_parser = argparse.ArgumentParser(add_help=False)
+    metrics_group = metrics_parser.add_argument_group('metrics')
+    metrics_group.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print the time spent in each phase, the number and latency of the requests sent to Notion, the bytes '
+             'transferred, the retries and the number of entries processed (for watch, once it is stopped).',
+    )
+    metrics_group.add_argument(
+        '--metrics-file',
+        default=None, type=str, metavar='',
+        help='File in which the same metrics are written (for watch, after every synchronization), as JSON if its '
+             'extension is ".json" and in the text format of Prometheus otherwise (e.g. for the textfile collector '
+             'of the node exporter).',
+    )
+
+    # Parent parser of the modes sending many requests to Notion
+    connection_parser = argparse.ArgumentParser(add_help=False)
+    connection_group = connection_parser.add_argument_group('connection to Notion')
+    connection_group.add_argument(
+        '--pool-size',
+        default=None, type=int, metavar='',
+        help='Maximum number of connections to Notion kept open and reused by all the requests. \n'
+             '(default: the largest of 10, the workers and the partitions)',
+    )
+    connection_group.add_argument(
+        '--timeout',
+        default=60.0, type=float, metavar='',
+        help='Timeout of the requests sent to Notion (read, write and wait for a connection), in seconds. \n(default: 60.0)',
+    )
+    connection_group.add_argument(
+        '--connect-timeout',
+        default=10.0, type=float, metavar='',
+        help='Timeout of the connection to Notion, in seconds. \n(default: 10.0)',
+    )
+
     # Choice of the subparser
     subparsers = parser.add_subparsers(
         help='Selection of the action to perform.', dest='mode',
@@ -28,20 +80,20 @@ def get_parser():
 
     # Run parser
     run_parser = subparsers.add_parser(
-        'run', parents=[parent_parser],
+        'run', parents=[parent_parser, connection_parser, metrics_parser], formatter_class=LazyHelpFormatter,
         help='Run notion-scholar.',
     )
     run_parser.add_argument(
         '-t', '--token',
         default=None, type=str, metavar='',
-        help=f'Token used to connect to Notion. \n(default: {token})',
+        help='Token used to connect to Notion. \n(default: {token})',
     )
     run_parser.add_argument(
         '-db', '--database-id',
         default=None, type=str, metavar='',
-        help=f'Database that will be furnished. The database_id can be found in the url of the database: \n'
-             f'https://www.notion.so/{{workspace_name}}/{{database_id}}?v={{view_id}} \n'
-             f'(default: {config.get("database_id", None)})',
+        help='Database that will be furnished. The database_id can be found in the url of the database: \n'
+             'https://www.notion.so/{{workspace_name}}/{{database_id}}?v={{view_id}} \n'
+             '(default: {database_id})',
     )
 
     if config.get('file_path', None) is None:
@@ -52,8 +104,8 @@ def get_parser():
     group.add_argument(
         '-f', '--file-path',
         default=None, type=str, metavar='',
-        help=f'Bib file that will be used. This argument is required if the bib file is not saved in the config and no bib-string is passed. \n'
-             f'(default: {config.get("bib_file_path", None)})',  # noqa: E501
+        help='Bib file that will be used. This argument is required if the bib file is not saved in the config and no bib-string is passed. \n'
+             '(default: {file_path})',  # noqa: E501
     )
     group.add_argument(
         '-s', '--string',
@@ -62,66 +114,281 @@ def get_parser():
              'By default, the entries will be saved to the bib file from the config. '
              'It is possible to disable this behavior by changing the "save" option: "ns setup -save false".',
     )
+    group.add_argument(
+        '-a', '--all',
+        action='store_true', dest='all_targets',
+        help='Synchronize all the targets saved in the config (see "ns set-config --target") in a single run: '
+             'the bib files are parsed in parallel and the pages of all the databases are created under the same '
+             'rate limit, in turn.',
+    )
+    run_parser.add_argument(
+        '-w', '--workers',
+        default=3, type=int, metavar='',
+        help='Number of pages created concurrently in the database, the requests '
+             'remain limited to the average rate allowed by Notion. \n(default: 3)',
+    )
+    run_parser.add_argument(
+        '-r', '--rebuild-index',
+        action='store_true',
+        help='Rebuild the local index of the keys present in the database from a full scan of the database. \n'
+             'By default, only the pages edited since the last run are retrieved. A rebuild is needed after '
+             'deleting pages from the database.',
+    )
+    run_parser.add_argument(
+        '-u', '--update',
+        action='store_true',
+        help='Also update the pages of the publications already present in the database whose bibtex entry changed. \n'
+             'Only the properties that differ are sent, the unchanged publications do not cost any request.',
+    )
+    run_parser.add_argument(
+        '-p', '--processes',
+        default=1, type=int, metavar='',
+        help='Number of processes used to parse the bib file, useful for very large files. '
+             'Not available with --all, whose bib files are parsed in parallel. \n(default: 1)',
+    )
+    run_parser.add_argument(
+        '--partitions',
+        default=1, type=int, metavar='',
+        help='Number of partitions of the database (by creation time) scanned in parallel when the whole database needs to be scanned. \n'
+             '(default: 1)',
+    )
+    run_parser.add_argument(
+        '--dedupe',
+        action='store_true',
+        help='Do not add the publications that duplicate a page of the database or another publication under a different key: '
+             'same DOI or arXiv id, or same (or very similar) title and same URL or first author. '
+             'The titles, DOIs, URLs and authors of all the pages are retrieved.',
+    )
+    run_parser.add_argument(
+        '--discard-plan',
+        action='store_true',
+        help='Discard the plan of an interrupted synchronization instead of resuming it. \n'
+             'By default, a run interrupted (crash, network failure...) is resumed by the next run, which only creates '
+             'and updates the pages left without reading the bib file nor the database again.',
+    )
+
+    # Watch parser
+    watch_parser = subparsers.add_parser(
+        'watch', parents=[parent_parser, connection_parser, metrics_parser], formatter_class=LazyHelpFormatter,
+        help='Watch the bib file and add the new publications to the database as they are written.',
+    )
+    watch_parser.add_argument(
+        '-t', '--token',
+        default=None, type=str, metavar='',
+        help='Token used to connect to Notion. \n(default: {token})',
+    )
+    watch_parser.add_argument(
+        '-db', '--database-id',
+        default=None, type=str, metavar='',
+        help='Database that will be furnished. The database_id can be found in the url of the database: \n'
+             'https://www.notion.so/{{workspace_name}}/{{database_id}}?v={{view_id}} \n'
+             '(default: {database_id})',
+    )
+    watch_parser.add_argument(
+        '-f', '--file-path',
+        default=None, type=str, metavar='',
+        help='Bib file that will be watched. This argument is required if the bib file is not saved in the config. \n'
+             '(default: {file_path})',  # noqa: E501
+    )
+    watch_parser.add_argument(
+        '-w', '--workers',
+        default=3, type=int, metavar='',
+        help='Number of pages created concurrently in the database. \n(default: 3)',
+    )
+    watch_parser.add_argument(
+        '-u', '--update',
+        action='store_true',
+        help='Also update the pages of the publications whose bibtex entry changed.',
+    )
+    watch_parser.add_argument(
+        '-i', '--interval',
+        default=1.0, type=float, metavar='',
+        help='Interval between two checks of the bib file, in seconds. \n(default: 1.0)',
+    )
+    watch_parser.add_argument(
+        '-d', '--debounce',
+        default=2.0, type=float, metavar='',
+        help='Delay without modification of the bib file before the changes are pushed, in seconds. \n'
+             '(default: 2.0)',
+    )
+    watch_parser.add_argument(
+        '--partitions',
+        default=1, type=int, metavar='',
+        help='Number of partitions of the database (by creation time) scanned in parallel when the whole database needs to be scanned. \n'
+             '(default: 1)',
+    )
 
     # Download bibtex parser
     download_parser = subparsers.add_parser(
-        'download', parents=[parent_parser],
+        'download', parents=[parent_parser, connection_parser, metrics_parser], formatter_class=LazyHelpFormatter,
         help='Download the bibtex entries present in the notion database.',
     )
     download_parser.add_argument(
         '-f', '--file-path',
-        default=None, type=str, metavar='', required=True,
+        default=None, type=str, metavar='FILE', required=True,
         help='File in which the bibtex entries will be saved.',
     )
     download_parser.add_argument(
         '-t', '--token',
         default=None, type=str, metavar='', required=False,
-        help=f'Token used to connect to Notion. \n(default: {token})',
+        help='Token used to connect to Notion. \n(default: {token})',
+    )
+    download_parser.add_argument(
+        '-db', '--database-id',
+        default=None, type=str, metavar='',
+        help='Database that will be downloaded. The database_id can be found in the url of the database: \n'
+             'https://www.notion.so/{{workspace_name}}/{{database_id}}?v={{view_id}} \n'
+             '(default: {database_id})',
     )
     download_parser.add_argument(
+        '--partitions',
+        default=1, type=int, metavar='',
+        help='Number of partitions of the database (by creation time) scanned in parallel when downloading it. \n'
+             '(default: 1)',
+    )
+    download_parser.add_argument(
+        '-i', '--incremental',
+        action='store_true',
+        help='Only retrieve the pages edited since the previous download to the same file, and merge them into it. \n'
+             'The entries of the pages deleted from the database are kept until a complete download.',
+    )
+
+    # Dedupe parser
+    dedupe_parser = subparsers.add_parser(
+        'dedupe', parents=[parent_parser, metrics_parser], formatter_class=LazyHelpFormatter,
+        help='Report the duplicate publications of the bib file and the notion database.',
+    )
+    dedupe_parser.add_argument(
+        '-t', '--token',
+        default=None, type=str, metavar='',
+        help='Token used to connect to Notion. \n(default: {token})',
+    )
+    dedupe_parser.add_argument(
         '-db', '--database-id',
         default=None, type=str, metavar='',
-        help=f'Database that will be downloaded. The database_id can be found in the url of the database: \n'
-             f'https://www.notion.so/{{workspace_name}}/{{database_id}}?v={{view_id}} \n'
-             f'(default: {config.get("database_id", None)})',
+        help='Database that will be checked. The database_id can be found in the url of the database: \n'
+             'https://www.notion.so/{{workspace_name}}/{{database_id}}?v={{view_id}} \n'
+             '(default: {database_id})',
+    )
+    dedupe_parser.add_argument(
+        '-f', '--file-path',
+        default=None, type=str, metavar='',
+        help='Bib file that will be checked along with the database. \n(default: {file_path})',
+    )
+    dedupe_parser.add_argument(
+        '--threshold',
+        default=0.8, type=float, metavar='',
+        help='Minimum similarity (Jaccard index of their trigrams) of two titles for them to be reported as duplicates. \n'
+             '(default: 0.8)',
+    )
+    dedupe_parser.add_argument(
+        '--skip-database',
+        action='store_true',
+        help='Only check the bib file.',
+    )
+    dedupe_parser.add_argument(
+        '--partitions',
+        default=1, type=int, metavar='',
+        help='Number of partitions of the database (by creation time) scanned in parallel. \n(default: 1)',
+    )
+
+    # Check PDFs parser
+    check_pdfs_parser = subparsers.add_parser(
+        'check-pdfs', parents=[parent_parser, metrics_parser], formatter_class=LazyHelpFormatter,
+        help='Report the entries of the bib file without PDF file, and the PDF files without entry.',
+    )
+    check_pdfs_parser.add_argument(
+        '-d', '--folder-path',
+        default=None, type=str, metavar='FOLDER', required=True,
+        help='Folder of the PDF files, named after the keys of their entries ("<key>.pdf"). Its subfolders are scanned as well.',
+    )
+    check_pdfs_parser.add_argument(
+        '-f', '--file-path',
+        default=None, type=str, metavar='',
+        help='Bib file that will be checked. \n(default: {file_path})',
+    )
+
+    # Search parser
+    search_parser = subparsers.add_parser(
+        'search', parents=[parent_parser, metrics_parser], formatter_class=LazyHelpFormatter,
+        help='Search the publications of the bib file by keyword, offline.',
+    )
+    search_parser.add_argument(
+        'query',
+        nargs='+', type=str,
+        help='Words searched in the key, title, authors, abstract, journal, year and DOI of the publications. '
+             'The syntax of SQLite FTS5 is supported: "a phrase", prefix*, OR, NOT, authors:name, ...',
+    )
+    search_parser.add_argument(
+        '-f', '--file-path',
+        default=None, type=str, metavar='',
+        help='Bib file that will be searched. \n(default: {file_path})',
+    )
+    search_parser.add_argument(
+        '-n', '--limit',
+        default=20, type=int, metavar='',
+        help='Maximum number of publications printed. \n(default: 20)',
+    )
+    search_parser.add_argument(
+        '-p', '--processes',
+        default=1, type=int, metavar='',
+        help='Number of processes used to parse the bib file when it is indexed, useful for very large files. '
+             '\n(default: 1)',
+    )
+    search_parser.add_argument(
+        '--rebuild-index',
+        action='store_true',
+        help='Rebuild the local search index from the bib file. '
+             'It is otherwise updated with the entries edited since the last search.',
     )
 
     # Clear config parser
     clear_parser = subparsers.add_parser(  # noqa: F841
-        'clear-config', parents=[parent_parser],
+        'clear-config', parents=[parent_parser], formatter_class=LazyHelpFormatter,
         help='Clear the notion-scholar config.',
     )
 
     # Inspect config parser
     inspect_parser = subparsers.add_parser(  # noqa: F841
-        'inspect-config', parents=[parent_parser],
+        'inspect-config', parents=[parent_parser], formatter_class=LazyHelpFormatter,
         help='Inspect the notion-scholar config.',
     )
 
     # Setup parser
     setup_parser = subparsers.add_parser(
-        'set-config', parents=[parent_parser],
+        'set-config', parents=[parent_parser], formatter_class=LazyHelpFormatter,
         help='Save the provided preferences.',
     )
     setup_parser.add_argument(
         '-f', '--file-path',
         default=None, type=str, metavar='',
-        help=f'Save the bibtex file that will be used when running notion-scholar without source arguments. '
-             f'The path must be absolute and the file need to exist. '
-             f'(current: {config.get("bib_file_path", None)})',
+        help='Save the bibtex file that will be used when running notion-scholar without source arguments. '
+             'The path must be absolute and the file need to exist. '
+             '(current: {file_path})',
     )
     setup_parser.add_argument(
         '-t', '--token',
         default=None, type=str, metavar='',
-        help=f'Save the Notion integration token. \n(current: {token})',
+        help='Save the Notion integration token. \n(current: {token})',
     )
     setup_parser.add_argument(
         '-db', '--database-id',
         default=None, type=str, metavar='',
-        help=f'Save the database-id in the user config. '
-             f'The database_id can be found in the url of the database: \n'
-             f'https://www.notion.so/{{workspace_name}}/{{database_id}}?v={{view_id}} \n'
-             f'(current: {config.get("database_id", None)})',
+        help='Save the database-id in the user config. '
+             'The database_id can be found in the url of the database: \n'
+             'https://www.notion.so/{{workspace_name}}/{{database_id}}?v={{view_id}} \n'
+             '(current: {database_id})',
+    )
+    setup_parser.add_argument(
+        '--target',
+        default=None, type=str, metavar='',
+        help='Save the file-path and the database-id as the target of that name, synchronized by "ns run --all", '
+             'instead of saving them as the defaults.',
+    )
+    setup_parser.add_argument(
+        '--remove-target',
+        default=None, type=str, metavar='',
+        help='Remove the target of that name from the config.',
     )
 
     return parser
@@ -137,12 +404,21 @@ def main() -> int:
 
     need_token_or_database_id = {
         'run': True,
+        'watch': True,
         'download': True,
+        'dedupe': not getattr(arguments, 'skip_database', False),
+        'check-pdfs': False,
+        'search': False,
         'set-config': False,
         'clear-config': False,
         'inspect-config': False,
     }
 
+    if getattr(arguments, 'all_targets', False) and arguments.processes != 1:
+        parser.error(
+            "Error: The '--processes' argument cannot be used with '--all', the bib files are parsed in parallel.",
+        )
+
     kwargs = vars(arguments)
     mode = kwargs.pop('mode', None)
     config_manager = ConfigManager(**kwargs)
@@ -153,15 +429,47 @@ def main() -> int:
             parser.error("Error: The '--token' argument is required but not provided nor saved.")
 
         config = config_manager.get()
-        if config.get('database_id', None) is None and 'database_id' in arguments and arguments.database_id is None:
+        if config.get('database_id', None) is None and 'database_id' in arguments and arguments.database_id is None \
+                and not kwargs.get('all_targets', False):
             parser.error("Error: The '--database-id' argument is required but not provided nor saved.")
 
-    if mode == 'run':
+    # The progress of the uploads is logged
+    logging.basicConfig(format='%(message)s', stream=sys.stdout)
+    logging.getLogger('notion_scholar').setLevel(logging.INFO)
+
+    # The modes using Notion import their (heavy) dependencies when needed
+    if need_token_or_database_id[mode]:
+        from notion_scholar.notion_api import set_connection_settings
+        set_connection_settings(**config_manager.get_connection_kwargs())
+
+    if mode == 'run' and config_manager.all_targets:
+        from notion_scholar.run_all import run_all
+        return run_all(**config_manager.get_run_all_kwargs())
+
+    elif mode == 'run':
+        from notion_scholar.run import run
         return run(**config_manager.get_run_kwargs())
 
+    elif mode == 'watch':
+        from notion_scholar.watch import watch
+        return watch(**config_manager.get_watch_kwargs())
+
     elif mode == 'download':
+        from notion_scholar.download import download
         return download(**config_manager.get_download_kwargs())
 
+    elif mode == 'dedupe':
+        from notion_scholar.dedupe import dedupe
+        return dedupe(**config_manager.get_dedupe_kwargs())
+
+    elif mode == 'check-pdfs':
+        from notion_scholar.check_pdfs import check_pdfs
+        return check_pdfs(**config_manager.get_check_pdfs_kwargs())
+
+    elif mode == 'search':
+        from notion_scholar.search import search
+        return search(**config_manager.get_search_kwargs())
+
     elif mode == 'set-config':
         config_manager.setup()
         return 0
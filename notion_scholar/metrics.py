@@ -0,0 +1,253 @@
+import json
+import threading
+import time
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+
+from notion_scholar.utilities import open_atomic
+
+T = TypeVar('T')
+
+REQUEST_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+
+class _Phase:
+    """Context manager adding its duration to a phase of the metrics. The
+    time spent in the phases nested in it (in the same thread) is excluded,
+    the durations of the phases therefore add up to the wall time of each
+    thread."""
+    __slots__ = ('metrics', 'name', 'start', 'nested')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> '_Phase':
+        stack = self.metrics._get_stack()
+        stack.append(self)
+        self.nested = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.start
+        stack = self.metrics._get_stack()
+        stack.pop()
+        if stack:
+            stack[-1].nested += elapsed
+        self.metrics._add_phase(self.name, elapsed - self.nested)
+
+
+class RequestStats:
+    """Statistics of the requests sent to one endpoint of the API."""
+    def __init__(self):
+        self.status_count: Dict[str, int] = {}
+        self.bucket_count = [0] * len(REQUEST_DURATION_BUCKETS)
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.status_count.values())
+
+    def get_quantile(self, q: float) -> float:
+        """Upper bound of the bucket of the `q` quantile of the durations."""
+        rank, cumulated = q * self.count, 0
+        for bound, count in zip(REQUEST_DURATION_BUCKETS, self.bucket_count):
+            cumulated += count
+            if cumulated >= rank:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+
+class Metrics:
+    """Instrumentation of a synchronization: wall time per phase, number,
+    status and latency histogram of the API calls per endpoint, bytes sent
+    and received, and counters (entries parsed, pages created, retries...).
+
+    The phases are recorded with `with metrics.phase(name):`, in any thread,
+    the API calls by the `RequestScheduler` and the bytes by the hooks of
+    the HTTP client (see `notion_api.get_client`). The metrics can be
+    written as JSON or in the text format of Prometheus, for instance for
+    the textfile collector of the node exporter.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._start = time.perf_counter()
+            self.phase_seconds: Dict[str, float] = {}
+            self.phase_count: Dict[str, int] = {}
+            self.requests: Dict[str, RequestStats] = {}
+            self.counters: Dict[str, int] = {}
+
+    def phase(self, name: str) -> _Phase:
+        return _Phase(self, name)
+
+    def iter_phase(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yield the items of `iterable`, the time spent producing them being
+        recorded in the phase `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_request(self, endpoint: str, seconds: float, status: str = 'ok') -> None:
+        """Record an API call (a single attempt) and its duration."""
+        with self._lock:
+            stats = self.requests.get(endpoint)
+            if stats is None:
+                stats = self.requests[endpoint] = RequestStats()
+            stats.status_count[status] = stats.status_count.get(status, 0) + 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            for i, bound in enumerate(REQUEST_DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats.bucket_count[i] += 1
+                    break
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'started': self.started,
+                'wall_seconds': round(time.perf_counter() - self._start, 6),
+                'phases': {
+                    name: {'seconds': round(seconds, 6), 'count': self.phase_count[name]}
+                    for name, seconds in sorted(self.phase_seconds.items())
+                },
+                'requests': {
+                    endpoint: {
+                        'count': stats.count,
+                        'status': dict(sorted(stats.status_count.items())),
+                        'seconds': round(stats.seconds, 6),
+                        'max_seconds': round(stats.max_seconds, 6),
+                        'buckets': dict(zip(map(str, REQUEST_DURATION_BUCKETS), stats.bucket_count)),
+                    }
+                    for endpoint, stats in sorted(self.requests.items())
+                },
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+    def to_prometheus(self, prefix: str = 'notion_scholar') -> str:
+        """Return the metrics in the text exposition format of Prometheus."""
+        lines: List[str] = []
+
+        def add(name: str, kind: str, description: str, samples: List[Tuple[str, float]]) -> None:
+            lines.append(f'# HELP {prefix}_{name} {description}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            lines.extend(f'{prefix}_{name}{labels} {value:g}' for labels, value in samples)
+
+        with self._lock:
+            add('wall_seconds', 'gauge', 'Wall time since the start of the measures.', [
+                ('', time.perf_counter() - self._start),
+            ])
+            add('phase_seconds_total', 'counter', 'Wall time spent in each phase, nested phases excluded.', [
+                (f'{{phase="{name}"}}', seconds) for name, seconds in sorted(self.phase_seconds.items())
+            ])
+            add('requests_total', 'counter', 'Number of API calls, by endpoint and status.', [
+                (f'{{endpoint="{endpoint}",status="{status}"}}', count)
+                for endpoint, stats in sorted(self.requests.items())
+                for status, count in sorted(stats.status_count.items())
+            ])
+            samples = []
+            for endpoint, stats in sorted(self.requests.items()):
+                cumulated = 0
+                for bound, count in zip(REQUEST_DURATION_BUCKETS, stats.bucket_count):
+                    cumulated += count
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    samples.append((f'_bucket{{endpoint="{endpoint}",le="{le}"}}', cumulated))
+                samples.append((f'_sum{{endpoint="{endpoint}"}}', stats.seconds))
+                samples.append((f'_count{{endpoint="{endpoint}"}}', stats.count))
+            lines.append(f'# HELP {prefix}_request_duration_seconds Duration of the API calls.')
+            lines.append(f'# TYPE {prefix}_request_duration_seconds histogram')
+            lines.extend(f'{prefix}_request_duration_seconds{labels} {value:g}' for labels, value in samples)
+            for name, value in sorted(self.counters.items()):
+                add(f'{name}_total', 'counter', f'Number of {name.replace("_", " ")}.', [('', value)])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file_path: str) -> None:
+        """Write the metrics in `file_path`, as JSON if its extension is
+        `.json` and in the text format of Prometheus otherwise. The file is
+        replaced atomically, as expected by the textfile collectors."""
+        if file_path.endswith('.json'):
+            content = json.dumps(self.to_dict(), indent=2) + '\n'
+        else:
+            content = self.to_prometheus()
+        with open_atomic(file_path) as f:
+            f.write(content)
+
+    def format_report(self) -> str:
+        """Return a human readable summary of the metrics."""
+        report = self.to_dict()
+        lines = [f'\nProfile ({report["wall_seconds"]:.2f} s):']
+        if report['phases']:
+            lines.append('  phases (all threads, nested phases excluded):')
+            for name, phase in sorted(report['phases'].items(), key=lambda item: -item[1]['seconds']):
+                lines.append(f'    {name:<20} {phase["seconds"]:10.3f} s {phase["count"]:10} calls')
+        if report['requests']:
+            lines.append('  requests:')
+            with self._lock:
+                for endpoint, stats in sorted(self.requests.items()):
+                    status = ', '.join(f'{s}: {c}' for s, c in sorted(stats.status_count.items()))
+                    lines.append(
+                        f'    {endpoint:<20} {stats.count:10} calls  mean {stats.seconds / stats.count:.3f} s  '
+                        f'p50 <= {stats.get_quantile(0.5):.3f} s  p95 <= {stats.get_quantile(0.95):.3f} s  '
+                        f'max {stats.max_seconds:.3f} s  ({status})',
+                    )
+        if report['counters']:
+            lines.append('  counters:')
+            for name, value in report['counters'].items():
+                lines.append(f'    {name:<24} {value:10}')
+        return '\n'.join(lines)
+
+    def _get_stack(self) -> List[_Phase]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add_phase(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+            self.phase_count[name] = self.phase_count.get(name, 0) + 1
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Return the metrics shared by the whole process."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
+
+
+def report_metrics(profile: bool = False, metrics_file: Optional[str] = None) -> None:
+    """Print the summary of the metrics with `profile` and write them in
+    `metrics_file` if provided (see `Metrics.write`)."""
+    metrics = get_metrics()
+    if metrics_file is not None:
+        metrics.write(metrics_file)
+    if profile:
+        print(metrics.format_report())
@@ -1,12 +1,35 @@
+import logging
+import queue
+import threading
+import time
 import warnings
+from collections import deque
+from datetime import datetime
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Sized
+from typing import Tuple
 from typing import Union
 
+import httpx
 from notion_client import Client
 
+from notion_scholar.metrics import get_metrics
 from notion_scholar.publication import Publication
+from notion_scholar.scheduler import get_scheduler
+from notion_scholar.utilities import NotionScholarException
+
+logger = logging.getLogger(__name__)
 
 
 class Property:
@@ -34,122 +57,934 @@ class Property:
     def select(value: str) -> dict:
         return {"select": {"name": value}}
 
+    @staticmethod
+    def multi_select(value: str) -> dict:
+        return {'multi_select': [{'name': value}]}
 
-def add_publications_to_database(
-        publications: List[Publication],
-        token: str,
-        database_id: str,
+    @staticmethod
+    def date(value: str) -> dict:
+        return {'date': {'start': value}}
+
+
+PROPERTY_TYPES: Dict[str, Callable[[Any], dict]] = {
+    'Title': Property.title,
+    'Abstract': Property.rich_text,
+    'Bibtex': Property.rich_text,
+    'Filename': Property.rich_text,
+    'Journal': Property.rich_text,
+    'Authors': Property.rich_text,
+    'Year': Property.number,
+    'URL': Property.url,
+    'Type': Property.select,
+    'DOI': Property.rich_text,
+}
+
+# Kind of the value of each managed property, and the types of the Notion
+# properties that can store it
+PROPERTY_KINDS: Dict[str, str] = {
+    **{name: 'text' for name in PROPERTY_TYPES},
+    'Year': 'number',
+    'Inbox': 'checkbox',
+}
+COMPATIBLE_TYPES: Dict[str, Set[str]] = {
+    'text': {'title', 'rich_text', 'url', 'email', 'phone_number', 'select', 'multi_select'},
+    'number': {'number', 'title', 'rich_text', 'select', 'multi_select', 'date'},
+    'checkbox': {'checkbox'},
+}
+SCHEMA_TTL = 300.0
+
+
+class UploadResult(NamedTuple):
+    """NamedTuple object used to report the outcome of a single page creation
+    or update."""
+    publication: Publication
+    page_id: Optional[str] = None
+    error: Optional[Exception] = None
+    last_edited_time: Optional[str] = None
+    database_id: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+class PageUpdate(NamedTuple):
+    """NamedTuple object describing the properties of a page to update."""
+    page_id: str
+    publication: Publication
+    property_names: List[str]
+    database_id: Optional[str] = None
+
+
+class ConnectionSettings(NamedTuple):
+    """NamedTuple object used to store the settings of the pool of
+    connections to the Notion API.
+
+    `pool_size` connections at most are opened, and kept alive between the
+    requests for `keepalive_expiry` seconds. `timeout` applies to the reads,
+    the writes and the wait for a free connection of the pool. HTTP/2 is
+    used if `http2` is `None` and the `h2` package is installed."""
+    pool_size: int = 10
+    timeout: float = 60.0
+    connect_timeout: float = 10.0
+    keepalive_expiry: float = 60.0
+    http2: Optional[bool] = None
+
+
+_client_dict: Dict[str, Client] = {}
+_client_factory: Optional[Callable[[str], Client]] = None
+_connection_settings = ConnectionSettings()
+_client_lock = threading.Lock()
+
+
+def get_client(token: str) -> Client:
+    """Return the Notion client of the token, a single client (and therefore
+    a single pool of connections) is created per token and process."""
+    with _client_lock:
+        if token not in _client_dict:
+            if _client_factory is not None:
+                client = _client_factory(token)
+            else:
+                client = create_client(token, _connection_settings)
+            client.client.event_hooks = {
+                'request': [*client.client.event_hooks['request'], _count_bytes_sent],
+                'response': [*client.client.event_hooks['response'], _count_bytes_received],
+            }
+            _client_dict[token] = client
+        return _client_dict[token]
+
+
+def _count_bytes_sent(request: httpx.Request) -> None:
+    get_metrics().count('bytes_sent', len(request.content))
+
+
+def _count_bytes_received(response: httpx.Response) -> None:
+    response.read()
+    get_metrics().count('bytes_received', len(response.content))
+
+
+def create_client(token: str, settings: ConnectionSettings = ConnectionSettings()) -> Client:
+    """Create a Notion client backed by a pool of keep-alive connections.
+
+    Args:
+        token: Notion API token.
+        settings: Size of the pool, timeouts and protocol of the connections.
+    """
+    http2 = settings.http2 if settings.http2 is not None else is_http2_available()
+    http_client = httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.pool_size,
+            max_keepalive_connections=settings.pool_size,
+            keepalive_expiry=settings.keepalive_expiry,
+        ),
+    )
+    client = Client(auth=token, client=http_client)
+    # The Notion client sets a single timeout, for every phase of a request
+    http_client.timeout = httpx.Timeout(settings.timeout, connect=settings.connect_timeout)
+    return client
+
+
+def is_http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def set_client_factory(factory: Optional[Callable[[str], Client]] = None) -> None:
+    """Replace the function creating the Notion clients from a token, for
+    instance to send the requests to a local stand-in of the API (see
+    `benchmarks/fake_notion.py`). The clients already created are
+    closed, `None` restores the default factory."""
+    global _client_factory
+    with _client_lock:
+        _client_factory = factory
+        _close_clients()
+    _schema_dict.clear()
+
+
+def set_connection_settings(
+        pool_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        http2: Optional[bool] = None,
 ) -> None:
-    # todo retrieve the list of all the property and filter
-    # todo update_database_with_publications check the empty fields and fill them
-    client = Client(auth=token)
-    for i, publication in enumerate(publications, start=1):
-        print(f'{i}/{len(publications)}: {publication}')
-
-        abstract = publication.abstract
-        if len(abstract) > 2000:
+    """Change the settings of the connections of the clients created by the
+    default factory (see `ConnectionSettings`), the settings left to `None`
+    keep their value. The clients already created are closed."""
+    global _connection_settings
+    with _client_lock:
+        settings = _connection_settings
+        _connection_settings = settings._replace(
+            pool_size=pool_size if pool_size is not None else settings.pool_size,
+            timeout=timeout if timeout is not None else settings.timeout,
+            connect_timeout=connect_timeout if connect_timeout is not None else settings.connect_timeout,
+            http2=http2 if http2 is not None else settings.http2,
+        )
+        _close_clients()
+
+
+def _close_clients() -> None:
+    for client in _client_dict.values():
+        client.close()
+    _client_dict.clear()
+
+
+def _truncate(publication: Publication, value: str, name: str, warn: bool = True) -> str:
+    if len(value) > 2000:
+        if warn:
             warnings.warn(
-                f'{publication.key} has its abstract too long ({len(abstract)} > 2000). '
-                f'Because of the 2000 characters API limitation, the abstract has '
+                f'{publication.key} has its {name} too long ({len(value)} > 2000). '
+                f'Because of the 2000 characters API limitation, the {name} has '
                 f'therefore been truncated at the 2000th character.',
                 stacklevel=0,
             )
-            abstract = abstract[:2000]
-        authors = publication.authors
-        if len(authors) > 2000:
-            warnings.warn(
-                f'{publication.key} has its author list too long ({len(authors)} > 2000). '
-                f'Because of the 2000 characters API limitation, the author list has '
-                f'therefore been truncated at the 2000th character.',
-                stacklevel=0,
+        return value[:2000]
+    return value
+
+
+def get_property_value_dict(publication: Publication, warn: bool = True) -> Dict[str, Any]:
+    """Return the values of the properties managed by notion-scholar, as they
+    are stored in Notion."""
+    return {
+        'Title': publication.title,
+        'Abstract': _truncate(publication, publication.abstract, 'abstract', warn),
+        'Bibtex': _truncate(publication, publication.bibtex, 'Bibtex', warn),
+        'Filename': publication.key,
+        'Journal': publication.journal,
+        'Authors': _truncate(publication, publication.authors, 'author list', warn),
+        'Year': publication.year,
+        'URL': publication.url,
+        'Type': publication.type,
+        'DOI': publication.doi,
+    }
+
+
+def get_property_value_dict_from_page(page: dict) -> Dict[str, Any]:
+    """Return the values of the properties managed by notion-scholar from a
+    page object returned by the Notion API. The values are coerced to their
+    kind (see `PROPERTY_KINDS`) whatever the type of the properties."""
+    value_dict = {}
+    for name, value in page['properties'].items():
+        if name not in PROPERTY_TYPES:
+            continue
+        property_type = value['type'] if 'type' in value else next(iter(value))
+        content = value.get(property_type)
+        if property_type in ('title', 'rich_text'):
+            content = ''.join(item['plain_text'] for item in content or [])
+        elif property_type == 'select':
+            content = content['name'] if content else ''
+        elif property_type == 'multi_select':
+            content = ', '.join(option['name'] for option in content or [])
+        elif property_type == 'date':
+            content = int(content['start'][:4]) if content else None
+        elif property_type in ('url', 'email', 'phone_number'):
+            content = content or ''
+
+        if PROPERTY_KINDS[name] == 'number' and isinstance(content, str):
+            content = int(content) if content.isdigit() else None
+        elif PROPERTY_KINDS[name] == 'text' and isinstance(content, (int, float)):
+            content = str(content)
+        value_dict[name] = content
+    return value_dict
+
+
+def get_page_properties(
+        publication: Publication,
+        property_names: Optional[Iterable[str]] = None,
+        schema: Optional['DatabaseSchema'] = None,
+) -> dict:
+    """Return the properties of the page of the publication, all of them for
+    a creation, or those of `property_names` for an update.
+
+    With the schema of the database, the properties absent from the database
+    or of an incompatible type are omitted, and the values are converted to
+    the type of their property. The empty values are omitted from the
+    creations, and cleared by the updates.
+    """
+    value_dict = get_property_value_dict(publication)
+    if schema is None:
+        if property_names is None:
+            return {
+                **{name: PROPERTY_TYPES[name](value) for name, value in value_dict.items()},
+                'Inbox': Property.checkbox(True),
+            }
+        return {name: PROPERTY_TYPES[name](value_dict[name]) for name in property_names}
+
+    if property_names is None:
+        value_dict['Inbox'] = True
+        property_names = [name for name, value in value_dict.items() if value not in ('', None)]
+    properties = {}
+    for name in property_names:
+        property_type = schema.property_type_dict.get(name)
+        if property_type is None or property_type not in COMPATIBLE_TYPES[PROPERTY_KINDS[name]]:
+            continue
+        properties[name] = get_property_value(value_dict[name], property_type)
+    return properties
+
+
+def get_property_value(value: Any, property_type: str) -> dict:
+    """Build the value of a property of type `property_type` from a text, a
+    number or a boolean value, an empty value clears the property."""
+    if value in ('', None):
+        empty_value: Any = [] if property_type in ('title', 'rich_text', 'multi_select') else None
+        return {property_type: empty_value}
+    if property_type in ('title', 'rich_text'):
+        return {property_type: [{'text': {'content': str(value)}}]}
+    if property_type == 'number':
+        return Property.number(value)
+    if property_type in ('url', 'email', 'phone_number'):
+        return {property_type: str(value)}
+    if property_type == 'select':
+        # The options of a select cannot contain commas
+        return Property.select(str(value).replace(',', ''))
+    if property_type == 'multi_select':
+        return Property.multi_select(str(value).replace(',', ''))
+    if property_type == 'checkbox':
+        return Property.checkbox(bool(value))
+    if property_type == 'date':
+        return Property.date(f'{int(value):04d}-01-01')
+    raise ValueError(f'A value cannot be stored in a property of type "{property_type}".')
+
+
+def _iter_in_order(
+        function: Callable[[Any], UploadResult],
+        items: Iterable[Any],
+        workers: int,
+) -> Iterator[UploadResult]:
+    """Apply `function` to the items with a pool of `workers` threads and
+    yield the results in the order of the items. The items are consumed
+    lazily, at most a few per worker are pending at once."""
+    total = len(items) if isinstance(items, Sized) else None
+    metrics = get_metrics()
+    max_pending = 4 * max(1, workers)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending: Deque[Future] = deque()
+        iterator = iter(items)
+        i = 0
+        while True:
+            for item in iterator:
+                pending.append(executor.submit(function, item))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            with metrics.phase('upload'):
+                result = pending.popleft().result()
+            i += 1
+            progress = f'{i}/{total}' if total is not None else f'{i}'
+            if result.success:
+                logger.info('%s: %s', progress, result.publication)
+            else:
+                metrics.count('pages_failed')
+                logger.warning('%s: %s failed (%s)', progress, result.publication, result.error)
+            yield result
+
+
+def iter_add_publications_to_database(
+        publications: Iterable[Publication],
+        token: str,
+        database_id: str,
+        workers: int = 1,
+) -> Iterator[UploadResult]:
+    """Create one page per publication in the database `database_id` and
+    yield the results as the pages are created.
+
+    The pages are created by a pool of `workers` threads sharing the same
+    client, the requests being paced by the shared `RequestScheduler`. The
+    publications are consumed lazily and the results are yielded in their
+    order, a failure does not interrupt the creation of the other pages.
+
+    Args:
+        publications: Publications to add to the database.
+        token: Notion API token.
+        database_id: Targeted database id.
+        workers: Maximum number of pages created concurrently.
+
+    Returns:
+        An iterator over one `UploadResult` per publication, in the same order.
+    """
+    return iter_add_publications_to_databases(
+        publications=((database_id, publication) for publication in publications),
+        token=token,
+        workers=workers,
+    )
+
+
+def iter_add_publications_to_databases(
+        publications: Iterable[Tuple[str, Publication]],
+        token: str,
+        workers: int = 1,
+) -> Iterator[UploadResult]:
+    """Same as `iter_add_publications_to_database`, each publication being
+    added to the database paired with it in the (database id, publication)
+    tuples of `publications`."""
+    client = get_client(token)
+    scheduler = get_scheduler()
+
+    def create_page(item: Tuple[str, Publication]) -> UploadResult:
+        database_id, publication = item
+        try:
+            schema = get_database_schema(token=token, database_id=database_id)
+            # A creation is not idempotent, if its outcome is unknown the
+            # page is looked up before it is created again
+            page = scheduler.call(
+                client.pages.create,
+                idempotent=False,
+                recover=lambda: find_page_by_key(token=token, database_id=database_id, key=publication.key),
+                parent={'database_id': database_id},
+                properties=get_page_properties(publication, schema=schema),
             )
-            authors = authors[:2000]
-        bibtex = publication.bibtex
-        if len(bibtex) > 2000:
-            warnings.warn(
-                f'{publication.key} has its Bibtex too long ({len(bibtex)} > 2000). '
-                f'Because of the 2000 characters API limitation, the Bibtex has '
-                f'therefore been truncated at the 2000th character.',
-                stacklevel=0,
+        except Exception as e:
+            return UploadResult(publication=publication, error=e, database_id=database_id)
+        get_metrics().count('pages_created')
+        return UploadResult(
+            publication=publication,
+            page_id=page['id'],
+            last_edited_time=page.get('last_edited_time'),
+            database_id=database_id,
+        )
+
+    return _iter_in_order(create_page, publications, workers)
+
+
+def add_publications_to_database(
+        publications: List[Publication],
+        token: str,
+        database_id: str,
+        workers: int = 1,
+) -> List[UploadResult]:
+    """Create one page per publication in the database `database_id`, see
+    `iter_add_publications_to_database`.
+
+    Returns:
+        One `UploadResult` per publication, in the same order.
+    """
+    return list(
+        iter_add_publications_to_database(
+            publications=publications,
+            token=token,
+            database_id=database_id,
+            workers=workers,
+        ),
+    )
+
+
+def update_pages_in_database(
+        updates: List[PageUpdate],
+        token: str,
+        workers: int = 1,
+) -> List[UploadResult]:
+    """Update the pages with the values of their publication, only the
+    properties listed in each `PageUpdate` are sent.
+
+    Args:
+        updates: Pages to update.
+        token: Notion API token.
+        workers: Maximum number of pages updated concurrently.
+
+    Returns:
+        One `UploadResult` per update, in the same order.
+    """
+    client = get_client(token)
+    scheduler = get_scheduler()
+
+    def update_page(update: PageUpdate) -> UploadResult:
+        try:
+            schema = None
+            if update.database_id is not None:
+                schema = get_database_schema(token=token, database_id=update.database_id)
+            properties = get_page_properties(update.publication, update.property_names, schema=schema)
+            if not properties:
+                # None of the changed properties can be stored in the database
+                return UploadResult(
+                    publication=update.publication,
+                    page_id=update.page_id,
+                    database_id=update.database_id,
+                )
+            page = scheduler.call(client.pages.update, page_id=update.page_id, properties=properties)
+        except Exception as e:
+            return UploadResult(
+                publication=update.publication,
+                page_id=update.page_id,
+                error=e,
+                database_id=update.database_id,
             )
-            bibtex = bibtex[:2000]
-        client.pages.create(
-            parent={'database_id': database_id},
-            properties={
-                'Title': Property.title(publication.title),
-                'Abstract': Property.rich_text(abstract),
-                'Bibtex': Property.rich_text(bibtex),
-                'Filename': Property.rich_text(publication.key),
-                'Journal': Property.rich_text(publication.journal),
-                'Authors': Property.rich_text(authors),
-                'Year': Property.number(publication.year),
-                'URL': Property.url(publication.url),
-                'Inbox': Property.checkbox(True),
-                'Type': Property.select(publication.type),
-                'DOI': Property.rich_text(publication.doi),
-            },
+        get_metrics().count('pages_updated')
+        return UploadResult(
+            publication=update.publication,
+            page_id=update.page_id,
+            last_edited_time=page.get('last_edited_time'),
+            database_id=update.database_id,
         )
 
+    return list(_iter_in_order(update_page, updates, workers))
 
-def get_property_list_from_database(
+
+class DatabaseSchema(NamedTuple):
+    """NamedTuple object used to store the properties of a database, their
+    type and id by name, as retrieved at `retrieved_time` (monotonic)."""
+    property_type_dict: Dict[str, str]
+    property_id_dict: Dict[str, str]
+    retrieved_time: float
+
+
+class SchemaException(NotionScholarException):
+    """Exception raised when a database cannot store the publications."""
+
+
+_schema_dict: Dict[str, DatabaseSchema] = {}
+_schema_lock = threading.Lock()
+
+
+def get_database_schema(token: str, database_id: str, ttl: float = SCHEMA_TTL) -> DatabaseSchema:
+    """Return the schema of the database, it is retrieved once and cached
+    for `ttl` seconds, so that the changes made to the columns of the
+    database are noticed by a long-running watch."""
+    with _schema_lock:
+        schema = _schema_dict.get(database_id)
+    if schema is not None and time.monotonic() - schema.retrieved_time < ttl:
+        return schema
+
+    database = get_scheduler().call(get_client(token).databases.retrieve, database_id=database_id)
+    schema = DatabaseSchema(
+        property_type_dict={name: value.get('type') for name, value in database['properties'].items()},
+        property_id_dict={name: value['id'] for name, value in database['properties'].items()},
+        retrieved_time=time.monotonic(),
+    )
+    with _schema_lock:
+        _schema_dict[database_id] = schema
+    return schema
+
+
+def get_stored_property_names(schema: DatabaseSchema) -> Set[str]:
+    """Return the names of the managed properties that the database can
+    store: present, and of a type compatible with their value."""
+    return {
+        name for name, kind in PROPERTY_KINDS.items()
+        if schema.property_type_dict.get(name) in COMPATIBLE_TYPES[kind]
+    }
+
+
+def get_property_id_dict(token: str, database_id: str) -> Dict[str, str]:
+    """Return the mapping from the property names of the database to their
+    ids, see `get_database_schema`."""
+    return get_database_schema(token=token, database_id=database_id).property_id_dict
+
+
+def check_database_schema(token: str, database_id: str) -> List[str]:
+    """Check that the database can store the publications, before any page
+    is created.
+
+    Returns:
+        The descriptions of the properties that will not be filled: absent
+        from the database or of an incompatible type.
+
+    Raises:
+        SchemaException: If the `Filename` property, which stores the keys,
+            is absent or not a text property.
+    """
+    property_type_dict = get_database_schema(token=token, database_id=database_id).property_type_dict
+    if property_type_dict.get('Filename') != 'rich_text':
+        raise SchemaException(
+            f'The database must have a "Filename" text property, in which the keys of the publications are stored '
+            f'(found: {property_type_dict.get("Filename", "no property")}).',
+        )
+
+    problems = []
+    for name, kind in PROPERTY_KINDS.items():
+        property_type = property_type_dict.get(name)
+        if property_type is None:
+            problems.append(f'The database has no "{name}" property.')
+        elif property_type not in COMPATIBLE_TYPES[kind]:
+            problems.append(f'The "{name}" property of the database cannot be of type "{property_type}".')
+    return problems
+
+
+def validate_database_schema(token: str, database_id: str) -> None:
+    """Log the properties of the publications that the database cannot
+    store, they are left out of the pages, see `check_database_schema`."""
+    for problem in check_database_schema(token=token, database_id=database_id):
+        logger.warning('%s It will not be filled.', problem)
+
+
+def iter_pages_from_database(
         token: str,
         database_id: str,
-        retriever: Callable[[dict], Any],
+        filter: Optional[dict] = None,
+        sorts: Optional[List[dict]] = None,
+        property_names: Optional[List[str]] = None,
         page_size: int = 100,
-) -> List[str]:
-    notion = Client(auth=token)
+) -> Iterator[dict]:
+    """Query the pages of the database `database_id` and yield them as the
+    result pages of the query arrive.
 
-    results = []
-    query = notion.databases.query(
-        database_id=database_id, page_size=page_size,
-    )
-    results.extend(query['results'])
-    while query['next_cursor'] or (query['results'] is None and not results):
-        query = notion.databases.query(
-            database_id=database_id,
+    Args:
+        token: Notion API token.
+        database_id: Targeted database id.
+        filter: Filter of the query, as defined by the Notion API.
+        sorts: Sort order of the query, as defined by the Notion API.
+        property_names: Properties included in the returned pages. By default,
+            all the properties are returned.
+        page_size: Number of pages retrieved per request.
+
+    Returns:
+        An iterator over the page objects returned by the Notion API.
+    """
+    notion = get_client(token)
+    scheduler = get_scheduler()
+
+    kwargs: Dict[str, Any] = {'database_id': database_id, 'page_size': page_size}
+    if filter is not None:
+        kwargs['filter'] = filter
+    if sorts is not None:
+        kwargs['sorts'] = sorts
+    if property_names is not None:
+        property_id_dict = get_property_id_dict(token=token, database_id=database_id)
+        kwargs['filter_properties'] = [
+            property_id_dict[name] for name in property_names if name in property_id_dict
+        ]
+
+    metrics = get_metrics()
+    query = scheduler.call(notion.databases.query, **kwargs)
+    metrics.count('pages_scanned', len(query['results']))
+    yield from query['results']
+    while query['next_cursor']:
+        query = scheduler.call(
+            notion.databases.query,
             start_cursor=query['next_cursor'],
+            **kwargs,
+        )
+        metrics.count('pages_scanned', len(query['results']))
+        yield from query['results']
+
+
+def get_page_list_from_database(
+        token: str,
+        database_id: str,
+        filter: Optional[dict] = None,
+        sorts: Optional[List[dict]] = None,
+        property_names: Optional[List[str]] = None,
+        page_size: int = 100,
+        partitions: int = 1,
+) -> List[dict]:
+    """Query all the pages of the database `database_id`, see
+    `iter_pages_from_database`. With several partitions, the database is
+    scanned in parallel (see `iter_pages_from_database_in_parallel`) and the
+    pages are not sorted."""
+    if partitions > 1 and sorts is None:
+        pages = iter_pages_from_database_in_parallel(
+            token=token,
+            database_id=database_id,
+            partitions=partitions,
+            filter=filter,
+            property_names=property_names,
+            page_size=page_size,
+        )
+    else:
+        pages = iter_pages_from_database(
+            token=token,
+            database_id=database_id,
+            filter=filter,
+            sorts=sorts,
+            property_names=property_names,
             page_size=page_size,
         )
-        results.extend(query['results'])
+    return list(pages)
+
+
+def _parse_timestamp(timestamp: str) -> datetime:
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+
+def get_created_time_partition_filters(
+        token: str,
+        database_id: str,
+        partitions: int,
+        filter: Optional[dict] = None,
+) -> List[dict]:
+    """Split the database in `partitions` windows of `created_time` of equal
+    duration, between the oldest and the most recent page. The windows are
+    disjoint, and the last one is open so that it includes the pages created
+    during the scan.
+
+    Returns:
+        The filters of the windows, as defined by the Notion API. The list
+        is empty if the database cannot be split.
+    """
+    if partitions <= 1:
+        return []
+
+    edge_list = []
+    for direction in ('ascending', 'descending'):
+        kwargs: Dict[str, Any] = {'filter': filter} if filter is not None else {}
+        query = get_scheduler().call(
+            get_client(token).databases.query,
+            database_id=database_id,
+            sorts=[{'timestamp': 'created_time', 'direction': direction}],
+            page_size=1,
+            **kwargs,
+        )
+        if not query['results']:
+            return []
+        edge_list.append(_parse_timestamp(query['results'][0]['created_time']))
+
+    first, last = edge_list
+    step = (last - first) / partitions
+    if step.total_seconds() < 60:  # created_time is rounded to the minute
+        return []
+    boundaries = [(first + i * step).isoformat() for i in range(1, partitions)]
+
+    filter_list: List[dict] = [{'timestamp': 'created_time', 'created_time': {'before': boundaries[0]}}]
+    for start, end in zip(boundaries, boundaries[1:]):
+        filter_list.append({
+            'and': [
+                {'timestamp': 'created_time', 'created_time': {'on_or_after': start}},
+                {'timestamp': 'created_time', 'created_time': {'before': end}},
+            ],
+        })
+    filter_list.append({'timestamp': 'created_time', 'created_time': {'on_or_after': boundaries[-1]}})
+    return filter_list
+
+
+def iter_pages_from_database_in_parallel(
+        token: str,
+        database_id: str,
+        partitions: int = 4,
+        filter: Optional[dict] = None,
+        property_names: Optional[List[str]] = None,
+        page_size: int = 100,
+        partition_filters: Optional[List[dict]] = None,
+) -> Iterator[dict]:
+    """Query the pages of the database `database_id` with one thread per
+    partition of the database, and yield them as they arrive.
+
+    The partitions are disjoint query filters (by default, windows of
+    `created_time`, see `get_created_time_partition_filters`), the pages
+    are nevertheless de-duplicated by id. The pages are not yielded in any
+    particular order. The requests remain paced by the shared
+    `RequestScheduler`: the scan is faster than a sequential one because the
+    latency of the requests overlaps.
+
+    Args:
+        token: Notion API token.
+        database_id: Targeted database id.
+        partitions: Number of partitions scanned concurrently.
+        filter: Filter of the query, combined with the partition filters.
+        property_names: Properties included in the returned pages.
+        page_size: Number of pages retrieved per request.
+        partition_filters: Filters defining the partitions, for instance
+            ranges of `Year` or values of `Type`. They must be disjoint and
+            cover the database.
+
+    Returns:
+        An iterator over the page objects returned by the Notion API.
+    """
+    if partition_filters is None:
+        partition_filters = get_created_time_partition_filters(
+            token=token,
+            database_id=database_id,
+            partitions=partitions,
+            filter=filter,
+        )
+    if len(partition_filters) <= 1:
+        yield from iter_pages_from_database(
+            token=token,
+            database_id=database_id,
+            filter=filter,
+            property_names=property_names,
+            page_size=page_size,
+        )
+        return
+    if filter is not None:
+        partition_filters = [{'and': [filter, *f.get('and', [f])]} for f in partition_filters]
+
+    # The threads push the pages of their partition, and None once done
+    page_queue: queue.Queue = queue.Queue(maxsize=4 * page_size * max(1, len(partition_filters)))
+    stop = threading.Event()
 
-    key_list = []
-    for result in results:
+    def scan(partition_filter: dict) -> None:
         try:
-            key_list.append(retriever(result))
+            pages = iter_pages_from_database(
+                token=token,
+                database_id=database_id,
+                filter=partition_filter,
+                property_names=property_names,
+                page_size=page_size,
+            )
+            for page in pages:
+                if stop.is_set():
+                    return
+                page_queue.put(page)
+        finally:
+            page_queue.put(None)
+
+    page_id_set = set()
+    with ThreadPoolExecutor(max_workers=max(1, len(partition_filters))) as executor:
+        futures = [executor.submit(scan, f) for f in partition_filters]
+        try:
+            done = 0
+            while done < len(futures):
+                page = page_queue.get()
+                if page is None:
+                    done += 1
+                elif page['id'] not in page_id_set:
+                    page_id_set.add(page['id'])
+                    yield page
+        finally:
+            stop.set()
+            while any(not future.done() for future in futures):
+                try:
+                    page_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        for future in futures:
+            future.result()
+
+
+def iter_properties_from_database(
+        token: str,
+        database_id: str,
+        retriever: Callable[[dict], Any],
+        page_size: int = 100,
+        filter: Optional[dict] = None,
+        property_names: Optional[List[str]] = None,
+        partitions: int = 1,
+) -> Iterator[Any]:
+    """Yield `retriever(page)` for the pages of the database as they arrive,
+    the pages for which the property is empty are skipped. With several
+    partitions, the database is scanned in parallel."""
+    pages = iter_pages_from_database_in_parallel(
+        token=token,
+        database_id=database_id,
+        partitions=partitions,
+        filter=filter,
+        property_names=property_names,
+        page_size=page_size,
+    )
+    for page in pages:
+        try:
+            yield retriever(page)
         except IndexError:
             pass
-    return key_list
 
 
-def get_publication_key_list_from_database(
+def get_property_list_from_database(
         token: str,
         database_id: str,
+        retriever: Callable[[dict], Any],
         page_size: int = 100,
+        filter: Optional[dict] = None,
+        property_names: Optional[List[str]] = None,
+        partitions: int = 1,
 ) -> List[str]:
+    return list(
+        iter_properties_from_database(
+            token=token,
+            database_id=database_id,
+            retriever=retriever,
+            page_size=page_size,
+            filter=filter,
+            property_names=property_names,
+            partitions=partitions,
+        ),
+    )
+
 
-    def retrieve_publication_key(result: dict) -> str:
-        return result['properties']['Filename']['rich_text'][0]['plain_text']
+def get_publication_key(result: dict) -> str:
+    return result['properties']['Filename']['rich_text'][0]['plain_text']
 
+
+def get_publication_key_list_from_database(
+        token: str,
+        database_id: str,
+        page_size: int = 100,
+) -> List[str]:
     return get_property_list_from_database(
         token=token,
         database_id=database_id,
-        retriever=retrieve_publication_key,
+        retriever=get_publication_key,
+        property_names=['Filename'],
         page_size=page_size,
     )
 
 
-def get_bibtex_string_list_from_database(
+def get_page_list_from_database_by_keys(
         token: str,
         database_id: str,
-        page_size: int = 100,
-) -> List[str]:
+        keys: Iterable[str],
+        property_names: Optional[List[str]] = None,
+        batch_size: int = 100,
+) -> List[dict]:
+    """Return the pages of the database whose key is in `keys`.
 
-    def retrieve_bibtex_string(result: dict) -> str:
-        return result['properties']['Bibtex']['rich_text'][0]['plain_text']
+    Instead of scanning the whole database, the keys are looked up with
+    `Filename` equality filters, `batch_size` keys per query.
+    """
+    keys = list(dict.fromkeys(k for k in keys if k))
+    pages = []
+    for i in range(0, len(keys), batch_size):
+        query_filter = {
+            'or': [
+                {'property': 'Filename', 'rich_text': {'equals': key}}
+                for key in keys[i:i + batch_size]
+            ],
+        }
+        pages.extend(
+            get_page_list_from_database(
+                token=token,
+                database_id=database_id,
+                filter=query_filter,
+                property_names=property_names,
+            ),
+        )
+    return pages
 
-    return get_property_list_from_database(
+
+def find_page_by_key(token: str, database_id: str, key: str) -> Optional[dict]:
+    """Return the page of the database whose key is `key`, if any."""
+    pages = get_page_list_from_database_by_keys(
+        token=token,
+        database_id=database_id,
+        keys=[key],
+        property_names=['Filename'],
+    )
+    return pages[0] if pages else None
+
+
+def retrieve_bibtex_string(result: dict) -> str:
+    return result['properties']['Bibtex']['rich_text'][0]['plain_text']
+
+
+def iter_bibtex_strings_from_database(
+        token: str,
+        database_id: str,
+        page_size: int = 100,
+        partitions: int = 1,
+) -> Iterator[str]:
+    return iter_properties_from_database(
         token=token,
         database_id=database_id,
         retriever=retrieve_bibtex_string,
+        property_names=['Bibtex'],
         page_size=page_size,
+        partitions=partitions,
+    )
+
+
+def get_bibtex_string_list_from_database(
+        token: str,
+        database_id: str,
+        page_size: int = 100,
+        partitions: int = 1,
+) -> List[str]:
+    return list(
+        iter_bibtex_strings_from_database(
+            token=token,
+            database_id=database_id,
+            page_size=page_size,
+            partitions=partitions,
+        ),
     )
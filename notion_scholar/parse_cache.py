@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from notion_scholar.bibtex import get_block_type
+from notion_scholar.bibtex import get_publication
+from notion_scholar.bibtex import iter_block_spans
+from notion_scholar.bibtex import iter_entry_lists
+from notion_scholar.bibtex import iter_entry_lists_in_parallel
+from notion_scholar.bibtex import MACRO_BLOCK_TYPES
+from notion_scholar.publication import LazyPublication
+from notion_scholar.publication import Publication
+
+
+class CachedBlock(NamedTuple):
+    """NamedTuple object used to store a top-level `@` block of a bib file."""
+    start: int
+    end: int
+    digest: str
+    publications: Optional[str] = None
+    entry_keys: Optional[str] = None
+
+
+DEFAULT_MAX_FILES = 8
+
+
+class ParseCache:
+    """Local SQLite cache of the publications parsed from the bib files.
+
+    For each file, the cache stores its size, modification time and content
+    hash, and for each of its top-level `@` blocks the byte range, the hash,
+    the keys and the serialized publications. A file whose size and
+    modification time are unchanged is loaded from the cache without being
+    read. Otherwise, only the blocks whose hash is unknown are parsed. The hash of a block
+    covers the `@string` macros defined before it, editing a macro therefore
+    invalidates the blocks that follow.
+
+    Only the `max_files` most recently used files are kept.
+
+    Args:
+        path: Path of the SQLite file, it is created if it does not exist.
+        max_files: Maximum number of files kept in the cache.
+    """
+    def __init__(self, path: str, max_files: int = DEFAULT_MAX_FILES):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_files = max_files
+        # Several processes may fill the cache at once (see `run_all`)
+        self.connection = sqlite3.connect(path, timeout=60)
+        with self.connection:
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(blocks)')]
+            if columns and 'entry_keys' not in columns:
+                # Cache written by a previous version, it is rebuilt
+                self.connection.execute('DROP TABLE blocks')
+                self.connection.execute('DROP TABLE IF EXISTS files')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'file_path TEXT PRIMARY KEY, '
+                'size INTEGER, '
+                'mtime_ns INTEGER, '
+                'digest TEXT, '
+                'last_used REAL)',
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS blocks ('
+                'file_path TEXT NOT NULL, '
+                'position INTEGER NOT NULL, '
+                'start INTEGER, '
+                'end INTEGER, '
+                'digest TEXT, '
+                'publications TEXT, '
+                'entry_keys TEXT, '
+                'PRIMARY KEY (file_path, position))',
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def clear(self) -> None:
+        with self.connection:
+            self.connection.execute('DELETE FROM blocks')
+            self.connection.execute('DELETE FROM files')
+
+    def get_block_list(self, file_path: str) -> List[CachedBlock]:
+        """Return the cached blocks of the file, in their order in the file."""
+        rows = self.connection.execute(
+            'SELECT start, end, digest, publications, entry_keys FROM blocks '
+            'WHERE file_path = ? ORDER BY position',
+            (str(file_path),),
+        )
+        return [CachedBlock(*row) for row in rows]
+
+    def get_publication_list(self, file_path: str, processes: int = 1) -> List[Publication]:
+        return list(self.iter_publications(file_path, processes=processes))
+
+    def iter_publications(self, file_path: str, processes: int = 1) -> Iterator[Publication]:
+        """Yield the publications of a bib file, see `iter_lazy_publications`."""
+        for lazy_publication in self.iter_lazy_publications(file_path, processes=processes):
+            yield lazy_publication.publication
+
+    def iter_lazy_publications(self, file_path: str, processes: int = 1) -> Iterator[LazyPublication]:
+        """Yield the publications of a bib file, parsing only the blocks that
+        are not in the cache. The cache is updated once all the publications
+        have been yielded.
+
+        The publications are yielded as LazyPublication objects, the cached
+        publications are only deserialized if they are accessed.
+
+        Args:
+            file_path: Path of the bib file.
+            processes: Number of processes used to parse the blocks.
+        """
+        file_path = str(file_path)
+        stat = os.stat(file_path)
+        row = self.connection.execute(
+            'SELECT size, mtime_ns, digest FROM files WHERE file_path = ?',
+            (file_path,),
+        ).fetchone()
+
+        if row is not None and tuple(row[:2]) == (stat.st_size, stat.st_mtime_ns):
+            self._touch(file_path, stat)
+            for block in self.get_block_list(file_path):
+                yield from _iter_lazy_publications(block)
+            return
+
+        with open(file_path, 'rb') as bibtex_file:
+            data = bibtex_file.read()
+        digest = hashlib.sha1(data).hexdigest()
+
+        if row is not None and row[2] == digest:
+            self._touch(file_path, stat)
+            for block in self.get_block_list(file_path):
+                yield from _iter_lazy_publications(block)
+            return
+
+        cached_block_dict = {block.digest: block for block in self.get_block_list(file_path)}
+        block_list = self._split(data.decode('utf-8'), cached_block_dict)
+
+        # The macros are parsed along with the new entries, for the
+        # interpolation of the strings.
+        new_blocks = [text for _, text in block_list if text is not None]
+        if not any(get_block_type(text) not in MACRO_BLOCK_TYPES for text in new_blocks):
+            new_blocks = []
+        if processes > 1:
+            entry_lists = iter_entry_lists_in_parallel(new_blocks, processes)
+        else:
+            entry_lists = iter_entry_lists(new_blocks)
+
+        cached_blocks = []
+        for block, text in block_list:
+            if block.publications is not None:
+                yield from _iter_lazy_publications(block)
+            else:
+                publications = []
+                if new_blocks and text is not None:
+                    entry_list = next(entry_lists)
+                    if get_block_type(text) not in MACRO_BLOCK_TYPES:
+                        publications = [get_publication(entry) for entry in entry_list]
+                block = block._replace(
+                    publications=_dumps(publications),
+                    entry_keys='\n'.join(publication.key for publication in publications),
+                )
+                for publication in publications:
+                    yield LazyPublication(publication.key, publication)
+            cached_blocks.append(block)
+
+        self._store(file_path, stat, digest, cached_blocks)
+
+    @staticmethod
+    def _split(text: str, cached_block_dict: Dict[str, CachedBlock]) -> List[Tuple[CachedBlock, Optional[str]]]:
+        """Split the text in blocks and return the (block, text) pairs, the
+        text being only set for the blocks to parse: the macros and the
+        entries not in `cached_block_dict` (cached blocks by digest)."""
+        block_list: List[Tuple[CachedBlock, Optional[str]]] = []
+        macro_digest = ''
+        byte_position, position = 0, 0
+        for start, end in iter_block_spans(text):
+            block_text = text[start:end]
+            byte_start = byte_position + len(text[position:start].encode('utf-8'))
+            byte_end = byte_start + len(block_text.encode('utf-8'))
+            byte_position, position = byte_end, end
+
+            block_type = get_block_type(block_text)
+            if block_type in MACRO_BLOCK_TYPES:
+                macro_digest = _get_digest(macro_digest + block_text)
+                block_list.append((CachedBlock(byte_start, byte_end, macro_digest), block_text))
+                continue
+
+            block = CachedBlock(byte_start, byte_end, _get_digest(macro_digest + block_text))
+            if block_type == 'comment':
+                block_list.append((block._replace(publications=_dumps([]), entry_keys=''), None))
+            elif block.digest in cached_block_dict:
+                cached_block = cached_block_dict[block.digest]
+                block = block._replace(publications=cached_block.publications, entry_keys=cached_block.entry_keys)
+                block_list.append((block, None))
+            else:
+                block_list.append((block, block_text))
+        return block_list
+
+    def _touch(self, file_path: str, stat: os.stat_result) -> None:
+        with self.connection:
+            self.connection.execute(
+                'UPDATE files SET size = ?, mtime_ns = ?, last_used = ? WHERE file_path = ?',
+                (stat.st_size, stat.st_mtime_ns, time.time(), file_path),
+            )
+
+    def _store(self, file_path: str, stat: os.stat_result, digest: str, block_list: List[CachedBlock]) -> None:
+        with self.connection:
+            self.connection.execute('DELETE FROM blocks WHERE file_path = ?', (file_path,))
+            self.connection.executemany(
+                'INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(file_path, i, *block) for i, block in enumerate(block_list)],
+            )
+            self.connection.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                (file_path, stat.st_size, stat.st_mtime_ns, digest, time.time()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        rows = self.connection.execute(
+            'SELECT file_path FROM files ORDER BY last_used DESC LIMIT -1 OFFSET ?',
+            (self.max_files,),
+        )
+        file_paths = [(file_path,) for file_path, in rows]
+        self.connection.executemany('DELETE FROM blocks WHERE file_path = ?', file_paths)
+        self.connection.executemany('DELETE FROM files WHERE file_path = ?', file_paths)
+
+
+def _get_digest(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _dumps(publications: List[Publication]) -> str:
+    return json.dumps([list(publication) for publication in publications])
+
+
+def loads_publications(string: str) -> List[Publication]:
+    """Deserialize the publications of a cached block (see `CachedBlock`)."""
+    return [Publication(*values) for values in json.loads(string)]
+
+
+def _load(source: Tuple[str, int]) -> Publication:
+    string, i = source
+    return loads_publications(string)[i]
+
+
+def _iter_lazy_publications(block: CachedBlock) -> Iterator[LazyPublication]:
+    if block.entry_keys:
+        for i, key in enumerate(block.entry_keys.split('\n')):
+            yield LazyPublication(key, (block.publications, i), _load)
@@ -1,4 +1,8 @@
+import sys
+from typing import Any
+from typing import Callable
 from typing import NamedTuple
+from typing import Optional
 
 
 class Publication(NamedTuple):
@@ -16,3 +20,35 @@ class Publication(NamedTuple):
 
     def __str__(self):  # noqa TYP004
         return f'Publication(key="{self.key}", title="{self.title}")'
+
+
+class LazyPublication:
+    """Publication whose key is known but whose conversion is deferred until
+    the `publication` attribute is accessed.
+
+    The pipelines filter the publications on their key first, only the few
+    publications absent from the database (or to update) are then converted
+    from their source, a parsed BibTeX entry or a serialized publication.
+
+    Args:
+        key: Key of the publication, it is interned.
+        source: Value from which the publication is built, or the
+            publication itself if `convert` is `None`.
+        convert: Function building the publication from `source`.
+    """
+    __slots__ = ('key', '_source', '_convert')
+
+    def __init__(self, key: str, source: Any, convert: Optional[Callable[[Any], Publication]] = None):
+        self.key = sys.intern(key)
+        self._source = source
+        self._convert = convert
+
+    @property
+    def publication(self) -> Publication:
+        if self._convert is not None:
+            self._source = self._convert(self._source)
+            self._convert = None
+        return self._source
+
+    def __str__(self):
+        return f'LazyPublication(key="{self.key}")'
@@ -1,50 +1,657 @@
+from collections import defaultdict
+from collections import deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Mapping
+from typing import NamedTuple
 from typing import Optional
+from typing import Tuple
+from typing import TypeVar
 
-from bibtexparser.bibdatabase import BibDatabase
-
-from notion_scholar.bibtex import get_bib_database_from_file
-from notion_scholar.bibtex import get_bib_database_from_string
-from notion_scholar.bibtex import get_publication_list
-from notion_scholar.notion_api import add_publications_to_database
-from notion_scholar.notion_api import get_publication_key_list_from_database
+from notion_scholar.bibtex import iter_entries_from_file
+from notion_scholar.bibtex import iter_entries_from_string
+from notion_scholar.bibtex import iter_lazy_publications
+from notion_scholar.dedupe import DuplicateIndex
+from notion_scholar.dedupe import get_reference_list_from_database
+from notion_scholar.dedupe import iter_unique_publications
+from notion_scholar.dedupe import Match
+from notion_scholar.diff import get_fingerprint
+from notion_scholar.diff import get_page_digest_dict
+from notion_scholar.diff import get_page_update
+from notion_scholar.diff import get_publication_digest_dict
+from notion_scholar.diff import IndexedPage
+from notion_scholar.journal import DONE
+from notion_scholar.journal import Journal
+from notion_scholar.journal import PlannedOperation
+from notion_scholar.journal import SENT
+from notion_scholar.key_index import KeyIndex
+from notion_scholar.metrics import get_metrics
+from notion_scholar.metrics import report_metrics
+from notion_scholar.notion_api import get_database_schema
+from notion_scholar.notion_api import get_page_list_from_database
+from notion_scholar.notion_api import get_page_list_from_database_by_keys
+from notion_scholar.notion_api import get_publication_key
+from notion_scholar.notion_api import get_stored_property_names
+from notion_scholar.notion_api import iter_add_publications_to_databases
+from notion_scholar.notion_api import PageUpdate
+from notion_scholar.notion_api import PROPERTY_TYPES
+from notion_scholar.notion_api import update_pages_in_database
+from notion_scholar.notion_api import validate_database_schema
+from notion_scholar.notion_api import UploadResult
+from notion_scholar.parse_cache import ParseCache
+from notion_scholar.publication import LazyPublication
 from notion_scholar.publication import Publication
+from notion_scholar.scheduler import get_scheduler
 from notion_scholar.utilities import NotionScholarException
 
+T = TypeVar('T')
+
+CANDIDATE_BATCH_SIZE = 100
+INDEX_BATCH_SIZE = 100
+
 
 class IllegalArgumentException(NotionScholarException):
     pass
 
 
+class SyncReport(NamedTuple):
+    """NamedTuple object used to summarize a synchronization of the
+    publications with the database."""
+    publications: int
+    created: int
+    updated: int
+    failures: List[UploadResult]
+
+
 def run(
         token: str,
         database_id: str,
         bib_file_path: Optional[str] = None,
         bib_string: Optional[str] = None,
+        workers: int = 3,
+        index_path: Optional[str] = None,
+        rebuild_index: bool = False,
+        update: bool = False,
+        processes: int = 1,
+        cache_path: Optional[str] = None,
+        partitions: int = 1,
+        profile: bool = False,
+        metrics_file: Optional[str] = None,
+        journal_path: Optional[str] = None,
+        discard_plan: bool = False,
+        dedupe: bool = False,
 ) -> int:
-    if bib_string is not None:
-        bib_database: BibDatabase = get_bib_database_from_string(string=bib_string)
+    # The incompatibilities of the database are reported before any upload
+    validate_database_schema(token=token, database_id=database_id)
 
-    elif bib_file_path is not None:
-        bib_database = get_bib_database_from_file(file_path=bib_file_path)
+    metrics = get_metrics()
+    key_index = KeyIndex(path=index_path) if index_path is not None else None
+    parse_cache = ParseCache(path=cache_path) if cache_path is not None else None
+    journal = Journal(path=journal_path) if journal_path is not None else None
+    duplicate_list: List[Tuple[Publication, Match]] = []
+
+    try:
+        if journal is not None and discard_plan:
+            journal.discard([database_id])
+
+        if journal is not None and journal.has_plan([database_id]):
+            # The bib file and the database are not read again
+            print(
+                f'Resuming the interrupted synchronization, '
+                f'{journal.get_count([database_id]) - journal.get_count([database_id], DONE)} operations left. '
+                f'The changes made to the bibliography since then will be synchronized by the next run.',
+            )
+            report = apply_plan(
+                journal=journal,
+                page_dict_dict={database_id: {}},
+                token=token,
+                workers=workers,
+                key_index=key_index,
+            )[database_id]
+
+        elif bib_string is not None:
+            # A bib string is small, its keys are known before querying Notion
+            publication_list = list(iter_lazy_publications(iter_entries_from_string(bib_string)))
+            publications: Iterable[LazyPublication] = publication_list
+            with metrics.phase('key_scan'):
+                page_dict = get_page_dict(
+                    token=token,
+                    database_id=database_id,
+                    publications=publication_list,
+                    key_index=key_index,
+                    rebuild_index=rebuild_index,
+                    update=update,
+                    partitions=partitions,
+                )
+            if dedupe:
+                publications = filter_duplicates(
+                    publications, page_dict, token, database_id, partitions, duplicate_list,
+                )
+            report = sync_publications(
+                publications=publications,
+                page_dict=page_dict,
+                token=token,
+                database_id=database_id,
+                workers=workers,
+                key_index=key_index,
+                update=update,
+                journal=journal,
+            )
+
+        elif bib_file_path is not None:
+            # The entries of a file are streamed to the upload as they are parsed
+            with metrics.phase('key_scan'):
+                page_dict = get_page_dict(
+                    token=token,
+                    database_id=database_id,
+                    key_index=key_index,
+                    rebuild_index=rebuild_index,
+                    update=update,
+                    partitions=partitions,
+                )
+            if parse_cache is not None:
+                # Only the entries edited since the last run are parsed
+                publications = metrics.iter_phase(
+                    'parse_cache', parse_cache.iter_lazy_publications(bib_file_path, processes=processes),
+                )
+            else:
+                publications = metrics.iter_phase(
+                    'read', iter_lazy_publications(iter_entries_from_file(bib_file_path, processes=processes)),
+                )
+            if dedupe:
+                publications = filter_duplicates(
+                    publications, page_dict, token, database_id, partitions, duplicate_list,
+                )
+            report = sync_publications(
+                publications=publications,
+                page_dict=page_dict,
+                token=token,
+                database_id=database_id,
+                workers=workers,
+                key_index=key_index,
+                update=update,
+                journal=journal,
+            )
+
+        else:
+            raise IllegalArgumentException('Must provide a "string" or a "file_path"')
+    except KeyboardInterrupt:
+        if journal is not None:
+            print('\nInterrupted, the next run will resume the synchronization.')
+        raise
+    finally:
+        if key_index is not None:
+            key_index.close()
+        if parse_cache is not None:
+            parse_cache.close()
+        if journal is not None:
+            journal.close()
+
+    if not report.created and not report.updated and report.publications and not duplicate_list:
+        if update:
+            print('\nAll the publications are already present and up to date in the database.')
+        else:
+            print('\nAll the publications are already present in the database.')
+
+    stats = get_scheduler().get_stats()
+    if stats['throttled'] or stats['retried']:
+        print(
+            f'\n{stats["requests"]} requests sent to Notion, '
+            f'{stats["throttled"]} throttled and {stats["retried"]} retried.',
+        )
+
+    metrics.count('publications', report.publications)
+    report_metrics(profile=profile, metrics_file=metrics_file)
+
+    if duplicate_list:
+        print(f'\n{len(duplicate_list)} publications were not added, as duplicates:')
+        for publication, match in duplicate_list:
+            print(f'- {publication.key}: same {match.reason} as {match.reference}')
+
+    if report.failures:
+        print(f'\n{len(report.failures)} publications could not be added to the database:')
+        for result in report.failures:
+            print(f'- {result.publication.key}: {result.error}')
+        return 1
+
+    return 0
 
-    else:
-        raise IllegalArgumentException('Must provide a "string" or a "file_path"')
 
-    publication_list: List[Publication] = get_publication_list(bib_database)
-    key_list = get_publication_key_list_from_database(
+def sync_publications(
+        publications: Iterable[LazyPublication],
+        page_dict: Dict[str, IndexedPage],
+        token: str,
+        database_id: str,
+        workers: int = 3,
+        key_index: Optional[KeyIndex] = None,
+        update: bool = False,
+        journal: Optional[Journal] = None,
+) -> SyncReport:
+    """Create the pages of the publications absent from `page_dict` and, with
+    `update`, update the pages whose publication changed. Only the
+    publications to create or to compare with their page are converted.
+
+    The pages to create and to update are written as a plan to the journal
+    as they are found, and applied as they are written (see `apply_plan`).
+    The pages created or updated successfully are added to `page_dict` and
+    to the key index.
+
+    Args:
+        publications: Publications from the bibliography.
+        page_dict: Pages of the database, by publication key.
+        token: Notion API token.
+        database_id: Targeted database id.
+        workers: Maximum number of pages created concurrently.
+        key_index: Local index of the database keys.
+        update: Whether to update the pages whose publication changed.
+        journal: Journal in which the plan is written, the plan is kept in
+            memory if not provided.
+    """
+    report_dict = sync_databases(
+        publication_dict={database_id: publications},
+        page_dict_dict={database_id: page_dict},
         token=token,
-        database_id=database_id,
+        workers=workers,
+        key_index=key_index,
+        update=update,
+        journal=journal,
     )
+    return report_dict[database_id]
+
+
+def sync_databases(
+        publication_dict: Mapping[str, Iterable[LazyPublication]],
+        page_dict_dict: Dict[str, Dict[str, IndexedPage]],
+        token: str,
+        workers: int = 3,
+        key_index: Optional[KeyIndex] = None,
+        update: bool = False,
+        journal: Optional[Journal] = None,
+) -> Dict[str, SyncReport]:
+    """Synchronize several databases at once, see `sync_publications`.
+
+    The pages of all the databases are created by the same pool of workers,
+    under the same rate limit. The publications of the databases are
+    interleaved (round robin), so that a large bibliography does not delay
+    the others.
+
+    Args:
+        publication_dict: Publications from the bibliographies, by database id.
+        page_dict_dict: Pages of the databases by publication key, by
+            database id.
+        token: Notion API token.
+        workers: Maximum number of pages created concurrently.
+        key_index: Local index of the database keys.
+        update: Whether to update the pages whose publication changed.
+        journal: Journal in which the plan is written, the plan is kept in
+            memory if not provided.
+
+    Returns:
+        The report of the synchronization of each database, by database id.
+    """
+    metrics = get_metrics()
+    publication_count_dict = {database_id: 0 for database_id in publication_dict}
+
+    def iter_operations(database_id: str) -> Iterator[PlannedOperation]:
+        page_dict = page_dict_dict[database_id]
+        stored_property_names = None
+        if update:
+            stored_property_names = get_stored_property_names(get_database_schema(token, database_id))
+        for lazy_publication in publication_dict[database_id]:
+            publication_count_dict[database_id] += 1
+            page = page_dict.get(lazy_publication.key)
+            if page is None:
+                yield PlannedOperation(database_id, lazy_publication.publication)
+            elif update:
+                page_update = get_page_update(lazy_publication.publication, page, stored_property_names)
+                if page_update is not None:
+                    yield PlannedOperation(
+                        database_id,
+                        page_update.publication,
+                        page_update.page_id,
+                        page_update.property_names,
+                    )
+
+    plan_journal = journal if journal is not None else Journal(path=':memory:')
+    try:
+        report_dict = apply_plan(
+            journal=plan_journal,
+            page_dict_dict=page_dict_dict,
+            token=token,
+            workers=workers,
+            key_index=key_index,
+            operations=metrics.iter_phase(
+                'plan', _iter_round_robin([iter_operations(database_id) for database_id in publication_dict]),
+            ),
+        )
+    finally:
+        if journal is None:
+            plan_journal.close()
+
+    return {
+        database_id: report._replace(publications=publication_count_dict[database_id])
+        for database_id, report in report_dict.items()
+    }
+
+
+def apply_plan(
+        journal: Journal,
+        page_dict_dict: Dict[str, Dict[str, IndexedPage]],
+        token: str,
+        workers: int = 3,
+        key_index: Optional[KeyIndex] = None,
+        operations: Optional[Iterable[PlannedOperation]] = None,
+) -> Dict[str, SyncReport]:
+    """Apply a plan of the databases of `page_dict_dict`, the plan is then
+    removed from the journal.
+
+    Without `operations`, the plan written in the journal by an interrupted
+    run is resumed. Each operation is checkpointed in the journal: the
+    operations done are skipped. The creations sent without confirmation
+    may have been applied, their pages are looked up by key before being
+    created. The updates are applied again.
+
+    With `operations`, a new plan is applied: each operation is written to
+    the journal as it is produced, and its page is created right away, so
+    that the pages are created while the bib file is still being read. A
+    plan interrupted while being written is resumed as far as it was
+    written, the next run synchronizes the rest. The updates are applied
+    once all the pages are created.
 
-    publication_list_filtered = [p for p in publication_list if p.key not in key_list]  # noqa: E501
-    add_publications_to_database(
-        publications=publication_list_filtered,
+    The creations that failed are looked up as well before the plan is
+    removed, if they cannot be looked up the plan is kept for the next run.
+
+    Args:
+        journal: Journal of the plan.
+        page_dict_dict: Pages of the databases by publication key, by
+            database id, updated with the pages created or updated.
+        token: Notion API token.
+        workers: Maximum number of pages created concurrently.
+        key_index: Local index of the database keys.
+        operations: Operations of a new plan, consumed lazily.
+
+    Returns:
+        The report of the application of the plan of each database, by
+        database id, the number of publications is not known and left to 0.
+    """
+    database_ids = list(page_dict_dict)
+    pending_operations: Iterable[PlannedOperation]
+    if operations is not None:
+        pending_operations = (journal.append(operation) for operation in operations)
+    else:
+        operation_list = journal.get_operation_list(database_ids)
+        # The pages of the operations done before an interruption may be
+        # missing from the key index
+        done_results = [
+            UploadResult(operation.publication, operation.page_id, database_id=operation.database_id)
+            for operation in operation_list if operation.status == DONE
+        ]
+        done_results += _look_up_creations(
+            journal=journal,
+            operations=[
+                operation for operation in operation_list
+                if operation.status == SENT and operation.is_creation
+            ],
+            token=token,
+        )
+        _consume_results(done_results, page_dict_dict, key_index)
+        pending_operations = [
+            operation for operation in operation_list
+            if operation.status != DONE
+            and not (operation.is_creation and operation.publication.key in page_dict_dict[operation.database_id])
+        ]
+
+    creation_list: List[PlannedOperation] = []
+    update_list: List[PlannedOperation] = []
+
+    def iter_creations() -> Iterator[Tuple[str, Publication]]:
+        for operation in pending_operations:
+            if not operation.is_creation:
+                update_list.append(operation)
+                continue
+            creation_list.append(operation)
+            journal.mark_sent(operation)
+            yield operation.database_id, operation.publication
+
+    creation_results = iter_add_publications_to_databases(
+        publications=iter_creations(),
         token=token,
-        database_id=database_id,
+        workers=workers,
     )
+    failures = _consume_results(_checkpoint(journal, creation_list, creation_results), page_dict_dict, key_index)
 
-    if not publication_list_filtered and publication_list:
-        print('\nAll the publications are already present in the database.')
+    # A failed creation may have been applied (e.g. its response was lost)
+    keep_plan = False
+    if failures:
+        failed_keys = {(result.database_id, result.publication.key) for result in failures}
+        try:
+            found_results = _look_up_creations(
+                journal=journal,
+                operations=[
+                    operation for operation in creation_list
+                    if (operation.database_id, operation.publication.key) in failed_keys
+                ],
+                token=token,
+            )
+        except Exception:
+            keep_plan = True
+        else:
+            _consume_results(found_results, page_dict_dict, key_index)
+            found_keys = {(result.database_id, result.publication.key) for result in found_results}
+            failures = [
+                result for result in failures
+                if (result.database_id, result.publication.key) not in found_keys
+            ]
 
-    return 0
+    if update_list:
+        print(f'\nUpdating {len(update_list)} publications:')
+        update_results = update_pages_in_database(
+            updates=[_get_page_update(operation) for operation in update_list],
+            token=token,
+            workers=workers,
+        )
+        failures += _consume_results(_checkpoint(journal, update_list, update_results), page_dict_dict, key_index)
+
+    if keep_plan:
+        print('\nThe outcome of some creations is unknown, they will be looked up by the next run.')
+    else:
+        journal.discard(database_ids)
+
+    return {
+        database_id: SyncReport(
+            publications=0,
+            created=sum(1 for operation in creation_list if operation.database_id == database_id),
+            updated=sum(1 for operation in update_list if operation.database_id == database_id),
+            failures=[result for result in failures if result.database_id == database_id],
+        )
+        for database_id in database_ids
+    }
+
+
+def _look_up_creations(
+        journal: Journal,
+        operations: List[PlannedOperation],
+        token: str,
+) -> List[UploadResult]:
+    """Look the pages of creations that may have been applied up by key in
+    their database, the creations found are marked as done.
+
+    Returns:
+        The results of the creations found.
+    """
+    results = []
+    for database_id in dict.fromkeys(operation.database_id for operation in operations):
+        database_operation_list = [operation for operation in operations if operation.database_id == database_id]
+        pages = get_page_list_from_database_by_keys(
+            token=token,
+            database_id=database_id,
+            keys=[operation.publication.key for operation in database_operation_list],
+            property_names=['Filename'],
+        )
+        page_id_dict = {get_publication_key(page): page['id'] for page in pages}
+        for operation in database_operation_list:
+            page_id = page_id_dict.get(operation.publication.key)
+            if page_id is not None:
+                journal.mark_done(operation, page_id)
+                results.append(UploadResult(operation.publication, page_id, database_id=database_id))
+    return results
+
+
+def _get_page_update(operation: PlannedOperation) -> PageUpdate:
+    if operation.page_id is None or operation.property_names is None:
+        raise ValueError(f'The planned operation {operation.position} is not an update.')
+    return PageUpdate(operation.page_id, operation.publication, operation.property_names, operation.database_id)
+
+
+def _checkpoint(
+        journal: Journal,
+        operations: List[PlannedOperation],
+        results: Iterable[UploadResult],
+) -> Iterator[UploadResult]:
+    """Mark the operations as done in the journal as their results arrive,
+    the results being in the order of the operations. The list of the
+    operations may grow while the results are produced."""
+    for i, result in enumerate(results):
+        if result.success and result.page_id is not None:
+            journal.mark_done(operations[i], result.page_id)
+        yield result
+
+
+def filter_duplicates(
+        publications: Iterable[LazyPublication],
+        page_dict: Dict[str, IndexedPage],
+        token: str,
+        database_id: str,
+        partitions: int,
+        duplicate_list: List[Tuple[Publication, Match]],
+) -> Iterator[LazyPublication]:
+    """Filter out the new publications that duplicate a page of the database
+    or another new publication, see `iter_unique_publications`. The titles,
+    DOIs, URLs and authors of all the pages are retrieved."""
+    index = DuplicateIndex()
+    with get_metrics().phase('key_scan'):
+        reference_list = get_reference_list_from_database(token, database_id, partitions)
+    with get_metrics().phase('dedupe'):
+        for reference in reference_list:
+            index.add(reference)
+    return iter_unique_publications(publications, page_dict, index, duplicate_list)
+
+
+def _iter_round_robin(iterables: Iterable[Iterable[T]]) -> Iterator[T]:
+    """Yield the first item of every iterable, then the second item of every
+    iterable, and so on, the exhausted iterables being skipped."""
+    iterators = deque(iter(iterable) for iterable in iterables)
+    while iterators:
+        iterator = iterators.popleft()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            continue
+        yield item
+        iterators.append(iterator)
+
+
+def _consume_results(
+        results: Iterable[UploadResult],
+        page_dict_dict: Dict[str, Dict[str, IndexedPage]],
+        key_index: Optional[KeyIndex] = None,
+) -> List[UploadResult]:
+    """Record the successful results in the page dict of their database and
+    in the key index as they arrive and return the failures."""
+    metrics = get_metrics()
+    failures: List[UploadResult] = []
+    batch_dict: Dict[str, List[UploadResult]] = defaultdict(list)
+    for result in results:
+        if not result.success:
+            failures.append(result)
+            continue
+        # The results of the synchronizations always have a page and a database
+        database_id, page_id = result.database_id, result.page_id
+        if database_id is None or page_id is None:
+            continue
+        digest_dict = get_publication_digest_dict(result.publication)
+        page_dict_dict[database_id][result.publication.key] = IndexedPage(
+            page_id, get_fingerprint(digest_dict), digest_dict,
+        )
+        batch = batch_dict[database_id]
+        batch.append(result)
+        if key_index is not None and len(batch) >= INDEX_BATCH_SIZE:
+            with metrics.phase('index'):
+                key_index.add_results(database_id, batch)
+            batch.clear()
+    if key_index is not None:
+        for database_id, batch in batch_dict.items():
+            if batch:
+                with metrics.phase('index'):
+                    key_index.add_results(database_id, batch)
+    return failures
+
+
+def get_page_dict(
+        token: str,
+        database_id: str,
+        publications: Optional[List[LazyPublication]] = None,
+        key_index: Optional[KeyIndex] = None,
+        rebuild_index: bool = False,
+        update: bool = False,
+        partitions: int = 1,
+) -> Dict[str, IndexedPage]:
+    """Return the pages of the database that may match the publications, by
+    key. With `update`, the pages come with their content hash.
+
+    Args:
+        token: Notion API token.
+        database_id: Targeted database id.
+        publications: Candidate publications, `None` if they are not known
+            in advance.
+        key_index: Local index of the database keys.
+        rebuild_index: Whether to rebuild the key index from a full scan.
+        update: Whether the content hash of the pages is needed.
+        partitions: Number of partitions of the database scanned in parallel
+            when the whole database is scanned.
+    """
+    property_names = list(PROPERTY_TYPES) if update else ['Filename']
+
+    if publications is not None and len(publications) <= CANDIDATE_BATCH_SIZE and not rebuild_index:
+        # A handful of candidates is checked with a single filtered query
+        pages = get_page_list_from_database_by_keys(
+            token=token,
+            database_id=database_id,
+            keys=[p.key for p in publications],
+            property_names=property_names,
+            batch_size=CANDIDATE_BATCH_SIZE,
+        )
+    elif key_index is not None:
+        key_index.refresh(
+            token=token,
+            database_id=database_id,
+            full=rebuild_index,
+            with_digests=update,
+            partitions=partitions,
+        )
+        return key_index.get_page_dict(database_id)
+    else:
+        pages = get_page_list_from_database(
+            token=token,
+            database_id=database_id,
+            property_names=property_names,
+            partitions=partitions,
+        )
+
+    if key_index is not None:
+        key_index.add_pages(database_id, pages, with_digests=update)
+
+    page_dict = {}
+    for page in pages:
+        try:
+            key = get_publication_key(page)
+        except IndexError:
+            continue
+        if update:
+            digest_dict = get_page_digest_dict(page)
+            page_dict[key] = IndexedPage(page['id'], get_fingerprint(digest_dict), digest_dict)
+        else:
+            page_dict[key] = IndexedPage(page['id'])
+    return page_dict
@@ -0,0 +1,255 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from notion_scholar.bibtex import iter_entries_from_file
+from notion_scholar.bibtex import iter_lazy_publications
+from notion_scholar.config import Target
+from notion_scholar.dedupe import Match
+from notion_scholar.diff import IndexedPage
+from notion_scholar.journal import Journal
+from notion_scholar.key_index import KeyIndex
+from notion_scholar.metrics import get_metrics
+from notion_scholar.metrics import report_metrics
+from notion_scholar.notion_api import validate_database_schema
+from notion_scholar.parse_cache import DEFAULT_MAX_FILES
+from notion_scholar.parse_cache import ParseCache
+from notion_scholar.publication import LazyPublication
+from notion_scholar.publication import Publication
+from notion_scholar.run import apply_plan
+from notion_scholar.run import filter_duplicates
+from notion_scholar.run import get_page_dict
+from notion_scholar.run import sync_databases
+from notion_scholar.run import SyncReport
+
+
+def _parse_into_cache(cache_path: str, file_path: str, max_files: int) -> int:
+    """Parse the bib file into the parse cache, in a worker process."""
+    parse_cache = ParseCache(path=cache_path, max_files=max_files)
+    try:
+        return sum(1 for _ in parse_cache.iter_lazy_publications(file_path))
+    finally:
+        parse_cache.close()
+
+
+def run_all(
+        token: str,
+        targets: List[Target],
+        workers: int = 3,
+        index_path: Optional[str] = None,
+        rebuild_index: bool = False,
+        update: bool = False,
+        cache_path: Optional[str] = None,
+        partitions: int = 1,
+        profile: bool = False,
+        metrics_file: Optional[str] = None,
+        journal_path: Optional[str] = None,
+        discard_plan: bool = False,
+        dedupe: bool = False,
+) -> int:
+    """Synchronize every target (bib file → database) saved in the config in
+    a single process.
+
+    The bib files are parsed in parallel by a pool of processes, into the
+    parse cache, while the keys of the databases are retrieved. The pages of
+    all the databases are then created by the same pool of workers and
+    client, under the same rate limit, the publications of the databases
+    being interleaved (see `sync_databases`). The targets sharing a
+    database are synchronized together.
+
+    Args:
+        token: Notion API token.
+        targets: Bib files and the databases they feed.
+        workers: Maximum number of pages created concurrently.
+        index_path: Path of the local key index.
+        rebuild_index: Whether to rebuild the key index from full scans.
+        update: Whether to update the pages whose publication changed.
+        cache_path: Path of the parse cache. Without cache, the files are
+            parsed sequentially, as their publications are uploaded.
+        partitions: Number of partitions of a database scanned in parallel
+            when the whole database is scanned.
+        profile: Whether to print a profile of the synchronization.
+        metrics_file: File in which the metrics of the synchronization are
+            written (see `Metrics.write`).
+        journal_path: Path of the journal of the synchronization plans. If
+            a plan of the databases was interrupted, it is resumed instead.
+        discard_plan: Whether to discard the interrupted plan.
+        dedupe: Whether to skip the publications that duplicate a page of
+            their database or another publication (see `filter_duplicates`).
+
+    Returns:
+        Error code.
+    """
+    database_id_to_targets: Dict[str, List[Target]] = {}
+    for target in targets:
+        database_id_to_targets.setdefault(target.database_id, []).append(target)
+    file_paths = list(dict.fromkeys(target.file_path for target in targets))
+    # The incompatibilities of the databases are reported before any upload
+    for database_id in database_id_to_targets:
+        validate_database_schema(token=token, database_id=database_id)
+
+    key_index = KeyIndex(path=index_path) if index_path is not None else None
+    journal = Journal(path=journal_path) if journal_path is not None else None
+
+    failed_file_paths: Set[str] = set()
+    duplicate_dict: Dict[str, List[Tuple[Publication, Match]]] = {}
+    try:
+        if journal is not None and discard_plan:
+            journal.discard(database_id_to_targets)
+
+        if journal is not None and journal.has_plan(database_id_to_targets):
+            # The bib files and the databases are not read again
+            print(
+                'Resuming the interrupted synchronization, '
+                'the changes made to the bibliographies since then will be synchronized by the next run.',
+            )
+            report_dict = apply_plan(
+                journal=journal,
+                page_dict_dict={database_id: {} for database_id in database_id_to_targets},
+                token=token,
+                workers=workers,
+                key_index=key_index,
+            )
+        else:
+            report_dict = _sync_targets(
+                token=token,
+                database_id_to_targets=database_id_to_targets,
+                file_paths=file_paths,
+                failed_file_paths=failed_file_paths,
+                workers=workers,
+                key_index=key_index,
+                rebuild_index=rebuild_index,
+                update=update,
+                cache_path=cache_path,
+                partitions=partitions,
+                journal=journal,
+                duplicate_dict=duplicate_dict if dedupe else None,
+            )
+    except KeyboardInterrupt:
+        if journal is not None:
+            print('\nInterrupted, the next run will resume the synchronization.')
+        raise
+    finally:
+        if key_index is not None:
+            key_index.close()
+        if journal is not None:
+            journal.close()
+
+    print()
+    for database_id, report in report_dict.items():
+        names = ', '.join(target.name for target in database_id_to_targets[database_id])
+        print(
+            f'{names}: {report.publications} publications, {report.created} added, '
+            f'{report.updated} updated, {len(report.failures)} failed.',
+        )
+        for result in report.failures:
+            print(f'- {result.publication.key}: {result.error}')
+        duplicate_list = duplicate_dict.get(database_id, [])
+        if duplicate_list:
+            print(f'{len(duplicate_list)} publications were not added, as duplicates:')
+            for publication, match in duplicate_list:
+                print(f'- {publication.key}: same {match.reason} as {match.reference}')
+
+    report_metrics(profile=profile, metrics_file=metrics_file)
+
+    failed = failed_file_paths or any(report.failures for report in report_dict.values())
+    return 1 if failed else 0
+
+
+def _sync_targets(
+        token: str,
+        database_id_to_targets: Dict[str, List[Target]],
+        file_paths: List[str],
+        failed_file_paths: Set[str],
+        workers: int,
+        key_index: Optional[KeyIndex],
+        rebuild_index: bool,
+        update: bool,
+        cache_path: Optional[str],
+        partitions: int,
+        journal: Optional[Journal],
+        duplicate_dict: Optional[Dict[str, List[Tuple[Publication, Match]]]] = None,
+) -> Dict[str, SyncReport]:
+    """Parse the bib files while the keys of the databases are retrieved,
+    then synchronize the databases, see `run_all`. The files that could not
+    be parsed are added to `failed_file_paths`. With `duplicate_dict`, the
+    duplicates are filtered out (see `filter_duplicates`) and added to it by
+    database."""
+    metrics = get_metrics()
+    # Every file is kept in the cache, the files of the targets must not evict one another
+    max_files = max(DEFAULT_MAX_FILES, len(file_paths))
+    if cache_path is not None:
+        # The cache is created (or rebuilt if written by a previous version) before the workers open it
+        ParseCache(path=cache_path, max_files=max_files).close()
+
+    with ProcessPoolExecutor(max_workers=max(1, min(len(file_paths), os.cpu_count() or 1))) as executor:
+        futures = {}
+        if cache_path is not None:
+            futures = {
+                file_path: executor.submit(_parse_into_cache, cache_path, file_path, max_files)
+                for file_path in file_paths
+            }
+
+        page_dict_dict: Dict[str, Dict[str, IndexedPage]] = {}
+        for database_id in database_id_to_targets:
+            with metrics.phase('key_scan'):
+                page_dict_dict[database_id] = get_page_dict(
+                    token=token,
+                    database_id=database_id,
+                    key_index=key_index,
+                    rebuild_index=rebuild_index,
+                    update=update,
+                    partitions=partitions,
+                )
+
+        for file_path, future in futures.items():
+            with metrics.phase('parse'):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f'"{file_path}" could not be parsed ({e}), its targets are skipped.')
+                    failed_file_paths.add(file_path)
+
+    parse_cache = ParseCache(path=cache_path, max_files=max_files) if cache_path is not None else None
+
+    def iter_target_publications(target: Target) -> Iterable[LazyPublication]:
+        if parse_cache is not None:
+            return parse_cache.iter_lazy_publications(target.file_path)
+        return iter_lazy_publications(iter_entries_from_file(target.file_path))
+
+    publication_dict: Dict[str, Iterable[LazyPublication]] = {
+        database_id: chain.from_iterable(
+            iter_target_publications(target)
+            for target in database_targets if target.file_path not in failed_file_paths
+        )
+        for database_id, database_targets in database_id_to_targets.items()
+    }
+    if duplicate_dict is not None:
+        for database_id, publications in publication_dict.items():
+            publication_dict[database_id] = filter_duplicates(
+                publications,
+                page_dict_dict[database_id],
+                token,
+                database_id,
+                partitions,
+                duplicate_dict.setdefault(database_id, []),
+            )
+    try:
+        return sync_databases(
+            publication_dict=publication_dict,
+            page_dict_dict=page_dict_dict,
+            token=token,
+            workers=workers,
+            key_index=key_index,
+            update=update,
+            journal=journal,
+        )
+    finally:
+        if parse_cache is not None:
+            parse_cache.close()
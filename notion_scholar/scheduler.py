@@ -0,0 +1,249 @@
+import random
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import TypeVar
+
+import httpx
+from notion_client.errors import HTTPResponseError
+from notion_client.errors import RequestTimeoutError
+
+from notion_scholar.metrics import get_metrics
+
+T = TypeVar('T')
+
+TRANSIENT_STATUS_CODES = {409, 429, 500, 502, 503, 504}
+# Errors of requests that Notion certainly did not apply: rejected by the
+# rate limit or for a conflict
+UNAPPLIED_STATUS_CODES = {409, 429}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available and consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    def drain(self) -> None:
+        """Empty the bucket, the next token will be available in 1/rate second."""
+        with self._lock:
+            self._tokens = 0
+            self._last_refill = time.monotonic()
+
+
+class RequestScheduler:
+    """Schedule the Notion API calls under the rate limit of the API.
+
+    Every call waits for a token of a shared bucket, refilled at the average
+    rate allowed by Notion (~3 requests per second). Throttled calls (429)
+    pause every caller for the duration given by the `Retry-After` header,
+    the other transient errors are retried with a jittered exponential
+    backoff. The calls that are not idempotent are only retried if they were
+    certainly not applied (see `call`).
+
+    Args:
+        rate: Average number of requests per second.
+        burst: Maximum number of requests sent in a burst.
+        max_retries: Maximum number of retries of a single call.
+        backoff_base: Delay in seconds before the first retry.
+        backoff_max: Maximum delay in seconds between two retries.
+    """
+    def __init__(
+            self,
+            rate: float = 3.0,
+            burst: int = 3,
+            max_retries: int = 6,
+            backoff_base: float = 0.5,
+            backoff_max: float = 60.0,
+    ):
+        self.bucket = TokenBucket(rate=rate, capacity=burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.requests = 0
+        self.throttled = 0
+        self.retried = 0
+        self.failed = 0
+
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def call(
+            self,
+            function: Callable[..., T],
+            *args: Any,
+            idempotent: bool = True,
+            recover: Optional[Callable[[], Optional[T]]] = None,
+            **kwargs: Any,
+    ) -> T:
+        """Call `function(*args, **kwargs)` under the rate limit, retrying the
+        transient errors.
+
+        A call that is not idempotent, such as `pages.create`, is only retried
+        if it was certainly not applied: throttled, in conflict, or not sent
+        because the connection failed. After an ambiguous failure (a timeout
+        while waiting for the response, a server error), it may have been
+        applied: `recover` looks its result up, and the call is only retried
+        if `recover` returns `None`.
+
+        Raises:
+            The error of the last attempt if it is not transient or if the
+            maximum number of retries is reached, or if `recover` fails (its
+            error being the cause).
+        """
+        metrics = get_metrics()
+        endpoint = get_endpoint_name(function)
+        attempt = 0
+        while True:
+            self._wait()
+            with self._lock:
+                self.requests += 1
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                metrics.observe_request(endpoint, time.perf_counter() - start, get_error_status(e))
+                retryable = is_transient_error(e, idempotent=idempotent)
+                if not retryable and recover is not None and is_transient_error(e):
+                    try:
+                        recovered = recover()
+                    except Exception as recover_error:
+                        with self._lock:
+                            self.failed += 1
+                        raise e from recover_error
+                    if recovered is not None:
+                        metrics.count('requests_recovered')
+                        return recovered
+                    retryable = True
+                if not retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failed += 1
+                    raise
+
+                retry_after = get_retry_after(e)
+                if retry_after is not None or getattr(e, 'status', None) == 429:
+                    delay = retry_after if retry_after is not None else self._get_backoff(attempt)
+                    self._pause(delay)
+                    with self._lock:
+                        self.throttled += 1
+                    metrics.count('requests_throttled')
+                else:
+                    time.sleep(self._get_backoff(attempt))
+
+                with self._lock:
+                    self.retried += 1
+                metrics.count('requests_retried')
+                attempt += 1
+            else:
+                metrics.observe_request(endpoint, time.perf_counter() - start)
+                return result
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'retried': self.retried,
+                'failed': self.failed,
+            }
+
+    def _wait(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.bucket.acquire()
+
+    def _pause(self, delay: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.bucket.drain()
+
+    def _get_backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+def is_transient_error(error: Exception, idempotent: bool = True) -> bool:
+    """Whether a failed call is worth retrying, a call that is not
+    idempotent only if it was certainly not applied."""
+    if isinstance(error, HTTPResponseError):
+        return error.status in (TRANSIENT_STATUS_CODES if idempotent else UNAPPLIED_STATUS_CODES)
+    if not idempotent:
+        return isinstance(get_transport_error(error), (httpx.ConnectError, httpx.ConnectTimeout))
+    return isinstance(error, (RequestTimeoutError, httpx.TimeoutException, httpx.NetworkError))
+
+
+def get_transport_error(error: Exception) -> BaseException:
+    """Return the httpx error behind a `RequestTimeoutError`, which
+    notion-client raises in place of the httpx timeouts."""
+    if isinstance(error, RequestTimeoutError) and error.__context__ is not None:
+        return error.__context__
+    return error
+
+
+def get_error_status(error: Exception) -> str:
+    """Status of a failed call in the metrics: the HTTP status code, or the
+    name of the error if no response was received."""
+    status = getattr(error, 'status', None)
+    return str(status) if status is not None else type(error).__name__
+
+
+def get_endpoint_name(function: Callable) -> str:
+    """Name of the endpoint called by a method of the Notion client, e.g.
+    `pages.create` for `client.pages.create`."""
+    owner = getattr(function, '__self__', None)
+    name = getattr(function, '__name__', 'call')
+    if owner is None:
+        return name
+    return f'{type(owner).__name__.replace("Endpoint", "").lower()}.{name}'
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Number of seconds asked by the `Retry-After` header of the error, if any."""
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        return None
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """Return the request scheduler shared by the whole process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler: Optional[RequestScheduler] = None) -> None:
+    """Replace the request scheduler shared by the whole process, `None`
+    restores a default scheduler at the next call of `get_scheduler`."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
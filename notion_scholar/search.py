@@ -0,0 +1,248 @@
+import os
+import sqlite3
+from pathlib import Path
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from notion_scholar.metrics import get_metrics
+from notion_scholar.metrics import report_metrics
+from notion_scholar.parse_cache import loads_publications
+from notion_scholar.parse_cache import ParseCache
+
+# Weights of the columns in the ranking of the results (see `bm25`)
+COLUMN_WEIGHTS = {
+    'key': 5.0,
+    'title': 10.0,
+    'authors': 5.0,
+    'abstract': 1.0,
+    'journal': 2.0,
+    'year': 1.0,
+    'doi': 1.0,
+}
+
+
+class SearchResult(NamedTuple):
+    """NamedTuple object used to store a publication matching a query."""
+    key: str
+    title: str
+    authors: str
+    year: str
+    journal: str
+    doi: str
+
+
+class SearchIndex:
+    """Local SQLite full-text index (FTS5) of the publications of the bib
+    files.
+
+    The index is built from the parse cache (see `ParseCache`), block by
+    block: when a file changes, only the publications of its new or edited
+    blocks are indexed, and those of its removed blocks are deleted. A file
+    whose size and modification time are unchanged is not read at all.
+
+    Args:
+        path: Path of the SQLite file, it is created if it does not exist.
+    """
+    def __init__(self, path: str):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'file_path TEXT PRIMARY KEY, '
+                'size INTEGER, '
+                'mtime_ns INTEGER)',
+            )
+            # The rowid of an entry is the rowid of its publication in the
+            # full-text table
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'rowid INTEGER PRIMARY KEY, '
+                'file_path TEXT NOT NULL, '
+                'digest TEXT NOT NULL)',
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS entries_by_block ON entries (file_path, digest)',
+            )
+            self.connection.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS publications USING fts5('
+                f'{", ".join(COLUMN_WEIGHTS)}, '
+                f"tokenize = 'unicode61 remove_diacritics 2')",
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def clear(self) -> None:
+        with self.connection:
+            self.connection.execute('DELETE FROM publications')
+            self.connection.execute('DELETE FROM entries')
+            self.connection.execute('DELETE FROM files')
+
+    def update(self, file_path: str, parse_cache: ParseCache, processes: int = 1) -> bool:
+        """Bring the index of the file up to date.
+
+        Args:
+            file_path: Path of the bib file.
+            parse_cache: Parse cache from which the publications are read,
+                only the edited blocks of the file are parsed again.
+            processes: Number of processes used to parse the blocks.
+
+        Returns:
+            Whether the file changed since it was last indexed.
+        """
+        file_path = str(file_path)
+        stat = os.stat(file_path)
+        row = self.connection.execute(
+            'SELECT size, mtime_ns FROM files WHERE file_path = ?',
+            (file_path,),
+        ).fetchone()
+        if row is not None and tuple(row) == (stat.st_size, stat.st_mtime_ns):
+            return False
+
+        # Brings the parse cache up to date, without deserializing the publications
+        for _ in parse_cache.iter_lazy_publications(file_path, processes=processes):
+            pass
+        block_dict = {block.digest: block for block in parse_cache.get_block_list(file_path) if block.entry_keys}
+        indexed_digests = {
+            digest for digest, in self.connection.execute(
+                'SELECT DISTINCT digest FROM entries WHERE file_path = ?',
+                (file_path,),
+            )
+        }
+
+        metrics = get_metrics()
+        with self.connection:
+            for digest in indexed_digests - block_dict.keys():
+                rowids = self.connection.execute(
+                    'SELECT rowid FROM entries WHERE file_path = ? AND digest = ?',
+                    (file_path, digest),
+                ).fetchall()
+                self.connection.executemany('DELETE FROM publications WHERE rowid = ?', rowids)
+                self.connection.executemany('DELETE FROM entries WHERE rowid = ?', rowids)
+                metrics.count('publications_removed', len(rowids))
+
+            for digest in block_dict.keys() - indexed_digests:
+                publications = block_dict[digest].publications
+                if publications is None:  # Not parsed
+                    continue
+                for publication in loads_publications(publications):
+                    rowid = self.connection.execute(
+                        'INSERT INTO entries (file_path, digest) VALUES (?, ?)',
+                        (file_path, digest),
+                    ).lastrowid
+                    self.connection.execute(
+                        'INSERT INTO publications (rowid, key, title, authors, abstract, journal, year, doi) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (
+                            rowid,
+                            publication.key,
+                            publication.title,
+                            publication.authors,
+                            publication.abstract,
+                            publication.journal,
+                            str(publication.year) if publication.year else '',
+                            publication.doi,
+                        ),
+                    )
+                    metrics.count('publications_indexed')
+
+            self.connection.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+                (file_path, stat.st_size, stat.st_mtime_ns),
+            )
+        return True
+
+    def search(self, query: str, file_path: Optional[str] = None, limit: int = 20) -> List[SearchResult]:
+        """Return the publications matching the query, the most relevant
+        first.
+
+        The query uses the syntax of FTS5: the publications containing all
+        the words match, `"..."` matches a phrase, `word*` a prefix, `OR`
+        and `NOT` combine the words, and `column:word` restricts a word to
+        a column (`authors:hinton`). A query that is not valid in that
+        syntax is searched word by word.
+
+        Args:
+            query: Query.
+            file_path: Bib file whose publications are searched, all the
+                indexed files are searched if not provided.
+            limit: Maximum number of results.
+        """
+        sql = (
+            'SELECT key, title, authors, year, journal, doi FROM publications '
+            'JOIN entries ON entries.rowid = publications.rowid '
+            'WHERE publications MATCH ?'
+        )
+        parameters: list = []
+        if file_path is not None:
+            sql += ' AND entries.file_path = ?'
+            parameters.append(str(file_path))
+        sql += f' ORDER BY bm25(publications, {", ".join(map(str, COLUMN_WEIGHTS.values()))}) LIMIT ?'
+        parameters.append(limit)
+
+        try:
+            rows = self.connection.execute(sql, [query, *parameters]).fetchall()
+        except sqlite3.OperationalError:
+            rows = self.connection.execute(sql, [_quote_words(query), *parameters]).fetchall()
+        return [SearchResult(*row) for row in rows]
+
+
+def _quote_words(query: str) -> str:
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def search(
+        query: str,
+        bib_file_path: str,
+        index_path: Optional[str] = None,
+        cache_path: Optional[str] = None,
+        limit: int = 20,
+        processes: int = 1,
+        rebuild_index: bool = False,
+        profile: bool = False,
+        metrics_file: Optional[str] = None,
+) -> int:
+    """Print the publications of the bib file matching the query, without
+    querying Notion (see `SearchIndex.search` for the syntax of the query).
+
+    Args:
+        query: Query.
+        bib_file_path: Bib file searched.
+        index_path: Path of the full-text index, see `SearchIndex`. The
+            index is kept in memory if not provided.
+        cache_path: Path of the parse cache, shared with the other commands.
+            The cache is kept in memory if not provided.
+        limit: Maximum number of publications printed.
+        processes: Number of processes used to parse the bib file.
+        rebuild_index: Whether to rebuild the index from the bib file.
+        profile: Whether to print a profile of the search.
+        metrics_file: File in which the metrics are written (see
+            `Metrics.write`).
+
+    Returns:
+        Error code, 1 if no publication matches the query.
+    """
+    metrics = get_metrics()
+    index = SearchIndex(path=index_path if index_path is not None else ':memory:')
+    parse_cache = ParseCache(path=cache_path if cache_path is not None else ':memory:')
+    if rebuild_index:
+        index.clear()
+    with metrics.phase('index'):
+        index.update(bib_file_path, parse_cache, processes=processes)
+    parse_cache.close()
+    with metrics.phase('query'):
+        results = index.search(query, file_path=bib_file_path, limit=limit)
+    index.close()
+
+    if results:
+        for result in results:
+            print(f'- {result.key} ({result.year or "n.d."}): {result.title}')
+            print(f'  {", ".join(part for part in (result.authors, result.journal, result.doi) if part)}')
+    else:
+        print('No publication matches the query.')
+
+    report_metrics(profile=profile, metrics_file=metrics_file)
+    return 0 if results else 1
@@ -1,8 +1,12 @@
+import os
+import tempfile
 import warnings
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterator
 from typing import Optional
-
-import keyring
+from typing import TextIO
 
 
 class NotionScholarException(Exception):
@@ -21,23 +25,58 @@ def append_string_to_file(file_path: str, content: str) -> None:
         f.write(content)
 
 
+@contextmanager
+def open_atomic(file_path: str, encoding: str = 'utf-8') -> Iterator[TextIO]:
+    """Open a temporary file to write, next to `file_path`, and move it to
+    `file_path` once closed without error. The previous content of the file
+    remains untouched if the writing fails or is interrupted.
+
+    Args:
+        file_path: path of the file that will be written to.
+        encoding: encoding of the file.
+    """
+    directory_path = os.path.dirname(os.path.abspath(file_path))
+    file_descriptor, temporary_path = tempfile.mkstemp(
+        dir=directory_path, prefix=f'.{os.path.basename(file_path)}.', suffix='.tmp',
+    )
+    try:
+        # mkstemp creates the file readable by its owner only
+        if os.path.exists(file_path):
+            mode = os.stat(file_path).st_mode & 0o777
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(temporary_path, mode)
+        with open(file_descriptor, mode='w', encoding=encoding) as f:
+            yield f
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
 def write_to_file(file_path: str, content: str) -> None:
-    """Write content to a file.
+    """Write content to a file, atomically.
 
     Args:
         file_path: path of the file that will be written to.
         content: content that will be written.
     """
-    with open(file_path, mode='w', encoding='utf-8') as f:
+    with open_atomic(file_path) as f:
         f.write(content)
 
 
+@lru_cache(maxsize=None)
 def get_token() -> Optional[str]: # Add returns
-    """Retrieve the Notion API token stored with keyring.
+    """Retrieve the Notion API token stored with keyring. The token is
+    retrieved once per process, `get_token.cache_clear()` must be called
+    after saving or deleting it.
 
     Returns:
         A string containing the token or `None` if the token does not exist.
     """
+    import keyring  # The keyring backends are slow to import
     return keyring.get_password('notion-scholar', 'token')
 
 
@@ -0,0 +1,134 @@
+import os
+import time
+from typing import Optional
+from typing import Tuple
+
+from notion_scholar.key_index import KeyIndex
+from notion_scholar.metrics import report_metrics
+from notion_scholar.notion_api import validate_database_schema
+from notion_scholar.parse_cache import ParseCache
+from notion_scholar.run import get_page_dict
+from notion_scholar.run import sync_publications
+
+
+def _get_signature(file_path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def watch(
+        token: str,
+        database_id: str,
+        bib_file_path: str,
+        workers: int = 3,
+        index_path: Optional[str] = None,
+        rebuild_index: bool = False,
+        update: bool = False,
+        processes: int = 1,
+        cache_path: Optional[str] = None,
+        partitions: int = 1,
+        interval: float = 1.0,
+        debounce: float = 2.0,
+        profile: bool = False,
+        metrics_file: Optional[str] = None,
+) -> int:
+    """Watch the bib file and add its new publications to the database as
+    soon as they are written, until interrupted.
+
+    The pages of the database are retrieved once, then kept in memory along
+    with the Notion client. The file is polled every `interval` seconds, a
+    change being synchronized once the file has not been modified for
+    `debounce` seconds, so that a burst of writes is pushed at once. Thanks
+    to the parse cache, only the new or edited entries are parsed.
+
+    Args:
+        token: Notion API token.
+        database_id: Targeted database id.
+        bib_file_path: Watched bib file.
+        workers: Maximum number of pages created concurrently.
+        index_path: Path of the local key index.
+        rebuild_index: Whether to rebuild the key index at start-up.
+        update: Whether to update the pages whose publication changed.
+        processes: Number of processes used to parse the bib file.
+        cache_path: Path of the parse cache, the cache is kept in memory if
+            not provided.
+        partitions: Number of partitions of the database scanned in parallel
+            at start-up.
+        interval: Polling interval of the file, in seconds.
+        debounce: Delay without modification of the file before a change is
+            synchronized, in seconds.
+        profile: Whether to print a profile of the synchronizations when
+            the watch is stopped.
+        metrics_file: File in which the metrics are written after every
+            synchronization, as JSON or in the text format of Prometheus.
+
+    Returns:
+        Error code.
+    """
+    validate_database_schema(token=token, database_id=database_id)
+    key_index = KeyIndex(path=index_path) if index_path is not None else None
+    parse_cache = ParseCache(path=cache_path if cache_path is not None else ':memory:')
+
+    page_dict = get_page_dict(
+        token=token,
+        database_id=database_id,
+        key_index=key_index,
+        rebuild_index=rebuild_index,
+        update=update,
+        partitions=partitions,
+    )
+    print(f'{len(page_dict)} publications present in the database, watching "{bib_file_path}".')
+
+    def sync() -> None:
+        try:
+            report = sync_publications(
+                publications=parse_cache.iter_lazy_publications(bib_file_path, processes=processes),
+                page_dict=page_dict,
+                token=token,
+                database_id=database_id,
+                workers=workers,
+                key_index=key_index,
+                update=update,
+            )
+        except Exception as e:  # The file may be half-written, or Notion unreachable
+            print(f'Synchronization failed ({e}), it will be retried at the next change.')
+            return
+        finally:
+            report_metrics(metrics_file=metrics_file)
+        if report.created or report.updated or report.failures:
+            print(
+                f'{time.strftime("%H:%M:%S")}: {report.created} publications added, '
+                f'{report.updated} updated, {len(report.failures)} failed.',
+            )
+
+    synced_signature = _get_signature(bib_file_path)
+    sync()
+    try:
+        while True:
+            time.sleep(interval)
+            signature = _get_signature(bib_file_path)
+            if signature is None or signature == synced_signature:
+                continue
+
+            # Wait for the end of the burst of writes
+            while True:
+                time.sleep(debounce)
+                latest_signature = _get_signature(bib_file_path)
+                if latest_signature == signature:
+                    break
+                signature = latest_signature
+
+            if signature is not None:
+                synced_signature = signature
+                sync()
+    except KeyboardInterrupt:
+        print('\nStopped watching.')
+        report_metrics(profile=profile)
+    finally:
+        if key_index is not None:
+            key_index.close()
+        parse_cache.close()
+    return 0
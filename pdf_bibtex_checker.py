@@ -1,14 +1,13 @@
 from pathlib import Path
-from notion_scholar.bibtex import get_bib_database_from_file
-from urllib.parse import quote
+from notion_scholar.check_pdfs import check_pdfs
 
 
 def check_missing_and_extra_pdfs(bibtex_path, folder_path):
     """
     Checks for missing and extra PDF files in a folder compared to a BibTeX file.
 
-    This function reads a BibTeX file, retrieves all its entries (with their titles),
-    and compares the BibTeX keys (IDs) with the list of PDF files in a specified folder.
+    This function reads the keys of a BibTeX file and compares them with the PDF files
+    of a specified folder and its subfolders, see `ns check-pdfs`.
     The PDFs should follow the naming convention '<bibtex_key>.pdf'. The function identifies:
 
     1. Missing PDFs: BibTeX entries that do not have a corresponding PDF file in the folder.
@@ -31,41 +30,7 @@ def check_missing_and_extra_pdfs(bibtex_path, folder_path):
         - Missing PDFs with BibTeX key, title, and a Google Scholar search link.
         - Extra PDFs in the folder that are not present in the BibTeX file.
     """
-
-    # Step 1: Get the BibTeX database from the .bib file
-    bib_database = get_bib_database_from_file(bibtex_path)
-
-    # Extract a dictionary of {ID: title} from the BibTeX database
-    bib_entries = {entry['ID']: entry.get('title', 'No title available') for entry in bib_database.entries}
-
-    # Step 2: Get the list of PDF files in the folder
-    folder = Path(folder_path)
-    pdf_files = [file.stem for file in folder.glob("*.pdf")]  # Use stem to get filename without extension
-
-    # Step 3: Find missing PDFs (keys in BibTeX but no PDF in the folder)
-    missing_pdfs = {key: bib_entries[key] for key in bib_entries if key not in pdf_files}
-
-    # Step 4: Find extra PDFs (PDFs in the folder that are not in the BibTeX file)
-    extra_pdfs = [pdf for pdf in pdf_files if pdf not in bib_entries]
-
-    # Step 5: Print the results
-    if missing_pdfs:
-        print("Missing PDFs (these entries are in the .bib file but no corresponding PDF is found):")
-        for key, title in missing_pdfs.items():
-            # Encode the title for URL
-            encoded_title = quote(title)
-            google_scholar_link = f"https://scholar.google.com/scholar?q={encoded_title}"
-            print(f"- {key}.pdf : {title}")
-            print(f"  {google_scholar_link}")
-    else:
-        print("All BibTeX entries have corresponding PDFs.")
-
-    if extra_pdfs:
-        print("\nExtra PDFs (these PDFs are in the folder but not in the .bib file):")
-        for pdf in extra_pdfs:
-            print(f"- {pdf}.pdf")
-    else:
-        print("No extra PDFs in the folder.")
+    check_pdfs(bib_file_path=str(bibtex_path), folder_path=str(folder_path))
 
 
 if __name__ == '__main__':
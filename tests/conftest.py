@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The local stand-in of the Notion API and the synthetic libraries of the benchmarks
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+from fake_notion import FakeNotion  # noqa: E402
+from synthetic import generate_bib_file  # noqa: E402
+
+from notion_scholar.scheduler import RequestScheduler  # noqa: E402
+from notion_scholar.scheduler import set_scheduler  # noqa: E402
+
+
+@pytest.fixture
+def fake_notion():
+    """Send the requests to a local stand-in of the Notion API, without rate limit."""
+    set_scheduler(RequestScheduler(rate=10000, burst=100, backoff_base=0.001))
+    fake = FakeNotion()
+    with fake.install():
+        yield fake
+    set_scheduler(None)
+
+
+@pytest.fixture
+def library_path(tmp_path):
+    """Synthetic library of 40 entries."""
+    return generate_bib_file(40, str(tmp_path / 'library.bib'))
+
+
+def get_page_keys(fake: FakeNotion) -> list:
+    """Return the keys of the pages of the fake database, in their order of creation."""
+    return [page['properties']['Filename']['rich_text'][0]['plain_text'] for page in fake.pages.values()]
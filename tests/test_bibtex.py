@@ -0,0 +1,90 @@
+import pytest
+
+from notion_scholar.bibtex import get_bib_database_from_file
+from notion_scholar.bibtex import get_block_type
+from notion_scholar.bibtex import iter_block_spans
+from notion_scholar.bibtex import iter_blocks_from_file
+from notion_scholar.bibtex import iter_entries_from_file
+from notion_scholar.bibtex import iter_entry_lists
+
+BIBTEX = '''% Implicit comment (with a parenthesis
+@string{conf = "Conference on Parsers"}
+@article(k1, title = "Before", year = 2020)
+@article(k2, title = "A (short) note :) on parsers", author = {Doe, Jane}, year = 2021)
+@inproceedings(k3, title = {Braced ) parenthesis}, booktitle = conf # " (Short papers)")
+@article{k4, title = "Quoted {brace}", note = {"}, year = 2022}
+@comment{Explicit comment}
+@article{k5,
+  title = {After (the others},
+  year = 2023,
+}
+'''
+
+
+@pytest.fixture
+def bib_file_path(tmp_path):
+    file_path = tmp_path / 'references.bib'
+    file_path.write_text(BIBTEX, encoding='utf-8')
+    return str(file_path)
+
+
+def test_iter_block_spans():
+    blocks = [BIBTEX[start:end] for start, end in iter_block_spans(BIBTEX)]
+    assert [block.split(',')[0] for block in blocks] == [
+        '@string{conf = "Conference on Parsers"}',
+        '@article(k1',
+        '@article(k2',
+        '@inproceedings(k3',
+        '@article{k4',
+        '@comment{Explicit comment}',
+        '@article{k5',
+    ]
+    assert blocks[2].endswith('year = 2021)')
+    assert blocks[3].endswith('" (Short papers)")')
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 1 << 20])
+def test_iter_blocks_from_file(bib_file_path, chunk_size):
+    blocks = [BIBTEX[start:end] for start, end in iter_block_spans(BIBTEX)]
+    assert list(iter_blocks_from_file(bib_file_path, chunk_size=chunk_size)) == blocks
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_entries_match_the_parser(bib_file_path, processes):
+    expected_entries = get_bib_database_from_file(bib_file_path).entries
+    assert [entry['ID'] for entry in expected_entries] == ['k1', 'k2', 'k3', 'k4', 'k5']
+    assert list(iter_entries_from_file(bib_file_path)) == expected_entries
+    assert get_bib_database_from_file(bib_file_path, processes=processes).entries == expected_entries
+
+
+MACRO_AFTER_USE_BIBTEX = '''@string{venue = "First venue"}
+@article{before, title = {Before}, journal = venue, year = 2020}
+@string{venue = "Second venue"}
+@article{after, title = {After}, journal = venue, year = 2021}
+'''
+
+
+@pytest.mark.parametrize('processes', [2, 3])
+def test_parallel_parse_matches_serial_parse(tmp_path, processes):
+    file_path = tmp_path / 'macros.bib'
+    # Enough blocks for several chunks, the macro being redefined after its use
+    file_path.write_text(MACRO_AFTER_USE_BIBTEX * 70, encoding='utf-8')
+    expected_entries = list(iter_entries_from_file(str(file_path)))
+    assert [entry['journal'] for entry in expected_entries[:2]] == ['First venue', 'Second venue']
+    assert list(iter_entries_from_file(str(file_path), processes=processes)) == expected_entries
+    assert get_bib_database_from_file(str(file_path), processes=processes).entries == expected_entries
+
+
+def test_malformed_blocks_are_rejected(tmp_path):
+    assert get_block_type('@article{k1, title = {Title}}') == 'article'
+    assert get_block_type('@ not a block') == ''
+    assert list(iter_entry_lists(['@ not a block', '@article{k1, title = {Title}}'])) == [
+        [],
+        [{'ENTRYTYPE': 'article', 'ID': 'k1', 'title': 'Title'}],
+    ]
+
+    file_path = tmp_path / 'malformed.bib'
+    file_path.write_text('@article{k1, title = {A}}\n@ at sign\n@misc k2, title = {B}}\n@article{k3, title = {C}}\n')
+    expected_entries = get_bib_database_from_file(str(file_path)).entries
+    assert [entry['ID'] for entry in expected_entries] == ['k1', 'k3']
+    assert list(iter_entries_from_file(str(file_path))) == expected_entries
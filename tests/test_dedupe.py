@@ -0,0 +1,121 @@
+from typing import List
+from typing import Tuple
+
+from notion_scholar.dedupe import DuplicateIndex
+from notion_scholar.dedupe import get_duplicate_groups
+from notion_scholar.dedupe import get_reference
+from notion_scholar.dedupe import is_certain_duplicate
+from notion_scholar.dedupe import iter_unique_publications
+from notion_scholar.dedupe import Match
+from notion_scholar.dedupe import Reference
+from notion_scholar.publication import LazyPublication
+from notion_scholar.publication import Publication
+
+
+def get_publication(key: str, title: str, authors: str = '', doi: str = '', url: str = '') -> Publication:
+    return Publication(
+        key=key,
+        title=title,
+        authors=authors,
+        year=2020,
+        journal='',
+        url=url,
+        bibtex='',
+        abstract='',
+        doi=doi,
+        type='article',
+    )
+
+
+def filter_publications(publications: List[Publication]) -> Tuple[List[str], List[Tuple[Publication, Match]]]:
+    """Return the keys of the publications kept by the filter of `run
+    --dedupe`, and the duplicates filtered out."""
+    duplicate_list: List[Tuple[Publication, Match]] = []
+    unique_publications = iter_unique_publications(
+        (LazyPublication(publication.key, publication) for publication in publications),
+        page_dict={},
+        index=DuplicateIndex(),
+        duplicate_list=duplicate_list,
+    )
+    return [lazy_publication.key for lazy_publication in unique_publications], duplicate_list
+
+
+def test_index_finds_near_duplicate_titles():
+    index = DuplicateIndex()
+    index.add(Reference(
+        'devlin2019', 'BERT: Pre-training of Deep Bidirectional Transformers for Language Understanding', '', '',
+    ))
+    index.add(Reference('he2016', 'Deep Residual Learning for Image Recognition', '', ''))
+
+    matches = index.find(Reference(
+        'devlin2018', '{BERT}: Pre-Training of Deep Bidirectional Transformers for Language Understandings', '', '',
+    ))
+    assert [(match.reference.key, match.reason) for match in matches] == [('devlin2019', 'similar title')]
+    assert matches[0].similarity >= index.threshold
+
+    matches = index.find(Reference('he2016b', 'Deep residual learning for image recognition.', '', ''))
+    assert [(match.reference.key, match.reason) for match in matches] == [('he2016', 'title')]
+    assert index.find(Reference('other', 'Deep Residual Learning for Speech Recognition', '', '')) == []
+
+
+def test_identical_dois_are_skipped():
+    keys, duplicate_list = filter_publications([
+        get_publication('paper', 'A Paper', authors='Doe, Jane', doi='10.1000/ABC.123'),
+        get_publication(
+            'paper_journal', 'A Paper, Extended Version', authors='Roe, Richard', doi='https://doi.org/10.1000/abc.123',
+        ),
+        get_publication('preprint', 'Preprint', doi='10.48550/arXiv.1706.03762'),
+        get_publication('preprint_url', 'Preprint Title', url='https://arxiv.org/abs/1706.03762v2'),
+    ])
+    assert keys == ['paper', 'preprint']
+    assert [(publication.key, match.reason) for publication, match in duplicate_list] == [
+        ('paper_journal', 'doi'),
+        ('preprint_url', 'arxiv'),
+    ]
+
+
+def test_near_duplicate_titles_of_the_same_authors_are_skipped():
+    keys, duplicate_list = filter_publications([
+        get_publication('vaswani2017', 'Attention Is All You Need', authors='Vaswani, Ashish and Shazeer, Noam'),
+        get_publication('vaswani2017b', 'Attention is all you need!', authors='Ashish Vaswani and Noam Shazeer'),
+    ])
+    assert keys == ['vaswani2017']
+    assert [publication.key for publication, _ in duplicate_list] == ['vaswani2017b']
+
+
+def test_distinct_papers_are_not_skipped():
+    publications = [
+        # Similar titles of different authors
+        get_publication('smith2020', 'Neural Networks for Image Segmentation', authors='Smith, John'),
+        get_publication('lee2021', 'Neural Networks for Image Segmentation: A Survey', authors='Lee, Kim'),
+        # Short titles, identical but of different chapters
+        get_publication('intro_a', 'Introduction', authors='Doe, Jane', url='https://proceedings.org/volume-1'),
+        get_publication('intro_b', 'Introduction', authors='Roe, Richard'),
+        # Papers of the same proceedings, sharing its URL
+        get_publication('paper_a', 'Learning to Rank with Graphs', url='https://proceedings.org/volume-1'),
+        get_publication('paper_b', 'Protein Folding with Transformers', url='https://proceedings.org/volume-1'),
+    ]
+    keys, duplicate_list = filter_publications(publications)
+    assert keys == [publication.key for publication in publications]
+    assert duplicate_list == []
+
+    # They are still reported by `ns dedupe`
+    group_list = get_duplicate_groups(get_reference(publication) for publication in publications)
+    assert sorted(sorted(reference.key for reference in group.references) for group in group_list) == [
+        ['intro_a', 'intro_b', 'paper_a', 'paper_b'],
+        ['lee2021', 'smith2020'],
+    ]
+
+
+def test_is_certain_duplicate():
+    reference = Reference('a', 'Attention Is All You Need', '', 'https://papers.org/attention', authors='Vaswani, A.')
+    same_url = Reference('b', 'Attention is all you need', '', 'http://www.papers.org/attention/', authors='Other, B.')
+    same_author = Reference('c', 'Attention is all you need', '', '', authors='Ashish Vaswani and others')
+    title_only = Reference('d', 'Attention is all you need', '', '', authors='Other, B.')
+    url_only = Reference('e', 'Another Title', '', 'https://papers.org/attention')
+
+    assert is_certain_duplicate(reference, Match(same_url, 'url'))
+    assert is_certain_duplicate(reference, Match(same_author, 'title'))
+    assert not is_certain_duplicate(reference, Match(title_only, 'title'))
+    assert not is_certain_duplicate(reference, Match(url_only, 'url'))
+    assert is_certain_duplicate(reference, Match(url_only._replace(doi='10.1/x'), 'doi'))
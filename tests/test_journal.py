@@ -0,0 +1,61 @@
+import pytest
+from conftest import get_page_keys
+
+from notion_scholar.journal import DONE
+from notion_scholar.journal import Journal
+from notion_scholar.run import run
+
+
+@pytest.mark.filterwarnings('ignore:.*too long')
+def test_interrupted_run_is_resumed_without_duplicates(fake_notion, library_path, tmp_path, monkeypatch, capsys):
+    journal_path = str(tmp_path / 'journal.sqlite')
+    kwargs = dict(
+        token='secret',
+        database_id='database',
+        bib_file_path=library_path,
+        workers=4,
+        index_path=str(tmp_path / 'index.sqlite'),
+        journal_path=journal_path,
+    )
+
+    # Interrupted (Ctrl+C) after 10 pages are created
+    mark_done = Journal.mark_done
+    done_count = 0
+    closed_count = 0
+
+    def interrupt(journal, operation, page_id):
+        nonlocal done_count
+        done_count += 1
+        if done_count > 10:
+            raise KeyboardInterrupt
+        mark_done(journal, operation, page_id)
+
+    def close(journal):
+        nonlocal closed_count
+        closed_count += 1
+        journal.connection.close()
+
+    monkeypatch.setattr(Journal, 'mark_done', interrupt)
+    monkeypatch.setattr(Journal, 'close', close)
+    with pytest.raises(KeyboardInterrupt):
+        run(**kwargs)
+    monkeypatch.undo()
+    assert closed_count == 1
+    assert 'the next run will resume the synchronization' in capsys.readouterr().out
+
+    journal = Journal(path=journal_path)
+    assert journal.has_plan(['database'])
+    assert journal.get_count(['database'], DONE) == 10
+    journal.close()
+
+    # The plan is resumed, the pages created before the interruption are looked up
+    assert run(**kwargs) == 0
+    assert 'Resuming the interrupted synchronization' in capsys.readouterr().out
+    journal = Journal(path=journal_path)
+    assert not journal.has_plan(['database'])
+    journal.close()
+
+    # The publications left out of the plan when it was interrupted are created by the next run
+    assert run(**kwargs) == 0
+    page_keys = get_page_keys(fake_notion)
+    assert len(page_keys) == len(set(page_keys)) == 40
@@ -0,0 +1,92 @@
+from notion_scholar.diff import get_fingerprint
+from notion_scholar.diff import get_publication_digest_dict
+from notion_scholar.key_index import KeyIndex
+from notion_scholar.notion_api import UploadResult
+from notion_scholar.publication import Publication
+
+
+def get_publication(key: str, title: str = 'A Title') -> Publication:
+    return Publication(
+        key=key,
+        title=title,
+        authors='Doe, Jane',
+        year=2020,
+        journal='A Journal',
+        url='',
+        bibtex='',
+        abstract='',
+        doi='',
+        type='article',
+    )
+
+
+def test_refresh_queries_the_pages_edited_since_the_high_water_mark(fake_notion, tmp_path):
+    fake_notion.populate([get_publication('a'), get_publication('b'), get_publication('c')], days=10)
+    # The last page is created after the first refresh
+    last_page_id, last_page = fake_notion.pages.popitem()
+    key_index = KeyIndex(path=str(tmp_path / 'index.sqlite'))
+
+    assert key_index.refresh(token='secret', database_id='database') == 2
+    assert sorted(key_index.get_page_dict('database')) == ['a', 'b']
+    mark = key_index.get_high_water_mark('database')
+    assert mark == max(page['last_edited_time'] for page in fake_notion.pages.values())
+
+    # The page edited during the minute of the mark is fetched again, with the new one
+    fake_notion.pages[last_page_id] = last_page
+    assert key_index.refresh(token='secret', database_id='database') == 2
+    assert sorted(key_index.get_page_dict('database')) == ['a', 'b', 'c']
+    assert key_index.get_high_water_mark('database') == last_page['last_edited_time']
+    assert key_index.get_page_dict('other-database') == {}
+    key_index.close()
+
+
+def test_full_refresh_forgets_the_deleted_pages(fake_notion, tmp_path):
+    fake_notion.populate([get_publication('a'), get_publication('b')], days=10)
+    key_index = KeyIndex(path=str(tmp_path / 'index.sqlite'))
+    key_index.refresh(token='secret', database_id='database')
+
+    del fake_notion.pages[next(iter(fake_notion.pages))]
+    key_index.refresh(token='secret', database_id='database')
+    assert sorted(key_index.get_page_dict('database')) == ['a', 'b']
+    key_index.refresh(token='secret', database_id='database', full=True)
+    assert sorted(key_index.get_page_dict('database')) == ['b']
+    key_index.close()
+
+
+def test_fingerprints_are_cleared_when_the_pages_are_edited(fake_notion, tmp_path):
+    publication = get_publication('a')
+    fake_notion.populate([publication], days=10)
+    page = next(iter(fake_notion.pages.values()))
+    key_index = KeyIndex(path=str(tmp_path / 'index.sqlite'))
+
+    key_index.refresh(token='secret', database_id='database', with_digests=True)
+    fingerprint = get_fingerprint(get_publication_digest_dict(publication))
+    assert key_index.get_page_dict('database')['a'].fingerprint == fingerprint
+
+    # Indexed again without its properties, the page is unchanged
+    key_index.add_pages('database', [page])
+    assert key_index.get_page_dict('database')['a'].fingerprint == fingerprint
+
+    # Edited without its properties being retrieved
+    key_index.add_pages('database', [dict(page, last_edited_time='2100-01-01T00:00:00.000Z')])
+    indexed_page = key_index.get_page_dict('database')['a']
+    assert (indexed_page.page_id, indexed_page.fingerprint, indexed_page.digest_dict) == (page['id'], None, None)
+
+    # Updated by notion-scholar
+    updated_publication = get_publication('a', title='New Title')
+    key_index.add_results('database', [UploadResult(updated_publication, page_id=page['id'])])
+    indexed_page = key_index.get_page_dict('database')['a']
+    assert indexed_page.fingerprint == get_fingerprint(get_publication_digest_dict(updated_publication))
+    key_index.close()
+
+
+def test_export_marks_are_stored_by_file(tmp_path):
+    key_index = KeyIndex(path=str(tmp_path / 'index.sqlite'))
+    assert key_index.get_export_mark('database', 'library.bib') is None
+    key_index.set_export_mark('database', 'library.bib', '2024-01-01T00:00:00.000Z')
+    key_index.close()
+
+    key_index = KeyIndex(path=str(tmp_path / 'index.sqlite'))
+    assert key_index.get_export_mark('database', 'library.bib') == '2024-01-01T00:00:00.000Z'
+    assert key_index.get_export_mark('database', 'other.bib') is None
+    key_index.close()
@@ -0,0 +1,104 @@
+import time
+from typing import Iterator
+from typing import List
+
+import pytest
+
+from notion_scholar.notion_api import _iter_in_order
+from notion_scholar.notion_api import get_publication_key
+from notion_scholar.notion_api import PageUpdate
+from notion_scholar.notion_api import update_pages_in_database
+from notion_scholar.notion_api import UploadResult
+from notion_scholar.publication import Publication
+
+
+def get_publication(key: str, title: str = 'A Title', journal: str = 'A Journal') -> Publication:
+    return Publication(
+        key=key,
+        title=title,
+        authors='Doe, Jane',
+        year=2020,
+        journal=journal,
+        url='',
+        bibtex='',
+        abstract='',
+        doi='',
+        type='article',
+    )
+
+
+def upload(i: int) -> UploadResult:
+    # The first items are the slowest, they complete last
+    time.sleep(0.002 * (10 - i % 10))
+    return UploadResult(publication=get_publication(str(i)), page_id=f'page-{i}')
+
+
+def test_results_are_yielded_in_order():
+    results = list(_iter_in_order(upload, range(30), workers=4))
+    assert [result.page_id for result in results] == [f'page-{i}' for i in range(30)]
+
+
+def test_items_are_consumed_lazily():
+    consumed: List[int] = []
+
+    def iter_items() -> Iterator[int]:
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    workers = 2
+    for i, result in enumerate(_iter_in_order(upload, iter_items(), workers=workers)):
+        # At most 4 items per worker are pending besides the results yielded
+        assert len(consumed) <= i + 4 * workers
+    assert len(consumed) == 100
+
+
+def test_errors_are_propagated():
+    def fail(i: int) -> UploadResult:
+        if i == 5:
+            raise ValueError('failed upload')
+        return upload(i)
+
+    page_ids = []
+    with pytest.raises(ValueError, match='failed upload'):
+        for result in _iter_in_order(fail, range(10), workers=3):
+            page_ids.append(result.page_id)
+    assert page_ids == [f'page-{i}' for i in range(5)]
+
+
+def test_update_pages_in_database(fake_notion):
+    fake_notion.populate([get_publication('a'), get_publication('b'), get_publication('c')])
+    page_id_dict = {get_publication_key(page): page_id for page_id, page in fake_notion.pages.items()}
+
+    updates = [
+        # Only the listed properties are sent
+        PageUpdate(page_id_dict['a'], get_publication('a', title='New Title', journal='New Journal'), ['Title']),
+        PageUpdate('missing-page', get_publication('missing'), ['Title']),
+        PageUpdate(page_id_dict['c'], get_publication('c', journal='New Journal'), ['Journal']),
+    ]
+    results = update_pages_in_database(updates, token='secret', workers=2)
+
+    assert [result.publication.key for result in results] == ['a', 'missing', 'c']
+    assert [result.success for result in results] == [True, False, True]
+    assert results[0].page_id == page_id_dict['a'] and results[0].last_edited_time is not None
+
+    def get_text(key: str, name: str) -> str:
+        value = fake_notion.pages[page_id_dict[key]]['properties'][name]
+        return ''.join(item['plain_text'] for item in value.get('title', value.get('rich_text')))
+
+    assert (get_text('a', 'Title'), get_text('a', 'Journal')) == ('New Title', 'A Journal')
+    assert (get_text('b', 'Title'), get_text('b', 'Journal')) == ('A Title', 'A Journal')
+    assert (get_text('c', 'Title'), get_text('c', 'Journal')) == ('A Title', 'New Journal')
+
+
+def test_update_of_properties_absent_from_the_database_is_skipped(fake_notion):
+    del fake_notion.schema['Journal']
+    fake_notion.populate([get_publication('a')])
+    page_id = next(iter(fake_notion.pages))
+
+    # The schemas are cached by database id, the id is not shared with the other tests
+    database_id = 'database-without-journal'
+    update = PageUpdate(page_id, get_publication('a', journal='New Journal'), ['Journal'], database_id=database_id)
+    results = update_pages_in_database([update], token='secret')
+    assert [(result.page_id, result.success) for result in results] == [(page_id, True)]
+    assert 'PATCH /pages' not in fake_notion.request_count
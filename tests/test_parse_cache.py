@@ -0,0 +1,102 @@
+import os
+from typing import List
+
+import pytest
+
+import notion_scholar.parse_cache
+from notion_scholar.bibtex import get_bib_database_from_file
+from notion_scholar.bibtex import get_publication_list
+from notion_scholar.bibtex import iter_entry_lists
+from notion_scholar.parse_cache import ParseCache
+
+BIBTEX = '''@string{venue = "First venue"}
+@article{a, title = {Paper A}, journal = venue, year = 2020}
+@comment{A comment}
+@article{b, title = {Paper B}, year = 2021}
+@string{other = "Other venue"}
+@article{c, title = {Paper C}, journal = other, year = 2022}
+'''
+
+
+@pytest.fixture
+def parsed_blocks(monkeypatch) -> List[List[str]]:
+    """Record the blocks parsed by the parse cache, by call."""
+    parsed_blocks: List[List[str]] = []
+
+    def record(blocks):
+        blocks = list(blocks)
+        parsed_blocks.append(blocks)
+        return iter_entry_lists(blocks)
+
+    monkeypatch.setattr(notion_scholar.parse_cache, 'iter_entry_lists', record)
+    return parsed_blocks
+
+
+def write(file_path: str, text: str) -> None:
+    # The modification time is changed even within its resolution
+    mtime_ns = os.stat(file_path).st_mtime_ns if os.path.exists(file_path) else 0
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.utime(file_path, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+
+
+def test_cached_publications_match_the_parsed_publications(library_path, tmp_path, parsed_blocks):
+    expected = get_publication_list(get_bib_database_from_file(library_path))
+    parse_cache = ParseCache(path=str(tmp_path / 'cache.sqlite'))
+
+    assert parse_cache.get_publication_list(library_path) == expected
+    assert len(parsed_blocks) == 1
+    # Loaded from the cache, without being parsed again
+    assert parse_cache.get_publication_list(library_path) == expected
+    assert len(parsed_blocks) == 1
+    parse_cache.close()
+
+    parse_cache = ParseCache(path=str(tmp_path / 'cache.sqlite'))
+    assert [p.key for p in parse_cache.iter_lazy_publications(library_path)] == [p.key for p in expected]
+    assert len(parsed_blocks) == 1
+    parse_cache.close()
+
+
+def test_only_the_edited_blocks_are_parsed(tmp_path, parsed_blocks):
+    file_path = str(tmp_path / 'references.bib')
+    write(file_path, BIBTEX)
+    parse_cache = ParseCache(path=str(tmp_path / 'cache.sqlite'))
+    assert [p.key for p in parse_cache.get_publication_list(file_path)] == ['a', 'b', 'c']
+
+    # Touched without being edited
+    write(file_path, BIBTEX)
+    assert [p.key for p in parse_cache.get_publication_list(file_path)] == ['a', 'b', 'c']
+    assert len(parsed_blocks) == 1
+
+    # The macros are parsed along with the edited entry
+    write(file_path, BIBTEX.replace('Paper B', 'Paper B, revised'))
+    publications = parse_cache.get_publication_list(file_path)
+    assert [p.title for p in publications] == ['Paper A', 'Paper B, revised', 'Paper C']
+    assert [p.journal for p in publications] == ['First venue', '', 'Other venue']
+    assert [block[:10] for block in parsed_blocks[-1]] == ['@string{ve', '@article{b', '@string{ot']
+
+    # Editing a macro invalidates the entries that follow it
+    write(file_path, BIBTEX.replace('First venue', 'New venue'))
+    publications = parse_cache.get_publication_list(file_path)
+    assert [p.journal for p in publications] == ['New venue', '', 'Other venue']
+    assert [block[:10] for block in parsed_blocks[-1]] == [
+        '@string{ve', '@article{a', '@article{b', '@string{ot', '@article{c',
+    ]
+
+    # The removed entries are no longer yielded
+    write(file_path, BIBTEX.replace('@article{b, title = {Paper B}, year = 2021}\n', ''))
+    assert [p.key for p in parse_cache.get_publication_list(file_path)] == ['a', 'c']
+    assert [p.key for p in parse_cache.get_publication_list(file_path)] == ['a', 'c']
+    parse_cache.close()
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    parse_cache = ParseCache(path=str(tmp_path / 'cache.sqlite'), max_files=2)
+    file_paths = [str(tmp_path / f'{name}.bib') for name in ('first', 'second', 'third')]
+    for file_path in file_paths:
+        write(file_path, BIBTEX)
+        parse_cache.get_publication_list(file_path)
+
+    assert parse_cache.get_block_list(file_paths[0]) == []
+    assert [len(parse_cache.get_block_list(file_path)) for file_path in file_paths[1:]] == [6, 6]
+    parse_cache.close()
@@ -0,0 +1,145 @@
+import time
+from typing import Callable
+from typing import List
+from typing import Optional
+
+import httpx
+import pytest
+from notion_client import Client
+from notion_client.errors import HTTPResponseError
+
+from notion_scholar.scheduler import RequestScheduler
+
+PAGE = {'object': 'page', 'id': 'page-id', 'properties': {}}
+
+
+def get_client(responses: List[Callable[[httpx.Request], httpx.Response]], requests: List[httpx.Request]) -> Client:
+    """Return a Notion client answering its requests with the responses in
+    turn, the requests being appended to `requests`."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return responses[len(requests) - 1](request)
+    return Client(auth='secret', client=httpx.Client(transport=httpx.MockTransport(handler)))
+
+
+def error(status: int, code: str, headers: Optional[dict] = None) -> Callable[[httpx.Request], httpx.Response]:
+    return lambda request: httpx.Response(status, headers=headers, json={
+        'object': 'error', 'status': status, 'code': code, 'message': code,
+    })
+
+
+def success(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json=PAGE)
+
+
+def get_scheduler() -> RequestScheduler:
+    return RequestScheduler(rate=1000, burst=10, backoff_base=0.001)
+
+
+def test_throttled_call_waits_for_retry_after():
+    requests: List[httpx.Request] = []
+    client = get_client([error(429, 'rate_limited', {'Retry-After': '0.2'}), success], requests)
+    scheduler = get_scheduler()
+
+    start = time.monotonic()
+    assert scheduler.call(client.pages.retrieve, page_id='page-id') == PAGE
+    assert time.monotonic() - start >= 0.2
+    assert len(requests) == 2
+    assert scheduler.get_stats() == {'requests': 2, 'throttled': 1, 'retried': 1, 'failed': 0}
+
+
+def test_idempotent_call_is_retried_after_server_error():
+    requests: List[httpx.Request] = []
+    client = get_client([error(502, 'bad_gateway'), error(503, 'service_unavailable'), success], requests)
+    scheduler = get_scheduler()
+
+    assert scheduler.call(client.pages.retrieve, page_id='page-id') == PAGE
+    assert len(requests) == 3
+
+
+def test_call_fails_after_max_retries():
+    requests: List[httpx.Request] = []
+    client = get_client([error(503, 'service_unavailable')] * 3, requests)
+    scheduler = RequestScheduler(rate=1000, burst=10, max_retries=2, backoff_base=0.001)
+
+    with pytest.raises(HTTPResponseError):
+        scheduler.call(client.pages.retrieve, page_id='page-id')
+    assert len(requests) == 3
+    assert scheduler.get_stats()['failed'] == 1
+
+
+def test_non_idempotent_call_is_not_retried_after_server_error():
+    requests: List[httpx.Request] = []
+    client = get_client([error(502, 'bad_gateway'), success], requests)
+    scheduler = get_scheduler()
+
+    with pytest.raises(HTTPResponseError):
+        scheduler.call(client.pages.create, idempotent=False, parent={'database_id': 'db'}, properties={})
+    assert len(requests) == 1
+
+
+def test_non_idempotent_call_is_retried_if_not_applied():
+    requests: List[httpx.Request] = []
+    responses = [error(429, 'rate_limited', {'Retry-After': '0'}), error(409, 'conflict_error'), success]
+    client = get_client(responses, requests)
+    scheduler = get_scheduler()
+
+    result = scheduler.call(client.pages.create, idempotent=False, parent={'database_id': 'db'}, properties={})
+    assert result == PAGE
+    assert len(requests) == 3
+
+
+def test_non_idempotent_call_is_recovered():
+    requests: List[httpx.Request] = []
+    client = get_client([error(502, 'bad_gateway'), success], requests)
+    scheduler = get_scheduler()
+    recovered_page = {'object': 'page', 'id': 'created-page-id'}
+
+    result = scheduler.call(
+        client.pages.create,
+        idempotent=False,
+        recover=lambda: recovered_page,
+        parent={'database_id': 'db'},
+        properties={},
+    )
+    assert result == recovered_page
+    assert len(requests) == 1
+
+
+def test_non_idempotent_call_is_retried_if_not_recovered():
+    requests: List[httpx.Request] = []
+    client = get_client([error(504, 'gateway_timeout'), success], requests)
+    scheduler = get_scheduler()
+
+    result = scheduler.call(
+        client.pages.create,
+        idempotent=False,
+        recover=lambda: None,
+        parent={'database_id': 'db'},
+        properties={},
+    )
+    assert result == PAGE
+    assert len(requests) == 2
+
+
+def test_failed_recovery_raises_the_original_error():
+    requests: List[httpx.Request] = []
+    client = get_client([error(502, 'bad_gateway'), success], requests)
+    scheduler = get_scheduler()
+    recover_error = httpx.ConnectError('lookup failed')
+
+    def recover():
+        raise recover_error
+
+    with pytest.raises(HTTPResponseError) as error_info:
+        scheduler.call(
+            client.pages.create,
+            idempotent=False,
+            recover=recover,
+            parent={'database_id': 'db'},
+            properties={},
+        )
+    assert error_info.value.status == 502
+    assert error_info.value.__cause__ is recover_error
+    assert len(requests) == 1
+    assert scheduler.get_stats()['failed'] == 1